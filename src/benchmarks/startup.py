@@ -0,0 +1,140 @@
+"""
+啟動時間的基準測試（以 python -X importtime 量測各模式啟動時載入的模組）：
+    1. 每個目標在新的 Python 程序中載入，重複數次取中位數（匯入耗時與整個程序的耗時）
+    2. 依套件彙整各模組本身的匯入耗時，列出最耗時的套件
+    3. 檢查較重的套件（requests、httpx、streamlit、numpy）是否被載入，確認各模式只載入需要的模組
+    4. 將結果輸出為 JSON，並可與先前的結果比較
+
+執行方式：python -m src.benchmarks.startup [--repeat 5] [--top 8] [--json PATH] [--baseline PATH]
+"""
+
+import argparse
+import json
+import os
+import platform
+import re
+import statistics
+import subprocess
+import sys
+import time
+from typing import Optional, Dict, Any, List, Set, Tuple
+
+from src.benchmarks.turn_latency import git_commit
+
+# 量測的目標：名稱 -> 匯入的模組（web 為 src.main 啟動 Streamlit 前載入的模組，遊戲本身的模組於 game 量測）
+TARGETS = {
+    "main": "src.main",
+    "console": "src.ui.console.console",
+    "server": "src.ui.server.server",
+    "web": "streamlit.web.cli",
+    "game": "src.repository.game_assemble",
+}
+
+# 檢查是否被載入的套件
+HEAVY_PACKAGES = ("requests", "httpx", "streamlit", "numpy")
+
+# -X importtime 的輸出：import time: 本身 | 累計 | 模組名稱（縮排代表巢狀）
+IMPORT_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def measure(module: Optional[str], startup: Set[str] = frozenset()) -> Tuple[float, float, List[Tuple[str, int, int]]]:
+    """在新的程序中匯入模組（None 為只啟動直譯器），回傳匯入耗時、程序耗時（秒）與每個模組的耗時（名稱、本身、累計，微秒）
+    匯入耗時為直譯器啟動後才載入的最上層模組的累計耗時總和（startup 為直譯器啟動時已載入的模組）"""
+    start_time = time.perf_counter()
+    code = "pass" if module is None else f"import {module}"
+    process = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd = ROOT, capture_output = True, text = True)
+    elapsed = time.perf_counter() - start_time
+    if process.returncode != 0:
+        raise RuntimeError(f"無法匯入 {module}\n{process.stderr[-2000:]}")
+
+    modules = []
+    total = 0
+    for line in process.stderr.splitlines():
+        found = IMPORT_LINE.match(line)
+        if found is None:
+            continue
+        self_us, cumulative_us, indent, name = int(found.group(1)), int(found.group(2)), found.group(3), found.group(4)
+        modules.append((name, self_us, cumulative_us))
+        if not indent and name not in startup:
+            total += cumulative_us
+    return total / 1e6, elapsed, modules
+
+def run_target(name: str, module: str, repeat: int, top: int, startup: Set[str]) -> Dict[str, Any]:
+    """重複量測一個目標（只計算直譯器啟動後才載入的模組）"""
+    imports, processes = [], []
+    packages: Dict[str, List[int]] = {}
+    loaded = set()
+    for _ in range(repeat):
+        total, elapsed, modules = measure(module, startup)
+        imports.append(total)
+        processes.append(elapsed)
+        # 依套件（第一層名稱）彙整本身的耗時
+        sums: Dict[str, int] = {}
+        for module_name, self_us, _ in modules:
+            if module_name in startup:
+                continue
+            package = module_name.split(".")[0]
+            sums[package] = sums.get(package, 0) + self_us
+            loaded.add(package)
+        for package, value in sums.items():
+            packages.setdefault(package, []).append(value)
+
+    heaviest = sorted(((package, statistics.median(values)) for package, values in packages.items()), key = lambda item: -item[1])[:top]
+    return {
+        "target": name,
+        "module": module,
+        "import_ms": round(statistics.median(imports) * 1000, 2),
+        "process_ms": round(statistics.median(processes) * 1000, 2),
+        "heaviest_ms": {package: round(value / 1000, 2) for package, value in heaviest},
+        "loaded": {package: package in loaded for package in HEAVY_PACKAGES}
+    }
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any]):
+    """與先前的結果比較（比例小於 1 代表啟動變快）"""
+    previous = {target["target"]: target for target in baseline["targets"]}
+    print(f"\n與 {baseline['meta'].get('commit')} 比較（目前 / 先前）：")
+    for target in results["targets"]:
+        old = previous.get(target["target"])
+        if old is None or not old["import_ms"] or not old["process_ms"]:
+            continue
+        print(f"  {target['target']:<8}匯入 {target['import_ms'] / old['import_ms']:.2f}x、程序 {target['process_ms'] / old['process_ms']:.2f}x")
+
+def main():
+    """主程式"""
+    parser = argparse.ArgumentParser(description = "啟動時間的基準測試")
+    parser.add_argument("--targets", nargs = "+", choices = list(TARGETS), default = list(TARGETS), help = "量測的目標")
+    parser.add_argument("--repeat", type = int, default = 5, help = "每個目標量測的次數（取中位數）")
+    parser.add_argument("--top", type = int, default = 8, help = "列出最耗時的套件數")
+    parser.add_argument("--json", help = "輸出 JSON 的路徑")
+    parser.add_argument("--baseline", help = "先前輸出的 JSON，用於比較")
+    args = parser.parse_args()
+
+    # 直譯器本身的啟動時間與啟動時載入的模組
+    interpreter = statistics.median(measure(None)[1] for _ in range(args.repeat))
+    startup = {name for name, _, _ in measure(None)[2]}
+    print(f"直譯器啟動：{interpreter * 1000:.2f} ms（{len(startup)} 個模組）")
+
+    results = {
+        "meta": {"commit": git_commit(), "python": platform.python_version(), "repeat": args.repeat, "time": time.strftime("%Y-%m-%dT%H:%M:%S")},
+        "interpreter_ms": round(interpreter * 1000, 2),
+        "targets": []
+    }
+    for name in args.targets:
+        target = run_target(name, TARGETS[name], args.repeat, args.top, startup)
+        results["targets"].append(target)
+        loaded = "、".join(package for package, value in target["loaded"].items() if value) or "無"
+        heaviest = "、".join(f"{package} {value}" for package, value in target["heaviest_ms"].items())
+        print(f"{name:<8}{target['module']}｜匯入 {target['import_ms']} ms｜程序 {target['process_ms']} ms｜載入的套件：{loaded}")
+        print(f"        最耗時的套件（ms）：{heaviest}")
+
+    if args.json:
+        with open(args.json, "w", encoding = "utf-8") as f:
+            json.dump(results, f, ensure_ascii = False, indent = 2)
+        print(f"\n結果已輸出至 {args.json}")
+    if args.baseline:
+        with open(args.baseline, "r", encoding = "utf-8") as f:
+            compare(results, json.load(f))
+
+if __name__ == "__main__":
+    main()
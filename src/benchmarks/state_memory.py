@@ -0,0 +1,111 @@
+"""
+遊戲狀態的記憶體基準測試：
+    1. 比較舊版（dict）、__slots__、快照、壓縮整數，每個遊戲占用的位元組數
+    2. 以 tracemalloc 量測配置大量遊戲狀態後增加的記憶體
+    3. 可將結果輸出為 JSON，方便跨版本比較
+
+執行方式：python -m src.benchmarks.state_memory [--sessions N] [--json PATH]
+"""
+
+import argparse
+import json
+import tracemalloc
+from typing import Callable, Dict, Any, List
+
+from src.repository.core.engine import GameEngine
+from src.repository.core.state import GameState
+
+class LegacyGameState:
+    """舊版的遊戲狀態（一般屬性 + 三個 NPC 字典），作為比較基準"""
+    def __init__(self):
+        self.player_location = "教室"
+        self.player_health = 10
+        self.player_sanity = 5
+        self.player_remember = False
+        self.npc_a = {"location": "教師辦公室", "sanity": 3, "wait_for_response": False, "help_count": 0, "talk_count": 0, "collapsed": False}
+        self.npc_b = {"location": "福利社", "sanity": 3, "talk_count": 0, "collapsed": False}
+        self.npc_c = {"location": "圖書館", "sanity": 5, "other_talk_count": 0, "collapsed": False, "true_color": False}
+        self.inventory = []
+        self.open_classroom = False
+        self.find_microphone = False
+        self.num_bread = 3
+        self.ask_c = False
+        self.game_over = False
+        self.ending = None
+
+def sample_state() -> GameState:
+    """遊玩幾回合後的遊戲狀態（物品欄不為空，數值與初始值不同）"""
+    engine = GameEngine(logger = lambda level, message: None)
+    for command in ({"action": "explore"}, {"action": "use", "object": "鑰匙"}, {"action": "move", "target": "教師辦公室"},
+                    {"action": "talk", "target": "A"}, {"action": "choose", "choice": "接受"}, {"action": "move", "target": "福利社"},
+                    {"action": "explore"}):
+        engine.execute_action(command)
+    return engine.state
+
+def measure(factory: Callable[[int], Any], sessions: int) -> float:
+    """配置 sessions 個物件後，平均每個物件增加的位元組數"""
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    objects = [factory(i) for i in range(sessions)]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    total = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    # 扣除保存物件的串列本身
+    total -= len(objects) * 8
+    return total / sessions
+
+def run(sessions: int) -> List[Dict[str, Any]]:
+    """執行所有量測"""
+    state = sample_state()
+    code = state.pack()
+
+    # 兩種物件都以建構子建立，不保留快照，只比較欄位本身的儲存方式
+    def legacy(i: int) -> LegacyGameState:
+        legacy_state = LegacyGameState()
+        legacy_state.inventory = list(state.inventory)
+        return legacy_state
+
+    def slots(i: int) -> GameState:
+        slots_state = GameState()
+        slots_state.inventory = list(state.inventory)
+        return slots_state
+
+    def snapshot(i: int):
+        return GameState.unpack(code).snapshot()
+
+    def packed(i: int) -> int:
+        # 改變最低位元，產生位數相同但不同的整數物件
+        return code ^ i
+
+    cases = [
+        ("legacy dict", legacy),
+        ("__slots__", slots),
+        ("snapshot", snapshot),
+        ("packed int", packed),
+    ]
+    results = []
+    baseline = None
+    for name, factory in cases:
+        size = measure(factory, sessions)
+        baseline = baseline or size
+        results.append({"layout": name, "bytes_per_session": round(size, 1), "ratio": round(size / baseline, 3)})
+    return results
+
+def main():
+    """主程式"""
+    parser = argparse.ArgumentParser(description = "遊戲狀態的記憶體基準測試")
+    parser.add_argument("--sessions", type = int, default = 10000, help = "配置的遊戲數量")
+    parser.add_argument("--json", help = "輸出 JSON 的路徑")
+    args = parser.parse_args()
+
+    results = run(args.sessions)
+    print(f"{'layout':<14}{'bytes/session':>16}{'ratio':>10}")
+    for result in results:
+        print(f"{result['layout']:<14}{result['bytes_per_session']:>16}{result['ratio']:>10}")
+
+    if args.json:
+        with open(args.json, "w", encoding = "utf-8") as f:
+            json.dump({"sessions": args.sessions, "results": results}, f, ensure_ascii = False, indent = 2)
+
+if __name__ == "__main__":
+    main()
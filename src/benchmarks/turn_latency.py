@@ -0,0 +1,361 @@
+"""
+回合延遲的端對端基準測試（以本機的 LLM 模擬伺服器重播固定的遊玩腳本）：
+    1. 每場遊戲依序重播一份腳本，經過 GameAssemble.process_input（或 asyncio 版本）處理每一回合
+    2. 分別記錄各階段的耗時（解析、引擎、敘事、介面繪製）、第一個 token 的等待時間與每回合的 Prompt token 數
+    3. 以 1 / 10 / 100 場同時進行的遊戲量測回合延遲的 p50 / p95 / p99 與吞吐量
+    4. 將結果輸出為 JSON，並可與先前的結果比較，判斷快取、串流、連線池等修改是否有效
+    5. 可啟用融合模式（融合呼叫同時解析與敘事，計入敘事階段）
+    6. 可改用回合日誌中實際的玩家輸入作為腳本（每場遊戲一份）
+
+執行方式：python -m src.benchmarks.turn_latency [--sessions 1 10 100] [--mode sync|async] [--backend mock|fake] [--fused] [--journal PATH] [--json PATH] [--baseline PATH] [--trace PATH]
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import platform
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, List, Tuple, Iterator, AsyncIterator, Hashable
+
+from src.repository.game_assemble import GameAssemble
+from src.repository.journal import read_journal
+from src.repository.llm.backends import LLMBackend, FakeBackend, OllamaBackend, SimulatedModel
+from src.repository.llm.prompts import count_tokens
+from src.repository.llm.session import AgentSession
+from src.repository.telemetry import TELEMETRY
+from src.tools.mock_llm import MockLLMServer
+from src.ui.console.console import ConsoleUI
+
+# 遊玩腳本：混合規則比對可以處理的指令與需要 LLM 解析的自由輸入
+SCRIPTS = [
+    ["探索", "用鑰匙開門", "去教師辦公室", "和 A 聊天", "接受", "去福利社", "探索", "吃麵包", "去圖書館", "和 C 聊天", "我想在書架之間隨便逛逛看看", "去教室"],
+    ["四處看看", "拿鑰匙把教室的門打開", "去圖書館", "跟 C 說說話", "去福利社", "和 B 聊天", "我有點累了想找個地方坐一下", "去教師辦公室", "和 A 聊天", "拒絕"],
+    ["探索", "用鑰匙開門", "去福利社", "探索", "和 B 聊天", "和 B 聊天", "去圖書館", "我總覺得這裡的氣氛有哪裡不太對勁", "和 C 聊天", "去教室", "探索"],
+]
+
+STAGES = ("parse", "engine", "narrate", "render")
+
+def journal_scripts(path: str) -> List[List[str]]:
+    """由回合日誌取得每場遊戲的玩家輸入（依遊戲第一次出現的順序）"""
+    scripts: Dict[str, List[str]] = {}
+    for record in read_journal(path):
+        if record["event"] in ("turn", "exit"):
+            scripts.setdefault(record["session"], []).append(record["input"])
+    return list(scripts.values())
+
+def percentiles(values: List[float], scale: float = 1000) -> Dict[str, Optional[float]]:
+    """p50 / p95 / p99 與平均（預設將秒換算為毫秒）"""
+    if not values:
+        return {"p50": None, "p95": None, "p99": None, "mean": None}
+    ordered = sorted(values)
+
+    def pick(q: float) -> float:
+        return round(ordered[min(int(len(ordered) * q), len(ordered) - 1)] * scale, 3)
+
+    return {"p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99), "mean": round(sum(ordered) / len(ordered) * scale, 3)}
+
+class TurnRecorder:
+    """記錄一場遊戲目前回合的各階段耗時"""
+    def __init__(self):
+        self.turn_start = 0.0
+        self.first_token: Optional[float] = None    # 敘事的第一個 token 抵達的時間（與延遲同樣從回合開始計算）
+        self.narrating = False
+        self.prompt_tokens = 0  # 本回合送出的 Prompt token 數（估計值，包含重試）
+        self.stages: Dict[str, float] = {}
+        self.turns: List[Dict[str, Any]] = []
+
+    def begin(self):
+        """開始新的回合"""
+        self.turn_start = time.perf_counter()
+        self.first_token = None
+        self.narrating = False
+        self.prompt_tokens = 0
+        self.stages = dict.fromkeys(STAGES, 0.0)
+
+    def token(self):
+        """收到 LLM 回應的一段文字"""
+        if self.narrating and self.first_token is None:
+            self.first_token = time.perf_counter()
+
+    def end(self, turn: Dict[str, Any]):
+        """結束回合（沒有呼叫 LLM 敘事時，第一個 token 即為回合結束）"""
+        now = time.perf_counter()
+        first_token = self.first_token if self.first_token is not None else now
+        self.turns.append({
+            "latency": now - self.turn_start,
+            "ttft": first_token - self.turn_start,
+            "prompt_tokens": self.prompt_tokens,
+            "success": turn["success"],
+            **self.stages
+        })
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        """計算一個階段的耗時"""
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] += time.perf_counter() - start_time
+
+class TimedBackend(LLMBackend):
+    """記錄第一個 token 時間的後端（每場遊戲一個，共用同一個實際的後端）"""
+    def __init__(self, backend: LLMBackend, recorder: TurnRecorder):
+        super().__init__(backend.api_url, backend.api_key, backend.model)
+        self.backend = backend
+        self.recorder = recorder
+        self.name = backend.name
+
+    @property
+    def key(self) -> Hashable:
+        return self.backend.key
+
+    def iter_response(self, session: AgentSession, prompt: str, temperature: float, timeout: Tuple[float, float]) -> Iterator[str]:
+        self.recorder.prompt_tokens += count_tokens(prompt)
+        for delta in self.backend.iter_response(session, prompt, temperature, timeout):
+            self.recorder.token()
+            yield delta
+
+    async def aiter_response(self, session: AgentSession, prompt: str, temperature: float, timeout: Tuple[float, float]) -> AsyncIterator[str]:
+        self.recorder.prompt_tokens += count_tokens(prompt)
+        async for delta in self.backend.aiter_response(session, prompt, temperature, timeout):
+            self.recorder.token()
+            yield delta
+
+class TimedGame:
+    """在 GameAssemble 的各階段加上計時（只替換這個實例的方法，不修改類別）"""
+    _render_lock = threading.Lock()
+
+    def __init__(self, game: GameAssemble, recorder: TurnRecorder):
+        self.game = game
+        self.recorder = recorder
+        self.ui = ConsoleUI()
+        self.ui.game = game
+
+        parser, engine, narrator = game.parser, game.engine, game.narrator
+        parse_input, parse_input_async = parser.parse_input, parser.parse_input_async
+        execute_action = engine.execute_action
+        generate_story, generate_story_async = narrator.generate_story, narrator.generate_story_async
+
+        def timed_parse(user_input):
+            with recorder.stage("parse"):
+                return parse_input(user_input)
+
+        async def timed_parse_async(user_input):
+            with recorder.stage("parse"):
+                return await parse_input_async(user_input)
+
+        def timed_execute(command):
+            with recorder.stage("engine"):
+                return execute_action(command)
+
+        def timed_story(game_state, action_result):
+            recorder.narrating = True
+            with recorder.stage("narrate"):
+                return generate_story(game_state, action_result)
+
+        async def timed_story_async(game_state, action_result):
+            recorder.narrating = True
+            with recorder.stage("narrate"):
+                return await generate_story_async(game_state, action_result)
+
+        parser.parse_input, parser.parse_input_async = timed_parse, timed_parse_async
+        engine.execute_action = timed_execute
+        narrator.generate_story, narrator.generate_story_async = timed_story, timed_story_async
+
+        # 融合模式：Parser 只在融合呼叫前後使用，融合呼叫第一個 token 前的等待即為敘事的等待
+        if game.fused is not None:
+            parse_local, parse_llm, parse_llm_async = parser.parse_local, parser.parse_llm, parser.parse_llm_async
+            fused_run, fused_run_async = game.fused.run, game.fused.run_async
+
+            def timed_parse_local(user_input):
+                with recorder.stage("parse"):
+                    return parse_local(user_input)
+
+            def timed_parse_llm(user_input):
+                with recorder.stage("parse"):
+                    return parse_llm(user_input)
+
+            async def timed_parse_llm_async(user_input):
+                with recorder.stage("parse"):
+                    return await parse_llm_async(user_input)
+
+            def timed_fused(state, user_input):
+                recorder.narrating = True
+                with recorder.stage("narrate"):
+                    return fused_run(state, user_input)
+
+            async def timed_fused_async(state, user_input):
+                recorder.narrating = True
+                with recorder.stage("narrate"):
+                    return await fused_run_async(state, user_input)
+
+            parser.parse_local, parser.parse_llm, parser.parse_llm_async = timed_parse_local, timed_parse_llm, timed_parse_llm_async
+            game.fused.run, game.fused.run_async = timed_fused, timed_fused_async
+
+    def render(self, turn: Dict[str, Any]):
+        """以 Console 介面繪製回合結果（輸出到記憶體，stdout 為全域，繪製時互斥）"""
+        with self.recorder.stage("render"), self._render_lock, contextlib.redirect_stdout(io.StringIO()):
+            self.ui.print_story(iter([turn["story"]]))
+            if not turn["game_over"]:
+                self.ui.show_status(turn["game_state"])
+
+    def play(self, script: List[str]):
+        """同步重播腳本"""
+        for user_input in script:
+            if self.game.engine.state.game_over:
+                break
+            self.recorder.begin()
+            turn = self.game.process_input(user_input)
+            self.render(turn)
+            self.recorder.end(turn)
+
+    async def play_async(self, script: List[str]):
+        """以 asyncio 重播腳本"""
+        for user_input in script:
+            if self.game.engine.state.game_over:
+                break
+            self.recorder.begin()
+            turn = await self.game.process_input_async(user_input)
+            self.render(turn)
+            self.recorder.end(turn)
+
+def run_level(backend: LLMBackend, sessions: int, mode: str, rounds: int, fused: bool = False, scripts: Optional[List[List[str]]] = None) -> Dict[str, Any]:
+    """以 sessions 場同時進行的遊戲重播腳本，回傳統計結果"""
+    quiet = lambda level, message: None
+    session = AgentSession(pool_maxsize = max(8, sessions))
+    recorders = [TurnRecorder() for _ in range(sessions)]
+    games = [TimedGame(GameAssemble(backend.api_url, backend.api_key, logger = quiet, session = session, backend = TimedBackend(backend, recorder), fused = fused), recorder) for recorder in recorders]
+    scripts = scripts or SCRIPTS
+    scripts = [scripts[i % len(scripts)] * rounds for i in range(sessions)]
+
+    start_time = time.perf_counter()
+    if mode == "async":
+        async def play_all():
+            try:
+                await asyncio.gather(*(game.play_async(script) for game, script in zip(games, scripts)))
+            finally:
+                await session.aclose()
+        asyncio.run(play_all())
+    else:
+        with ThreadPoolExecutor(max_workers = sessions) as executor:
+            list(executor.map(TimedGame.play, games, scripts))
+        session.close()
+    wall = time.perf_counter() - start_time
+
+    turns = [turn for recorder in recorders for turn in recorder.turns]
+    llm_calls = sum(game.game.parser.policy.calls + game.game.narrator.policy.calls for game in games)
+    local_parses = sum(game.game.parser.matcher.hits for game in games)
+    return {
+        "sessions": sessions,
+        "turns": len(turns),
+        "errors": sum(not turn["success"] for turn in turns),
+        "llm_calls": llm_calls,
+        "local_parses": local_parses,
+        "wall_s": round(wall, 3),
+        "throughput_tps": round(len(turns) / wall, 3),
+        "latency_ms": percentiles([turn["latency"] for turn in turns]),
+        "ttft_ms": percentiles([turn["ttft"] for turn in turns]),
+        "prompt_tokens_per_turn": percentiles([turn["prompt_tokens"] for turn in turns], scale = 1),
+        "stages_ms": {stage: percentiles([turn[stage] for turn in turns]) for stage in STAGES}
+    }
+
+def git_commit() -> Optional[str]:
+    """目前的 commit（不是 git 儲存庫時回傳 None）"""
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output = True, text = True, check = True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any]):
+    """與先前的結果比較（比例小於 1 代表延遲降低或吞吐量下降）"""
+    previous = {level["sessions"]: level for level in baseline["levels"]}
+    print(f"\n與 {baseline['meta'].get('commit')} 比較（目前 / 先前）：")
+    for level in results["levels"]:
+        old = previous.get(level["sessions"])
+        if old is None:
+            continue
+        ratios = []
+        for name in ("p50", "p95", "p99"):
+            if level["latency_ms"][name] and old["latency_ms"][name]:
+                ratios.append(f"{name} {level['latency_ms'][name] / old['latency_ms'][name]:.2f}x")
+        ratios.append(f"吞吐量 {level['throughput_tps'] / old['throughput_tps']:.2f}x")
+        print(f"  {level['sessions']:>4} 場：" + "、".join(ratios))
+
+def print_level(level: Dict[str, Any]):
+    """印出一個同時遊戲數的結果"""
+    latency, ttft = level["latency_ms"], level["ttft_ms"]
+    stages = "、".join(f"{stage} {level['stages_ms'][stage]['mean']}" for stage in STAGES)
+    print(f"{level['sessions']:>4} 場｜{level['turns']} 回合（錯誤 {level['errors']}）｜吞吐量 {level['throughput_tps']} 回合/秒")
+    print(f"       延遲 p50 {latency['p50']} / p95 {latency['p95']} / p99 {latency['p99']} ms｜第一個 token p50 {ttft['p50']} / p95 {ttft['p95']} ms")
+    print(f"       各階段平均（ms）：{stages}｜每回合 Prompt 平均 {level['prompt_tokens_per_turn']['mean']} tokens")
+
+def main():
+    """主程式"""
+    parser = argparse.ArgumentParser(description = "回合延遲的端對端基準測試")
+    parser.add_argument("--sessions", type = int, nargs = "+", default = [1, 10, 100], help = "同時進行的遊戲數")
+    parser.add_argument("--mode", choices = ["sync", "async"], default = "sync", help = "同步（每場遊戲一個執行緒）或 asyncio")
+    parser.add_argument("--backend", choices = ["mock", "fake"], default = "mock", help = "本機模擬伺服器（經過 HTTP）或程序內的模擬後端")
+    parser.add_argument("--rounds", type = int, default = 1, help = "每場遊戲重播腳本的次數")
+    parser.add_argument("--latency", type = float, default = 0.05, help = "模擬 LLM 第一個 token 前的延遲（秒）")
+    parser.add_argument("--token-rate", type = float, default = 400.0, help = "模擬 LLM 每秒生成的 token 數")
+    parser.add_argument("--jitter", type = float, default = 0.1)
+    parser.add_argument("--error-rate", type = float, default = 0.0)
+    parser.add_argument("--seed", type = int, default = 0)
+    parser.add_argument("--fused", action = "store_true", help = "啟用融合模式（一次 LLM 呼叫同時解析並生成敘事）")
+    parser.add_argument("--journal", help = "以回合日誌中的玩家輸入取代內建的腳本")
+    parser.add_argument("--json", help = "輸出 JSON 的路徑")
+    parser.add_argument("--baseline", help = "先前輸出的 JSON，用於比較")
+    parser.add_argument("--trace", help = "追蹤檔（JSONL）的路徑，指定時啟用統計（會增加少許耗時）")
+    args = parser.parse_args()
+    if args.trace:
+        TELEMETRY.enable(trace_path = args.trace)
+    scripts = journal_scripts(args.journal) if args.journal else None
+
+    model = SimulatedModel(latency = args.latency, token_rate = args.token_rate, jitter = args.jitter, error_rate = args.error_rate, seed = args.seed)
+    server = None
+    if args.backend == "mock":
+        server = MockLLMServer(model).start()
+        backend = OllamaBackend(server.url)
+    else:
+        backend = FakeBackend(simulated = model)
+
+    results = {
+        "meta": {
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "mode": args.mode,
+            "backend": args.backend,
+            "rounds": args.rounds,
+            "fused": args.fused,
+            "journal": args.journal,
+            "model": {"latency": args.latency, "token_rate": args.token_rate, "jitter": args.jitter, "error_rate": args.error_rate, "seed": args.seed},
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S")
+        },
+        "levels": []
+    }
+    try:
+        for sessions in args.sessions:
+            level = run_level(backend, sessions, args.mode, args.rounds, fused = args.fused, scripts = scripts)
+            results["levels"].append(level)
+            print_level(level)
+    finally:
+        if server is not None:
+            server.stop()
+        TELEMETRY.disable()
+
+    if args.json:
+        with open(args.json, "w", encoding = "utf-8") as f:
+            json.dump(results, f, ensure_ascii = False, indent = 2)
+        print(f"\n結果已輸出至 {args.json}")
+    if args.baseline:
+        with open(args.baseline, "r", encoding = "utf-8") as f:
+            compare(results, json.load(f))
+
+if __name__ == "__main__":
+    main()
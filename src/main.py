@@ -1,40 +1,63 @@
 """
 程式進入點：
     1. 設定 API 資訊
-    2. 選擇要使用的介面
+    2. 選擇要使用的介面（--mode 指定，未指定時詢問）
+    3. 各介面只在選擇後才載入，啟動時不會載入其他介面的模組
+    4. 網頁介面在同一個程序中啟動 Streamlit，不再另外啟動 Python 程序
+
+執行方式：python -m src.main [--mode console|web|server] [介面的參數]
 """
 
-import sys
+import argparse
 import os
-import subprocess
+import sys
+from typing import List, Optional
 
-from src.ui.console.console import main as console_main
+MODES = {"1": "console", "2": "web", "3": "server"}
 
-def run_console():
+def run_console(args: List[str]):
     """執行 Console 模式"""
     print("使用終端機介面⋯⋯")
+    from src.ui.console.console import main as console_main
     console_main()
 
-def run_streamlit():
-    """執行 Console 模式"""
+def run_streamlit(args: List[str]):
+    """執行網頁介面（Streamlit 在同一個程序中執行，參數傳給 streamlit run）"""
     print("使用網頁介面⋯⋯")
 
     path = os.path.join(os.path.dirname(__file__), "ui/web/streamlit.py")
     try:
-        subprocess.run([sys.executable, "-m", "streamlit", "run", path])
+        from streamlit.web import cli as streamlit_cli
+        streamlit_cli.main(["run", path, *args], prog_name = "streamlit")
+    except SystemExit as e:
+        if e.code:
+            print(f"Streamlit 異常結束（代碼 {e.code}）")
     except Exception as e:
         print(f"無法起動 Streamlit\n錯誤訊息：{e}")
 
+def run_server(args: List[str]):
+    """執行伺服器模式（參數傳給伺服器）"""
+    print("使用伺服器模式⋯⋯")
+    from src.ui.server.server import main as server_main
+    server_main(args)
 
-def main():
+RUNNERS = {"console": run_console, "web": run_streamlit, "server": run_server}
+
+def main(argv: Optional[List[str]] = None):
     """主程式"""
-    print("歡迎光臨！")
-    mode = int(input("請選擇顯示方式（1 為終端機介面、2 為網頁介面）："))
+    # -h 在指定介面時交給該介面處理
+    parser = argparse.ArgumentParser(description = "文字冒險遊戲", add_help = False)
+    parser.add_argument("--mode", choices = list(RUNNERS), help = "顯示方式（未指定時詢問）")
+    args, rest = parser.parse_known_args(argv)
+    if args.mode is None and ("-h" in rest or "--help" in rest):
+        parser.print_help()
+        return
 
-    if mode == 1:
-        run_console()
-    else:
-        run_streamlit()
+    print("歡迎光臨！")
+    mode = args.mode
+    if mode is None:
+        mode = MODES.get(input("請選擇顯示方式（1 為終端機介面、2 為網頁介面、3 為伺服器模式）：").strip(), "web")
+    RUNNERS[mode](rest)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main(sys.argv[1:])
@@ -0,0 +1,458 @@
+"""
+遊戲規則表：
+    1. 以狀態轉換表描述所有行動（條件、狀態變更、結果文字、是否需要 LLM 生成敘事）
+    2. 以檢查規則描述玩家與 NPC 的狀態檢查（讀取與修改的欄位）
+    3. 將規則表編譯為以（行動、玩家地點、指令參數）為鍵值的索引，並預先算出每個轉換需要重新檢查的規則
+       （條件與狀態變更為小函式，同一個鍵值的候選條件合併為一個判斷函式，多個狀態變更合併為一個函式）
+    4. 提供規則表給狀態圖產生工具使用
+"""
+
+from operator import attrgetter
+from typing import NamedTuple, Optional, Callable, Union, Tuple, Dict, Any, FrozenSet, List
+
+from src.repository.core.state import GameState, LOCATIONS, NPCS, ITEMS, CHOICES
+
+# 指令參數：不在已知名稱中的參數（如不存在的地點）
+OTHER = "*"
+
+# 各行動的參數欄位與已知參數
+ARGUMENT_KEYS = {"move": "target", "talk": "target", "use": "object", "choose": "choice"}
+ARGUMENTS = {"move": LOCATIONS, "explore": (None,), "talk": NPCS, "use": ITEMS, "choose": CHOICES}
+
+Guard = Callable[[GameState, Any], bool]                # 條件：由狀態與指令參數判斷
+Result = Union[str, Callable[[GameState, Any], str]]    # 結果文字：固定文字，或由狀態與指令參數產生
+
+class Effect(NamedTuple):
+    """狀態變更：修改的欄位與變更狀態的函式（參數為狀態與指令參數）"""
+    field: str
+    apply: Callable[[GameState, Any], None]
+
+class Transition(NamedTuple):
+    """狀態轉換：同一個鍵值下，依序採用第一個符合條件的轉換"""
+    action: str                                 # 行動種類
+    target: Union[None, str, Tuple[str, ...]]   # 指令參數（None 代表任何參數，OTHER 代表未知的參數）
+    location: Optional[str]                     # 玩家所在地點（None 代表任何地點）
+    guard: Optional[Guard]                      # 額外條件（在狀態變更前判斷）
+    effects: Tuple[Effect, ...]                 # 狀態變更（依序執行）
+    result: Result                              # 結果文字（在狀態變更前產生）
+    llm: bool                                   # 是否需要 Narrator 生成敘事
+    note: str                                   # 條件與結果的簡短說明（用於狀態圖）
+
+class Invariant(NamedTuple):
+    """狀態檢查：只有在讀取的欄位可能被修改時才需要重新檢查"""
+    name: str
+    reads: FrozenSet[str]
+    writes: FrozenSet[str]
+    check: Callable[[GameState], None]
+    endings: Tuple[Tuple[str, str], ...]    # （條件說明、結局），用於狀態圖
+
+class CompiledTransition(NamedTuple):
+    """編譯後的狀態轉換"""
+    apply: Optional[Callable[[GameState, Any], None]]   # 合併所有狀態變更的函式，None 代表不改變狀態
+    result: Result
+    llm: bool
+    checks: Tuple[Callable[[GameState], None], ...]     # 需要重新檢查的規則（依原本的順序）
+    source: Transition
+
+def _owner(field: str) -> Tuple[Callable[[GameState], Any], str]:
+    """將欄位（如 npc_a.talk_count）拆為取得所屬物件的函式與欄位名稱"""
+    owner, _, name = field.rpartition(".")
+    return (attrgetter(owner) if owner else lambda state: state), name
+
+# ─── 狀態變更 ───
+
+def add(field: str, delta: int) -> Effect:
+    """欄位加上 delta"""
+    owner, name = _owner(field)
+    if "." not in field:
+        def apply(state: GameState, argument: Any):
+            setattr(state, name, getattr(state, name) + delta)
+    else:
+        def apply(state: GameState, argument: Any):
+            target = owner(state)
+            setattr(target, name, getattr(target, name) + delta)
+    return Effect(field, apply)
+
+def put(field: str, value: Any) -> Effect:
+    """欄位設為 value"""
+    owner, name = _owner(field)
+    return Effect(field, lambda state, argument: setattr(owner(state), name, value))
+
+def give(item: str) -> Effect:
+    """將物品加入物品欄"""
+    return Effect("inventory", lambda state, argument: state.inventory.append(item))
+
+def take(item: str) -> Effect:
+    """從物品欄移除物品"""
+    return Effect("inventory", lambda state, argument: state.inventory.remove(item))
+
+def heal(amount: int, limit: int) -> Effect:
+    """恢復體力，不超過上限"""
+
+    def apply(state: GameState, argument: Any):
+        state.player_health = min(state.player_health + amount, limit)
+
+    return Effect("player_health", apply)
+
+def goto() -> Effect:
+    """玩家移動到指令的目標地點"""
+
+    def apply(state: GameState, argument: Any):
+        state.player_location = argument
+
+    return Effect("player_location", apply)
+
+def summon(npc: str) -> Effect:
+    """NPC 移動到玩家所在地點"""
+    field = f"npc_{npc.lower()}"
+
+    def apply(state: GameState, argument: Any):
+        getattr(state, field).location = state.player_location
+
+    return Effect(f"{field}.location", apply)
+
+# ─── 條件 ───
+
+def at(npc: str) -> Guard:
+    """玩家與 NPC 在同一地點"""
+    field = f"npc_{npc.lower()}"
+    return lambda state, argument: state.player_location == getattr(state, field).location
+
+def equals(field: str, value: Any) -> Guard:
+    """欄位等於 value"""
+    owner, name = _owner(field)
+    return lambda state, argument: getattr(owner(state), name) == value
+
+def every(*guards: Guard) -> Guard:
+    """所有條件皆成立（依序判斷，不成立時不再判斷後面的條件）"""
+
+    def guard(state: GameState, argument: Any) -> bool:
+        for check in guards:
+            if not check(state, argument):
+                return False
+        return True
+
+    return guard
+
+AT = {npc: at(npc) for npc in NPCS}
+
+# ─── 行動 ───
+
+def _valid_locations(state: GameState):
+    """目前可以前往的地點"""
+    locations = list(LOCATIONS)
+    if state.player_location in locations:
+        locations.remove(state.player_location)
+    return locations
+
+def _unreachable(state: GameState, target: Any) -> str:
+    """無法到達的地點"""
+    locations = _valid_locations(state)
+    return f"{target}是無法到達的，你能前往的地點有{locations[0]}、{locations[1]}、{locations[2]}。"
+
+MOVED = (goto(), add("player_health", -1))
+MOVE = [
+    Transition("move", OTHER, None, None, (), _unreachable, False, "地點不存在"),
+    Transition("move", None, None, lambda state, argument: argument == state.player_location, (), _unreachable, False, "已在該地點"),
+    Transition("move", None, None, lambda state, argument: not state.open_classroom, (), "教室上鎖了，無法出去。「為什麼在教室裡需要鑰匙才能開鎖？」你疑惑地心想。", True, "教室上鎖"),
+    Transition("move", None, None, lambda state, argument: state.npc_a.location == argument and state.npc_c.location == argument, MOVED,
+               "你移動到了{target}。你看見 A 跟 C 都出現在教室。他們並沒有主動朝你攀談，而是像個擺設一樣矗立著。", True, "遇見 A、C"),
+    Transition("move", None, None, lambda state, argument: state.npc_a.location == argument, MOVED,
+               lambda state, target: f"你移動到了{target}，你看見 A 也在這裡。教師辦公室充滿書與試卷，有很重的油墨味。", True, "遇見 A"),
+    Transition("move", None, None, lambda state, argument: state.npc_b.location == argument, MOVED,
+               lambda state, target: f"你移動到了{target}，你看見 B 也在這裡。福利社裡雖有商品陳列，但沒有其他客人，也沒有店員。", True, "遇見 B"),
+    Transition("move", None, None, lambda state, argument: state.npc_c.location == argument, MOVED,
+               lambda state, target: f"你移動到了{target}，你看見 C 也在這裡。他一個人坐在書架旁安靜地閱讀科幻小說。", True, "遇見 C"),
+    Transition("move", None, None, None, MOVED, lambda state, target: f"你移動到了{target}。", True, "移動"),
+]
+
+TIRED = add("player_health", -1)
+EXPLORE = [
+    Transition("explore", None, "教室", lambda state, argument: not state.open_classroom, (TIRED, give("鑰匙")), "你找到了一副鑰匙，看起來與門鎖相符。", True, "找到鑰匙"),
+    Transition("explore", None, "教室", lambda state, argument: not state.find_microphone and state.npc_a.talk_count == 4, (TIRED, put("find_microphone", True)),
+               "你找到了 A 請你幫忙拿的麥克風，他現在在教師辦公室等你交還給他。", True, "找到麥克風"),
+    Transition("explore", None, "教室", None, (TIRED,), "教室裡沒有什麼特別的。", False, "沒有發現"),
+    Transition("explore", None, "圖書館", lambda state, argument: state.player_sanity == 1 and "A 的疑問" in state.inventory and "B 的疑問" in state.inventory, (TIRED, give("遺書")),
+               "你找到了一封遺書，署名是⋯⋯", False, "找到遺書"),
+    Transition("explore", None, "圖書館", None, (TIRED,), "圖書館裡沒有什麼特別的。", False, "沒有發現"),
+    Transition("explore", None, "福利社", lambda state, argument: "麵包" not in state.inventory and state.num_bread > 0, (TIRED, add("num_bread", -1), give("麵包")),
+               "你找到了一塊麵包，並且小心翼翼地收藏它。", True, "找到麵包"),
+    Transition("explore", None, "福利社", None, (TIRED,), "福利社裡沒有什麼特別的。", False, "沒有發現"),
+    Transition("explore", None, None, None, (TIRED,), "教師辦公室裡沒有什麼特別的。", True, "沒有發現"),
+]
+
+A_REQUESTS = {
+    1: "A 問你是否能幫他把下堂課要考的考卷拿到教室裡。",
+    2: "A 問你是否能幫他到教室宣布一個公告。",
+    3: "A 問你是否能幫他到圖書館歸還書籍。",
+    4: "A 把麥克風忘在教室裡了，問你是否能幫他拿回教師辦公室。",
+    5: "A 問你是否能去福利社幫他買咖啡。",
+}
+B_MOODS = {
+    1: "你和 B 隨意聊了些國中的事，兩個人都很懷念那段時光。",
+    2: "你和 B 聊到升高中後的事，B 認為你看起來很不快樂，想給你一些建議，但你覺得他在多管閒事，兩人不歡而散。",
+    3: "B 說他時常看到你在圖書館自言自語，但你不理解為什麼 B 為何這麼說，明明自己是在跟 C 聊天啊。但你並沒有向 B 提問。",
+}
+
+def _absent(state: GameState, target: Any) -> str:
+    """NPC 不在這裡"""
+    return f"{target} 不在這裡，你得先找到他。"
+
+# A 在這裡、沒有崩潰、沒有在等待回覆
+A_LISTENING = every(AT["A"], lambda state, argument: not state.npc_a.collapsed and not state.npc_a.wait_for_response)
+
+A_TALKED = (add("npc_a.talk_count", 1), add("npc_c.other_talk_count", 1))
+B_TALKED = (add("npc_b.talk_count", 1), add("npc_c.other_talk_count", 1))
+B_HURT = (add("player_sanity", -1), add("npc_b.sanity", -1))
+TALK = [
+    Transition("talk", OTHER, None, None, (), lambda state, target: f"{target}並不在校園裡，你能交談的對象有 A、B、C。", False, "對象不存在"),
+    Transition("talk", "A", None, every(AT["A"], lambda state, argument: state.npc_a.collapsed), (), "A 已經不願意再與你交談了。", False, "A 崩潰"),
+] + [
+    Transition("talk", "A", None, every(equals("npc_a.talk_count", count - 1), A_LISTENING), A_TALKED + (put("npc_a.wait_for_response", True),),
+               A_REQUESTS[count] + "，你思考著，還沒做出答覆。", True, f"A 的第 {count} 個請求")
+    for count in A_REQUESTS
+] + [
+    # A 的請求已用完（第五次對話就會結束遊戲，正常遊玩不會發生）
+    Transition("talk", "A", None, A_LISTENING, A_TALKED, _absent, False, "A 沒有更多請求"),
+] + [
+    Transition("talk", "B", None, every(AT["B"], equals("npc_b.talk_count", count - 1)), B_TALKED + effects, B_MOODS[mood], True, f"與 B 的第 {count} 次談話")
+    for count, effects, mood in (
+        (1, (), 1),
+        (2, B_HURT, 2),
+        (3, B_HURT, 3),
+        (4, B_HURT + (put("npc_a.sanity", 0),), 2),
+        (5, (), 1),
+    )
+] + [
+    # 與 B 的談話已用完（第五次談話就會結束遊戲，正常遊玩不會發生）
+    Transition("talk", "B", None, AT["B"], B_TALKED, _absent, False, "B 沒有更多話題"),
+    Transition("talk", "C", None, AT["C"], (put("npc_c.other_talk_count", 0),), "C 和你介紹他正在看的書，跟 C 待在一起讓你感到非常平靜。", True, "與 C 談話"),
+    Transition("talk", None, None, None, (), _absent, False, "對象不在這裡"),
+]
+
+def _inventory(state: GameState, item: Any) -> str:
+    """可以使用的物品"""
+    return f"""你可以使用的物品有：{"、".join(state.inventory) if state.inventory else "無"}。"""
+
+def _c_revealed(state: GameState, item: Any) -> str:
+    """C 出現並露出真面目"""
+    prefix = "C 突然出現在你面前，" if state.npc_c.location != state.player_location else ""
+    return prefix + "C 一語不發地直視你，過去和藹的面容變得相當冰冷。"
+
+C_STARE = "C 一語不發地直視你，過去和藹的面容變得相當冰冷。"
+C_DODGE = "C 表示不理解你在說什麼，並轉移話題。"
+USE = [
+    Transition("use", None, None, lambda state, argument: argument not in state.inventory, (), _inventory, False, "沒有該物品"),
+    Transition("use", "鑰匙", "教室", None, (take("鑰匙"), put("open_classroom", True)), "你用鑰匙打開了教室的門，現在你終於可以離開教室了。", True, "打開教室"),
+    Transition("use", "麵包", None, None, (take("麵包"), heal(3, 10)), "你吃麵包來填飽肚子。", True, "恢復體力"),
+    Transition("use", "考卷", "教室", None, (take("考卷"),), "你把考卷放在教室講台上。", True, "放考卷"),
+    Transition("use", "公告", "教室", None, (take("公告"), add("player_sanity", -1)), "你在教室中宣布了公告，站在台上讓你感到極度焦慮。", True, "宣布公告"),
+    Transition("use", "書籍", "圖書館", None, (take("書籍"),), "你把 A 的書還給圖書館。", True, "歸還書籍"),
+    Transition("use", "麥克風", None, AT["A"], (take("麥克風"), give("A 的疑問"), add("player_sanity", -1)),
+               "你把麥克風交給了 A，A 說他很擔心你在班上都沒有朋友，但你不理解為什麼 A 為何這麼說，明明有 C 陪伴自己啊。但你並沒有向 A 提問。", True, "交還麥克風"),
+    Transition("use", "現金", "福利社", None, (take("現金"), give("咖啡")), "你幫 A 買到了咖啡。", True, "買咖啡"),
+    Transition("use", "咖啡", None, AT["A"], (take("咖啡"),), "你把買來的咖啡交給了 A。", True, "交給 A 咖啡"),
+] + [
+    transition
+    for question in ("A 的疑問", "B 的疑問")
+    for transition in (
+        Transition("use", question, None, every(AT["C"], lambda state, argument: not state.ask_c), (take(question), put("ask_c", True)), C_DODGE, True, "第一次向 C 提問"),
+        Transition("use", question, None, AT["C"], (put("npc_c.true_color", True),), C_STARE, True, "再次向 C 提問"),
+    )
+] + [
+    Transition("use", "遺書", "教室", equals("player_sanity", 1), (put("player_remember", True),), "你想起了一切。", False, "想起一切"),
+    Transition("use", "遺書", None, None, (put("npc_c.true_color", True), summon("C")), _c_revealed, True, "C 露出真面目"),
+    Transition("use", None, None, None, (), lambda state, item: f"{item}並沒有發揮任何作用。", False, "沒有作用"),
+]
+
+A_GIFTS = {
+    1: ("考卷", "A 將考卷遞給了你，請你放在教室講台。"),
+    2: ("公告", "A 將公告細節告訴了你，請你一定要宣布完整的內容。"),
+    3: ("書籍", "A 將書籍遞給了你，並感謝你為他還書。"),
+    4: (None, "A 告訴你麥克風大概在教室的哪邊，並說他會在教師辦公室等你拿來。"),
+    5: ("現金", "A 給了你現金，讓你買兩杯，其中一杯算他請你喝的。"),
+}
+ANSWERED = put("npc_a.wait_for_response", False)
+CHOOSE = [
+    Transition("choose", None, None, lambda state, argument: not state.npc_a.wait_for_response, (), "現在沒有要回應的請求。", False, "沒有請求"),
+] + [
+    Transition("choose", "接受", None, equals("npc_a.talk_count", count), (ANSWERED, add("npc_a.help_count", 1)) + ((give(item),) if item else ()),
+               text, True, f"接受第 {count} 個請求")
+    for count, (item, text) in A_GIFTS.items()
+] + [
+    Transition("choose", ("拒絕", OTHER), None, None, (ANSWERED, add("npc_a.sanity", -1)), "A 面帶失望地看著你，深深嘆了一口氣。", True, "拒絕請求"),
+]
+
+INVALID = Transition("invalid", None, None, None, (), "無法理解指令，請嘗試用更清楚的方式描述你的行動。", False, "無法理解指令")
+
+TRANSITIONS: List[Transition] = MOVE + EXPLORE + TALK + USE + CHOOSE
+
+# ─── 狀態檢查（依序執行，後面的結局會覆蓋前面的結局） ───
+
+def _end(state: GameState, ending: str):
+    """結束遊戲"""
+    state.game_over = True
+    state.ending = ending
+
+def check_self(state: GameState):
+    """確認玩家的狀態"""
+    if state.player_remember:
+        _end(state, "ending_1")
+    if state.player_health <= 0:
+        _end(state, "ending_2")
+    if state.player_sanity <= 0:
+        _end(state, "ending_3")
+
+def check_npc_a(state: GameState):
+    """確認 A 的狀態"""
+    if state.npc_a.sanity <= 0:
+        state.npc_a.collapsed = True
+    if state.npc_a.talk_count >= 5 or state.npc_a.help_count >= 3:
+        _end(state, "ending_4")
+
+def check_npc_b(state: GameState):
+    """確認 B 的狀態"""
+    if state.npc_b.sanity <= 0:
+        state.npc_b.collapsed = True
+    if state.npc_b.talk_count >= 5:
+        _end(state, "ending_4")
+
+def check_npc_c(state: GameState):
+    """確認 C 的狀態"""
+    if state.npc_c.other_talk_count == 3:
+        state.npc_c.sanity -= 1
+        state.npc_c.other_talk_count = 0
+    if state.npc_c.sanity <= 0:
+        state.npc_c.collapsed = True
+        _end(state, "ending_5")
+    if state.npc_c.true_color:
+        _end(state, "ending_6")
+
+ENDED = ("game_over", "ending")
+INVARIANTS = [
+    Invariant("self", frozenset({"player_remember", "player_health", "player_sanity"}), frozenset(ENDED), check_self,
+              (("想起一切", "ending_1"), ("體力歸零", "ending_2"), ("理智歸零", "ending_3"))),
+    Invariant("npc_a", frozenset({"npc_a.sanity", "npc_a.talk_count", "npc_a.help_count"}), frozenset(("npc_a.collapsed",) + ENDED), check_npc_a,
+              (("A 的請求用完或幫忙三次", "ending_4"),)),
+    Invariant("npc_b", frozenset({"npc_b.sanity", "npc_b.talk_count"}), frozenset(("npc_b.collapsed",) + ENDED), check_npc_b,
+              (("與 B 談話五次", "ending_4"),)),
+    Invariant("npc_c", frozenset({"npc_c.other_talk_count", "npc_c.sanity", "npc_c.true_color"}),
+              frozenset(("npc_c.sanity", "npc_c.other_talk_count", "npc_c.collapsed") + ENDED), check_npc_c,
+              (("C 的理智歸零", "ending_5"), ("C 露出真面目", "ending_6"))),
+]
+
+class RuleTable:
+    """編譯後的規則表，以（行動、玩家地點、指令參數）查詢候選的狀態轉換"""
+    def __init__(self, transitions: List[Transition] = TRANSITIONS, invariants: List[Invariant] = INVARIANTS, invalid: Transition = INVALID):
+        self.transitions = transitions
+        self.invariants = invariants
+        self.checks = tuple(invariant.check for invariant in invariants)    # 所有檢查（遊戲已結束時使用）
+
+        self._compiled = {transition: self._compile(transition) for transition in transitions}
+        self._dispatchers: Dict[Tuple[CompiledTransition, ...], Callable[[GameState, Any], int]] = {}   # 相同的候選轉換共用同一個函式
+        self.invalid = self._compile(invalid)
+
+        # 預先建立所有已知組合的索引，其他組合（如不在地點列表中的玩家位置）在第一次查詢時建立
+        self._index: Dict[Tuple[str, Any, Any], Tuple[Tuple[CompiledTransition, ...], Callable[[GameState, Any], int]]] = {}
+        for action, arguments in ARGUMENTS.items():
+            for location in LOCATIONS:
+                for argument in arguments + ((OTHER,) if action in ARGUMENT_KEYS else ()):
+                    self._index[action, location, argument] = self._select(action, location, argument)
+
+    @staticmethod
+    def _apply(effects: Tuple[Effect, ...]) -> Optional[Callable[[GameState, Any], None]]:
+        """將狀態變更合併為一個函式（只有一個時直接使用），沒有狀態變更時回傳 None"""
+        if not effects:
+            return None
+        if len(effects) == 1:
+            return effects[0].apply
+        steps = tuple(effect.apply for effect in effects)
+
+        def apply(state: GameState, argument: Any):
+            for step in steps:
+                step(state, argument)
+
+        return apply
+
+    def _compile(self, transition: Transition) -> CompiledTransition:
+        """編譯狀態轉換：合併狀態變更為一個函式，並算出修改的欄位會影響哪些檢查"""
+        apply = self._apply(transition.effects)
+        dirty = {effect.field for effect in transition.effects}
+        checks = []
+        for invariant in self.invariants:
+            if invariant.reads & dirty:
+                checks.append(invariant.check)
+                dirty |= invariant.writes
+        return CompiledTransition(apply, transition.result, transition.llm, tuple(checks), transition)
+
+    def _dispatch(self, candidates: Tuple[CompiledTransition, ...]) -> Callable[[GameState, Any], int]:
+        """將候選轉換的條件依序合併為一個函式，回傳第一個成立的轉換編號（都不成立時回傳 -1）"""
+        dispatch = self._dispatchers.get(candidates)
+        if dispatch is None:
+            # 沒有條件的轉換一定成立，之後的轉換不會被採用
+            guards = []
+            fallback = -1
+            for i, transition in enumerate(candidates):
+                if transition.source.guard is None:
+                    fallback = i
+                    break
+                guards.append((i, transition.source.guard))
+            # 最常見的沒有條件與只有一個條件的情況不需要逐一檢查
+            if not guards:
+                dispatch = lambda state, argument: fallback
+            elif len(guards) == 1:
+                (index, guard), = guards
+                dispatch = lambda state, argument: index if guard(state, argument) else fallback
+            else:
+                guards = tuple(guards)
+
+                def dispatch(state: GameState, argument: Any) -> int:
+                    for i, guard in guards:
+                        if guard(state, argument):
+                            return i
+                    return fallback
+
+            self._dispatchers[candidates] = dispatch
+        return dispatch
+
+    def _select(self, action: str, location: Any, argument: Any) -> Tuple[Tuple[CompiledTransition, ...], Callable[[GameState, Any], int]]:
+        """依序列出符合（行動、地點、參數）的狀態轉換，並編譯條件判斷"""
+        selected = []
+        for transition in self.transitions:
+            if transition.action != action:
+                continue
+            if transition.location is not None and transition.location != location:
+                continue
+            targets = transition.target if isinstance(transition.target, tuple) else (transition.target,)
+            if None not in targets and argument not in targets:
+                continue
+            selected.append(self._compiled[transition])
+        candidates = tuple(selected)
+        return candidates, self._dispatch(candidates)
+
+    def find(self, state: GameState, command: Dict[str, Any]) -> Tuple[CompiledTransition, Any]:
+        """找出指令在目前狀態下適用的狀態轉換，回傳（狀態轉換、指令參數）"""
+        action = command.get("action")
+        key = ARGUMENT_KEYS.get(action)
+        argument = command.get(key, "") if key else None
+        if action == "talk":
+            argument = argument.upper()
+
+        # 已知的參數直接查詢索引，未知（或無法作為鍵值）的參數以 OTHER 查詢
+        try:
+            entry = self._index.get((action, state.player_location, argument))
+        except TypeError:
+            entry = None
+        if entry is None:
+            if action not in ARGUMENTS:
+                return self.invalid, None
+            known = argument if argument in ARGUMENTS[action] else OTHER
+            entry = self._index.get((action, state.player_location, known))
+            if entry is None:
+                entry = self._index[action, state.player_location, known] = self._select(action, state.player_location, known)
+
+        candidates, dispatch = entry
+        i = dispatch(state, argument)
+        return (candidates[i] if i >= 0 else self.invalid), argument
+
+RULES = RuleTable()
@@ -0,0 +1,202 @@
+"""
+遊戲存檔（緊湊的二進位格式）：
+    1. 將遊戲狀態、復原用的快照與對話紀錄編碼為一筆紀錄，狀態以 GameState.pack() 的整數儲存
+    2. 紀錄與存檔的開頭皆為格式版本，讀取不支援的版本時拋出 ValueError
+    3. 多場遊戲寫入同一個存檔，開頭為索引（遊戲編號 -> 位置），以 mmap 開啟後只解碼需要的紀錄
+    4. 還原時直接載入狀態，不需要重新執行每一回合
+
+紀錄格式（little-endian）：
+    版本 B、回合數 I、快照數 H、對話數 I
+    狀態：長度 H + 整數
+    快照：（長度 H + 整數）* 快照數
+    對話：（角色長度 B + 內容長度 I + 角色 + 內容）* 對話數
+
+存檔格式：
+    MAGIC 4s、版本 H、紀錄數 I、索引長度 I
+    索引：（編號長度 H + 位置 Q + 長度 I + 編號）* 紀錄數
+    紀錄：依索引的位置排列
+"""
+
+import mmap
+import os
+import struct
+from typing import NamedTuple, Optional, Dict, List, Tuple, Iterable, Iterator, Union
+
+from src.repository.core.state import GameState, GameSnapshot
+
+RECORD_VERSION = 1
+FILE_VERSION = 1
+MAGIC = b"LGSV"
+
+RECORD_HEADER = struct.Struct("<BIHI")
+FILE_HEADER = struct.Struct("<4sHII")
+INDEX_ENTRY = struct.Struct("<HQI")
+MESSAGE_HEADER = struct.Struct("<BI")
+CODE_LENGTH = struct.Struct("<H")
+
+Buffer = Union[bytes, bytearray, memoryview]
+
+class SaveRecord(NamedTuple):
+    """一場遊戲的存檔內容"""
+    state: GameState
+    history: List[GameSnapshot]         # 復原用的快照（由舊到新）
+    messages: List[Tuple[str, str]]     # 對話紀錄（角色, 內容）
+    turns: int
+
+def _put_code(parts: List[bytes], code: int):
+    """寫入壓縮後的整數"""
+    data = code.to_bytes((code.bit_length() + 7) // 8, "little")
+    parts.append(CODE_LENGTH.pack(len(data)))
+    parts.append(data)
+
+def _take_bytes(data: Buffer, offset: int, length: int) -> Buffer:
+    """讀取指定長度的內容（紀錄被截斷時拋出 ValueError）"""
+    if offset + length > len(data):
+        raise ValueError("紀錄格式錯誤。")
+    return data[offset:offset + length]
+
+def _take_code(data: Buffer, offset: int) -> Tuple[int, int]:
+    """讀取壓縮後的整數，回傳整數與下一個位置"""
+    (length,) = CODE_LENGTH.unpack_from(data, offset)
+    offset += CODE_LENGTH.size
+    return int.from_bytes(_take_bytes(data, offset, length), "little"), offset + length
+
+def encode_record(state: GameState, history: Iterable[GameSnapshot] = (), messages: Iterable[Tuple[str, str]] = (), turns: int = 0) -> bytes:
+    """將遊戲編碼為一筆紀錄"""
+    history = list(history)
+    messages = list(messages)
+    parts = [RECORD_HEADER.pack(RECORD_VERSION, turns, len(history), len(messages))]
+    _put_code(parts, state.pack())
+    for snapshot in history:
+        _put_code(parts, GameState.from_snapshot(snapshot).pack())
+    for role, content in messages:
+        role_data, content_data = role.encode("utf-8"), content.encode("utf-8")
+        parts.append(MESSAGE_HEADER.pack(len(role_data), len(content_data)))
+        parts.append(role_data)
+        parts.append(content_data)
+    return b"".join(parts)
+
+def decode_record(data: Buffer) -> SaveRecord:
+    """由 encode_record() 產生的紀錄還原遊戲（格式錯誤時拋出 ValueError）"""
+    try:
+        return _decode_record(memoryview(data))
+    except (struct.error, IndexError) as e:
+        raise ValueError("紀錄格式錯誤。") from e
+
+def _decode_record(data: memoryview) -> SaveRecord:
+    """解碼紀錄"""
+    version, turns, history_count, message_count = RECORD_HEADER.unpack_from(data, 0)
+    if version != RECORD_VERSION:
+        raise ValueError(f"不支援的紀錄版本：{version}")
+    offset = RECORD_HEADER.size
+
+    code, offset = _take_code(data, offset)
+    state = GameState.unpack(code)
+    history = []
+    for _ in range(history_count):
+        code, offset = _take_code(data, offset)
+        history.append(GameState.unpack_snapshot(code))
+
+    messages = []
+    for _ in range(message_count):
+        role_length, content_length = MESSAGE_HEADER.unpack_from(data, offset)
+        offset += MESSAGE_HEADER.size
+        role = str(_take_bytes(data, offset, role_length), "utf-8")
+        offset += role_length
+        messages.append((role, str(_take_bytes(data, offset, content_length), "utf-8")))
+        offset += content_length
+    return SaveRecord(state, history, messages, turns)
+
+def write_savefile(path: str, records: Dict[str, Buffer]):
+    """將多筆紀錄寫入同一個存檔（先寫入暫存檔再取代，避免程序中斷時留下不完整的檔案）"""
+    keys = [key.encode("utf-8") for key in records]
+    index_size = sum(INDEX_ENTRY.size + len(key) for key in keys)
+    offset = FILE_HEADER.size + index_size
+
+    index = []
+    for key, record in zip(keys, records.values()):
+        index.append(INDEX_ENTRY.pack(len(key), offset, len(record)))
+        index.append(key)
+        offset += len(record)
+
+    with open(path + ".tmp", "wb") as f:
+        f.write(FILE_HEADER.pack(MAGIC, FILE_VERSION, len(keys), index_size))
+        f.write(b"".join(index))
+        for record in records.values():
+            f.write(record)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(path + ".tmp", path)
+
+class SaveFile:
+    """以 mmap 開啟的存檔，開啟時只讀取索引，紀錄在使用時才解碼"""
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        self._map = None
+        try:
+            if os.fstat(self._file.fileno()).st_size < FILE_HEADER.size:
+                raise ValueError("存檔格式錯誤。")
+            self._map = mmap.mmap(self._file.fileno(), 0, access = mmap.ACCESS_READ)
+            self._index = self._read_index()
+        except Exception:
+            self.close()
+            raise
+
+    def _read_index(self) -> Dict[str, Tuple[int, int]]:
+        """讀取索引（遊戲編號 -> 位置、長度）"""
+        magic, version, count, index_size = FILE_HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise ValueError("存檔格式錯誤。")
+        if version != FILE_VERSION:
+            raise ValueError(f"不支援的存檔版本：{version}")
+
+        index = {}
+        offset = FILE_HEADER.size
+        for _ in range(count):
+            key_length, position, length = INDEX_ENTRY.unpack_from(self._map, offset)
+            offset += INDEX_ENTRY.size
+            key = str(self._map[offset:offset + key_length], "utf-8")
+            offset += key_length
+            index[key] = (position, length)
+        return index
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._index
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._index)
+
+    def read(self, key: str) -> Optional[memoryview]:
+        """取得紀錄的原始內容（不複製），不存在時回傳 None"""
+        entry = self._index.get(key)
+        if entry is None:
+            return None
+        position, length = entry
+        return memoryview(self._map)[position:position + length]
+
+    def load(self, key: str) -> SaveRecord:
+        """解碼一筆紀錄（不存在時拋出 KeyError）"""
+        data = self.read(key)
+        if data is None:
+            raise KeyError(key)
+        try:
+            return decode_record(data)
+        finally:
+            data.release()
+
+    def close(self):
+        """關閉存檔（read() 取得的內容需先釋放）"""
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -3,10 +3,129 @@
     1. 儲存玩家與 NPC 的狀態資訊、特殊的物品或任務狀態、遊戲是否結束與結局種類
     2. 將狀態轉為字典，提供 Agent 使用
     3. 將狀態轉換為文字，提供 Console 顯示
+    4. 建立與還原不可變的快照（未變更的部分與上一個快照共用），用於復原、分支與推測執行
+    5. 以 __slots__ 儲存狀態，並可將整個狀態壓縮為一個整數，降低大量遊戲同時存在時的記憶體用量
 """
 
+from typing import NamedTuple, Tuple, Optional, Any, Dict, List, Iterator
+
+# 遊戲中的地點、NPC、物品、選項與結局
+LOCATIONS = ("教室", "圖書館", "福利社", "教師辦公室")
+NPCS = ("A", "B", "C")
+ITEMS = ("鑰匙", "麵包", "考卷", "公告", "書籍", "麥克風", "現金", "咖啡", "A 的疑問", "B 的疑問", "遺書")
+CHOICES = ("接受", "拒絕")
+ENDINGS = ("ending_1", "ending_2", "ending_3", "ending_4", "ending_5", "ending_6")
+
+# 快照中各欄位的順序（需與 snapshot() 一致）
+PLAYER_FIELDS = ("player_location", "player_health", "player_sanity", "player_remember")
+NPC_A_FIELDS = ("location", "sanity", "wait_for_response", "help_count", "talk_count", "collapsed")
+NPC_B_FIELDS = ("location", "sanity", "talk_count", "collapsed")
+NPC_C_FIELDS = ("location", "sanity", "other_talk_count", "collapsed", "true_color")
+FLAG_FIELDS = ("open_classroom", "find_microphone", "num_bread", "ask_c", "game_over", "ending")
+
+class GameSnapshot(NamedTuple):
+    """遊戲狀態的不可變快照，各部分皆為 tuple，可以在多個快照之間共用"""
+    player: Tuple[Any, ...]
+    npc_a: Tuple[Any, ...]
+    npc_b: Tuple[Any, ...]
+    npc_c: Tuple[Any, ...]
+    inventory: Tuple[str, ...]
+    flags: Tuple[Any, ...]
+
+class NpcState:
+    """NPC 狀態的基礎類別，以 __slots__ 儲存欄位，並保留字典的存取方式（npc["sanity"]）"""
+    __slots__ = ()
+
+    def __getitem__(self, key: str) -> Any:
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def __setitem__(self, key: str, value: Any):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.__slots__
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.__slots__)
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, NpcState):
+            other = other.copy()
+        return self.copy() == other
+
+    def __repr__(self) -> str:
+        return repr(self.copy())
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """與 dict.get 相同"""
+        return getattr(self, key, default) if key in self.__slots__ else default
+
+    def keys(self) -> Tuple[str, ...]:
+        """欄位名稱"""
+        return self.__slots__
+
+    def values(self) -> Tuple[Any, ...]:
+        """欄位數值（與 __slots__ 的順序相同）"""
+        return tuple(getattr(self, field) for field in self.__slots__)
+
+    def items(self) -> List[Tuple[str, Any]]:
+        """欄位名稱與數值"""
+        return [(field, getattr(self, field)) for field in self.__slots__]
+
+    def copy(self) -> Dict[str, Any]:
+        """轉換為字典（與舊版的 dict.copy() 相容）"""
+        return {field: getattr(self, field) for field in self.__slots__}
+
+class NpcAState(NpcState):
+    """NPC A：位置、理智、等待回覆、幫忙次數、對話次數、衝動行為"""
+    __slots__ = NPC_A_FIELDS
+
+    def __init__(self, location, sanity, wait_for_response, help_count, talk_count, collapsed):
+        self.location = location
+        self.sanity = sanity
+        self.wait_for_response = wait_for_response
+        self.help_count = help_count
+        self.talk_count = talk_count
+        self.collapsed = collapsed
+
+class NpcBState(NpcState):
+    """NPC B：位置、理智、對話次數、衝動行為"""
+    __slots__ = NPC_B_FIELDS
+
+    def __init__(self, location, sanity, talk_count, collapsed):
+        self.location = location
+        self.sanity = sanity
+        self.talk_count = talk_count
+        self.collapsed = collapsed
+
+class NpcCState(NpcState):
+    """NPC C：位置、理智、與他人對話次數、衝動行為、真面目"""
+    __slots__ = NPC_C_FIELDS
+
+    def __init__(self, location, sanity, other_talk_count, collapsed, true_color):
+        self.location = location
+        self.sanity = sanity
+        self.other_talk_count = other_talk_count
+        self.collapsed = collapsed
+        self.true_color = true_color
+
+# 整數壓縮格式：每個欄位的位元數（整數欄位以偏移量儲存，允許 -16 ~ 15）
+INT_BITS = 5
+INT_BIAS = 16
+LOCATION_BITS = 2
+ENDING_BITS = 3
+ITEM_BITS = 4   # 物品以索引 + 1 儲存，0 代表物品欄結束
+ITEM_MASK = (1 << ITEM_BITS) - 1
+
 class GameState:
     """管理遊戲狀態，儲存所有遊戲數據"""
+    __slots__ = PLAYER_FIELDS + ("npc_a", "npc_b", "npc_c", "inventory") + FLAG_FIELDS + ("_last_snapshot",)
+
     def __init__(self):
         # 玩家：位置、體力、理智、物品、是否想起真相
         self.player_location = "教室"
@@ -15,31 +134,13 @@ class GameState:
         self.player_remember = False
 
         # NPC A：理智、請求次數、對話次數、衝動行為、提出疑問
-        self.npc_a = {
-            "location": "教師辦公室",
-            "sanity": 3,
-            "wait_for_response": False,
-            "help_count": 0,
-            "talk_count": 0,
-            "collapsed": False
-        }
+        self.npc_a = NpcAState("教師辦公室", 3, False, 0, 0, False)
 
         # NPC B：理智、對話次數、衝動行為、提出疑問
-        self.npc_b = {
-            "location": "福利社",
-            "sanity": 3,
-            "talk_count": 0,
-            "collapsed": False
-        }
+        self.npc_b = NpcBState("福利社", 3, 0, False)
 
         # NPC C：理智、與他人對話次數、衝動行為、真面目
-        self.npc_c = {
-            "location": "圖書館",
-            "sanity": 5,
-            "other_talk_count": 0,
-            "collapsed": False,
-            "true_color": False
-        }
+        self.npc_c = NpcCState("圖書館", 5, 0, False, False)
 
         # 物品與任務狀態
         self.inventory = []
@@ -52,6 +153,9 @@ class GameState:
         self.game_over = False
         self.ending = None
 
+        # 上一個快照，建立新快照時共用未變更的部分
+        self._last_snapshot: Optional[GameSnapshot] = None
+
     def state_to_dictionary(self):
         """將狀態轉換為字典"""
         return {
@@ -75,10 +179,132 @@ class GameState:
             "sanity": self.player_sanity,
             "max_sanity": 5,
             "inventory": self.inventory.copy(),
-            "npc_a_sanity": self.npc_a["sanity"],
-            "npc_b_sanity": self.npc_b["sanity"],
-            "npc_c_sanity": self.npc_c["sanity"],
-            "npc_a_collapsed": self.npc_a["collapsed"],
-            "npc_b_collapsed": self.npc_b["collapsed"],
-            "npc_c_collapsed": self.npc_c["collapsed"]
-        }
\ No newline at end of file
+            "npc_a_sanity": self.npc_a.sanity,
+            "npc_b_sanity": self.npc_b.sanity,
+            "npc_c_sanity": self.npc_c.sanity,
+            "npc_a_collapsed": self.npc_a.collapsed,
+            "npc_b_collapsed": self.npc_b.collapsed,
+            "npc_c_collapsed": self.npc_c.collapsed
+        }
+
+    def snapshot(self) -> GameSnapshot:
+        """建立快照，與上一個快照相同的部分直接共用（記憶體只增加變更的部分）"""
+        npc_a, npc_b, npc_c = self.npc_a, self.npc_b, self.npc_c
+        parts = (
+            (self.player_location, self.player_health, self.player_sanity, self.player_remember),
+            (npc_a.location, npc_a.sanity, npc_a.wait_for_response, npc_a.help_count, npc_a.talk_count, npc_a.collapsed),
+            (npc_b.location, npc_b.sanity, npc_b.talk_count, npc_b.collapsed),
+            (npc_c.location, npc_c.sanity, npc_c.other_talk_count, npc_c.collapsed, npc_c.true_color),
+            tuple(self.inventory),
+            (self.open_classroom, self.find_microphone, self.num_bread, self.ask_c, self.game_over, self.ending)
+        )
+        last = self._last_snapshot
+        if last is not None:
+            if parts == last:
+                return last
+            parts = tuple(old if new == old else new for new, old in zip(parts, last))
+        self._last_snapshot = GameSnapshot(*parts)
+        return self._last_snapshot
+
+    def restore(self, snapshot: GameSnapshot):
+        """還原快照，只重建與目前狀態不同的部分"""
+        current = self.snapshot()
+        if snapshot is not current:
+            self._load(snapshot, current)
+
+    def _load(self, snapshot: GameSnapshot, current: Optional[GameSnapshot] = None):
+        """載入快照中與 current 不同的部分（current 為 None 時全部載入）"""
+        if current is None or snapshot.player != current.player:
+            self.player_location, self.player_health, self.player_sanity, self.player_remember = snapshot.player
+        if current is None or snapshot.npc_a != current.npc_a:
+            self.npc_a = NpcAState(*snapshot.npc_a)
+        if current is None or snapshot.npc_b != current.npc_b:
+            self.npc_b = NpcBState(*snapshot.npc_b)
+        if current is None or snapshot.npc_c != current.npc_c:
+            self.npc_c = NpcCState(*snapshot.npc_c)
+        if current is None or snapshot.inventory != current.inventory:
+            self.inventory = list(snapshot.inventory)
+        if current is None or snapshot.flags != current.flags:
+            self.open_classroom, self.find_microphone, self.num_bread, self.ask_c, self.game_over, self.ending = snapshot.flags
+        self._last_snapshot = snapshot
+
+    @classmethod
+    def from_snapshot(cls, snapshot: GameSnapshot) -> "GameState":
+        """由快照建立新的遊戲狀態"""
+        state = cls.__new__(cls)
+        state._load(snapshot)
+        return state
+
+    def fork(self) -> "GameState":
+        """複製遊戲狀態（兩者的快照共用同一份資料，之後只會複製變更的部分）"""
+        return GameState.from_snapshot(self.snapshot())
+
+    def pack(self) -> int:
+        """將整個狀態壓縮為一個整數（物品欄保留順序與重複的物品，放在最高位）"""
+        code = 0
+        shift = 0
+
+        def put(value: int, bits: int):
+            nonlocal code, shift
+            if not 0 <= value < (1 << bits):
+                raise ValueError(f"數值超出範圍：{value}")
+            code |= value << shift
+            shift += bits
+
+        snapshot = self.snapshot()
+        for section in (snapshot.player, snapshot.npc_a, snapshot.npc_b, snapshot.npc_c, snapshot.flags):
+            for value in section:
+                if isinstance(value, bool):
+                    put(int(value), 1)
+                elif isinstance(value, int):
+                    put(value + INT_BIAS, INT_BITS)
+                elif value in LOCATIONS:
+                    put(LOCATIONS.index(value), LOCATION_BITS)
+                else:
+                    put(0 if value is None else ENDINGS.index(value) + 1, ENDING_BITS)
+        for item in snapshot.inventory:
+            put(ITEMS.index(item) + 1, ITEM_BITS)
+        return code
+
+    @classmethod
+    def unpack(cls, code: int) -> "GameState":
+        """由 pack() 產生的整數還原遊戲狀態"""
+        return cls.from_snapshot(cls.unpack_snapshot(code))
+
+    @staticmethod
+    def unpack_snapshot(code: int) -> GameSnapshot:
+        """由 pack() 產生的整數還原快照（不建立遊戲狀態，用於大量還原復原用的快照）"""
+        sections = []
+        for section in _UNPACK_LAYOUT:
+            values = []
+            for decode, bits in section:
+                values.append(decode(code & ((1 << bits) - 1)))
+                code >>= bits
+            sections.append(tuple(values))
+
+        inventory = []
+        while code:
+            inventory.append(ITEMS[(code & ITEM_MASK) - 1])
+            code >>= ITEM_BITS
+        player, npc_a, npc_b, npc_c, flags = sections
+        return GameSnapshot(player, npc_a, npc_b, npc_c, tuple(inventory), flags)
+
+def _unpack_layout() -> Tuple[Tuple[Tuple[Any, int], ...], ...]:
+    """依初始狀態各欄位的型別，預先算出每個欄位的還原方法與位元數（與 pack() 的順序相同）"""
+    template = GameState().snapshot()
+    layout = []
+    for section in (template.player, template.npc_a, template.npc_b, template.npc_c, template.flags):
+        fields = []
+        for default in section:
+            if isinstance(default, bool):
+                fields.append((bool, 1))
+            elif isinstance(default, int):
+                fields.append((lambda value: value - INT_BIAS, INT_BITS))
+            elif isinstance(default, str):
+                fields.append((LOCATIONS.__getitem__, LOCATION_BITS))
+            else:
+                fields.append((lambda value: ENDINGS[value - 1] if value else None, ENDING_BITS))
+        layout.append(tuple(fields))
+    return tuple(layout)
+
+_UNPACK_LAYOUT = _unpack_layout()
@@ -0,0 +1,115 @@
+"""
+融合模式（一次 LLM 呼叫同時完成解析與敘事，減少每回合的往返次數）：
+    1. 由遊戲引擎在複製的狀態上執行所有可能的行動，預先算出每個行動的結果
+    2. 將可能的行動與結果交給 LLM，一次選出符合玩家輸入的行動並生成敘事
+    3. 回傳的選項必須在預先算出的行動之中，實際執行後的結果與狀態也必須與推測相同，才會採用敘事
+    4. 選項無效或回應格式錯誤時回傳 None，由呼叫端改用原本的兩次呼叫（Parser、Narrator）
+"""
+
+import re
+from typing import Optional, Callable, Dict, Any, List, NamedTuple
+
+from src.repository.core.engine import GameEngine
+from src.repository.core.state import GameState
+from src.repository.llm.backends import LLMBackend
+from src.repository.llm.base_model import BaseAgent
+from src.repository.llm.batcher import RequestBatcher
+from src.repository.llm.pool import AgentPool
+from src.repository.llm.prompts import FUSED_PROMPT, render_state, describe_command
+from src.repository.llm.resilience import ResiliencePolicy
+from src.repository.llm.session import AgentSession
+from src.repository.speculator import Speculator
+from src.repository.telemetry import TELEMETRY
+
+# 回應格式：第一行為選項編號，其後為故事文本
+RESPONSE = re.compile(r"\s*選項\s*[:：]\s*(\d+)\s*(.*)", re.S)
+
+class FusedOption(NamedTuple):
+    """預先算出的行動"""
+    command: Dict[str, Any]
+    result: str                 # 行動結果
+    llm: bool                   # 是否需要生成敘事
+    snapshot: Dict[str, Any]    # 行動後的狀態（用於驗證）
+
+class FusedTurn(NamedTuple):
+    """融合呼叫選出的行動與敘事"""
+    command: Dict[str, Any]
+    result: str
+    snapshot: Dict[str, Any]
+    story: str
+
+class FusedAgent(BaseAgent):
+    """融合模式的 Agent，一次呼叫同時選出行動並生成敘事"""
+    NAME = "fused"
+    DEADLINE = 30.0     # 每次呼叫的總期限（秒），與 Narrator 相同，超過期限時改用兩次呼叫
+
+    def __init__(self, api_url: str, api_key: str, logger: Optional[Callable[[str, str], None]] = None, session: Optional[AgentSession] = None, pool: Optional[AgentPool] = None, batcher: Optional[RequestBatcher] = None, policy: Optional[ResiliencePolicy] = None, backend: Optional[LLMBackend] = None, max_options: int = 12):
+        super().__init__(api_url, api_key, logger = logger, session = session, pool = pool, batcher = batcher, policy = policy, backend = backend)
+        self.max_options = max_options  # 最多列出的行動數（依可能性排序）
+        self.calls = 0
+        self.accepted = 0
+        self.rejected = 0
+
+    def options(self, state: GameState) -> List[FusedOption]:
+        """在複製的狀態上執行所有可能的行動"""
+        options = []
+        for command in Speculator.candidates(state)[:self.max_options]:
+            engine = GameEngine(logger = lambda level, message: None, state = state.fork())
+            result = engine.execute_action(command)
+            options.append(FusedOption(command, result, engine.llm_response, engine.state.state_to_dictionary()))
+        return options
+
+    def run(self, state: GameState, user_input: str) -> Optional[FusedTurn]:
+        """選出行動並生成敘事，失敗則回傳 None"""
+        with TELEMETRY.span("fused_turn"):
+            options = self.options(state)
+            prompt = self._build_prompt(state, options, user_input)
+            self._log("【FUSED】", "解析並生成敘事...")
+            response = self.call_api(prompt, temperature = 0.3)
+            return self._select(response, options)
+
+    async def run_async(self, state: GameState, user_input: str) -> Optional[FusedTurn]:
+        """以 asyncio 選出行動並生成敘事，失敗則回傳 None"""
+        with TELEMETRY.span("fused_turn"):
+            options = self.options(state)
+            prompt = self._build_prompt(state, options, user_input)
+            self._log("【FUSED】", "解析並生成敘事...")
+            response = await self.call_api_async(prompt, temperature = 0.3)
+            return self._select(response, options)
+
+    @staticmethod
+    def _build_prompt(state: GameState, options: List[FusedOption], user_input: str) -> str:
+        """產生融合模式的 Prompt（可能的行動與結果以編號列出）"""
+        lines = []
+        for number, option in enumerate(options, 1):
+            lines.append(f"{number}. {describe_command(option.command)}")
+            lines.append("   結果：" + option.result.replace("\n", " "))
+        return FUSED_PROMPT.render(state = render_state(state), options = "\n".join(lines), user_input = user_input)
+
+    def _select(self, response: Optional[str], options: List[FusedOption]) -> Optional[FusedTurn]:
+        """解析回應並選出行動，選項無效時回傳 None"""
+        self.calls += 1
+        found = RESPONSE.match(response) if response is not None else None
+        number = int(found.group(1)) if found else 0
+        if not 1 <= number <= len(options):
+            self.rejected += 1
+            TELEMETRY.inc("fallbacks_total", agent = self.NAME)
+            self._log("【FUSED】", f"沒有符合的行動，改用 Parser 與 Narrator。\n原始回應{repr(response)}")
+            return None
+
+        option = options[number - 1]
+        story = found.group(2).strip()
+        if option.llm and not story:
+            self.rejected += 1
+            TELEMETRY.inc("fallbacks_total", agent = self.NAME)
+            self._log("【FUSED】", "回應沒有敘事，改用 Narrator。")
+            # 行動已確定，只需要再生成敘事
+            return FusedTurn(option.command, option.result, option.snapshot, "")
+
+        self.accepted += 1
+        self._log("【FUSED】", f"選出行動！\n解析結果：{option.command}")
+        return FusedTurn(option.command, option.result, option.snapshot, story)
+
+    def stats(self) -> Dict[str, Any]:
+        """融合模式統計"""
+        return {"calls": self.calls, "accepted": self.accepted, "rejected": self.rejected}
@@ -1,70 +1,499 @@
 """
 主遊戲類別：
-    1. 處理玩家輸入到文本產出的流程
-    2. 重置遊戲
+    1. 處理玩家輸入到文本產出的流程（同步、asyncio 與串流版本）
+    2. 重置遊戲、復原上一回合
     3. 取得固定文本（開場、結局）
+    4. 管理 Agent 共用的連線池
+    5. 回報統計資訊
+    6. 推測執行，於玩家思考時預先生成敘事
+    7. 記錄每回合的追蹤區段（解析、執行指令、敘事為其子區段）與無法理解的指令數
+    8. 融合模式：規則比對與快取無法解析的輸入，以一次 LLM 呼叫同時解析並生成敘事
+    9. 存檔與讀檔（遊戲狀態、復原用的快照與介面的對話紀錄，不需要重新執行每一回合）
+    10. 將每回合的輸入、指令、結果與耗時寫入回合日誌，用於重播
+    11. 回合排程：解析與執行指令依序進行，回合進行中送出的行動合併或拒絕，玩家送出下一個行動時取消尚未完成的敘事
 """
 
+import asyncio
+import itertools
 import textwrap
-from typing import Optional, Callable, Dict, Any
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from typing import Optional, Callable, Dict, Any, Awaitable, Iterator, Iterable, List, Tuple
 
 from src.repository.core.engine import GameEngine
+from src.repository.core.savefile import SaveRecord, encode_record, decode_record
+from src.repository.core.state import GameState, GameSnapshot
+from src.repository.fused import FusedAgent, FusedTurn
+from src.repository.journal import TurnJournal
+from src.repository.llm.backends import LLMBackend, create_backend
+from src.repository.llm.batcher import RequestBatcher
+from src.repository.llm.cache import ParseCache, NarrationCache
 from src.repository.llm.narrator import NarratorAgent
 from src.repository.llm.parser import ParserAgent
+from src.repository.llm.resilience import ResiliencePolicy, CircuitBreaker
+from src.repository.llm.session import AgentSession
+from src.repository.scheduler import TurnScheduler, TurnTicket
+from src.repository.speculator import Speculator
+from src.repository.telemetry import TELEMETRY
 
 class GameAssemble:
     """主遊戲類別，負責整合所有元件、控制遊戲流程"""
-    def __init__(self, api_url: str, api_key: str, logger: Optional[Callable[[str, str], None]] = None):
-        self.engine = GameEngine()
-        self.parser = ParserAgent(api_url, api_key)
-        self.narrator = NarratorAgent(api_url, api_key)
+    def __init__(self, api_url: str, api_key: str, logger: Optional[Callable[[str, str], None]] = None, session: Optional[AgentSession] = None, parse_cache: Optional[ParseCache] = None, narration_cache: Optional[NarrationCache] = None, speculate_top_k: int = 0, speculate_max_calls: Optional[int] = None, max_history: int = 100, parser: Optional[ParserAgent] = None, narrator: Optional[NarratorAgent] = None, batcher: Optional[RequestBatcher] = None, breaker: Optional[CircuitBreaker] = None, backend: Optional[LLMBackend] = None, fused: bool = False, fused_agent: Optional[FusedAgent] = None, journal: Optional[TurnJournal] = None, journal_id: Optional[str] = None, turn_policy: str = "coalesce", max_pending: int = 1):
         self.logger = logger or self._default_logger
+        self.journal = journal                          # 回合日誌，None 代表不記錄（由建立者負責關閉）
+        self.journal_id = journal_id or uuid.uuid4().hex  # 日誌中的遊戲編號
+        self._turn_seq = itertools.count(1)             # 日誌中回合的序號（敘事紀錄以序號對應回合）
+
+        # 連線池：未指定時使用傳入的 Agent 的連線池或自行建立，自行建立的連線池在 close() 時關閉
+        if session is None and parser is not None:
+            session = parser.session
+        self._owns_session = session is None
+        self.session = session or AgentSession()
+
+        # 快取：傳入共用的快取時，不同遊戲可以共用解析結果與敘事文本
+        self.engine = GameEngine(logger = self.logger)
+        self.history: List[GameSnapshot] = []    # 每回合開始前的狀態快照，用於復原
+        self.max_history = max_history
+        # Agent：傳入共用的 Agent 時（如伺服器模式），多個遊戲共用同一組 Parser 與 Narrator
+        # 容錯策略：Parser 與 Narrator 使用不同的期限，但共用同一個斷路器（同一個後端）
+        # 後端：未指定時依網址選擇（fake:// 為不需要網路的模擬後端），Parser 與 Narrator 共用
+        breaker = breaker or CircuitBreaker()
+        backend = backend or create_backend(api_url, api_key)
+        self.parser = parser or ParserAgent(api_url, api_key, logger = self.logger, session = self.session, batcher = batcher, policy = ResiliencePolicy(deadline = ParserAgent.DEADLINE, breaker = breaker), backend = backend, cache = parse_cache)
+        self.narrator = narrator or NarratorAgent(api_url, api_key, logger = self.logger, session = self.session, batcher = batcher, policy = ResiliencePolicy(deadline = NarratorAgent.DEADLINE, breaker = breaker), backend = backend, cache = narration_cache)
+
+        # 融合模式：fused 為 True 或傳入共用的 FusedAgent 時啟用，融合呼叫失敗時仍使用 Parser 與 Narrator
+        if fused_agent is None and fused:
+            fused_agent = FusedAgent(api_url, api_key, logger = self.logger, session = self.session, batcher = batcher, policy = ResiliencePolicy(deadline = FusedAgent.DEADLINE, breaker = breaker), backend = backend)
+        self.fused = fused_agent
+
+        # 推測執行：speculate_top_k 大於 0 時，於玩家思考時預先生成可能行動的敘事
+        self.speculator = Speculator(self.narrator, top_k = speculate_top_k, max_calls = speculate_max_calls) if speculate_top_k > 0 else None
+
+        # 回合排程：turn_policy 為 coalesce 時只保留最新的等待中行動（最多 max_pending 個），reject 時直接拒絕
+        self.scheduler = TurnScheduler(turn_policy, max_pending = max_pending)
 
     def _default_logger(self, level: str, message: str):
         """預設日誌"""
         print(f"{level}　{message}")
 
     def process_input(self, user_input: str) -> Dict[str, Any]:
-        """處理玩家輸入"""
-        if user_input == "exit" or user_input == "quit" or user_input == "結束" or user_input == "離開":
-            self.engine.state.game_over = True
-            return {
-                "success": True,
-                "story": "",
-                "game_state": self.engine.state.get_state_dict(),
-                "game_over": self.engine.state.game_over,
-                "ending": self.engine.state.ending
-            }
+        """處理玩家輸入（經過回合排程，回合進行中送出的行動依策略合併或拒絕）"""
+        ticket = self.scheduler.acquire(user_input)
+        if ticket is None:
+            return self._skipped_result()
         try:
-            command = self.parser.parse_input(user_input)
-            result = self.engine.execute_action(command)
-            if self.engine.llm_response:
-                story = self.narrator.generate_story(self.engine.state, result)
-                if self.engine.state.npc_a["wait_for_response"]:
-                    story += "\n你要接受 A 的請求嗎？還是要拒絕他？"
+            if self._is_exit(user_input):
+                self._journal("exit", input = user_input)
+                return self._exit_result()
+            with TELEMETRY.span("process_input") as span:
+                try:
+                    start_time = time.perf_counter()
+                    command, fused = self._parse(user_input)
+                    parse_time = time.perf_counter() - start_time
+                    result, seq = self._execute(user_input, command, start_time, parse_time)
+                    state = None
+                    if self.engine.llm_response:
+                        story = self._fused_story(fused, result)
+                        if story is None:
+                            # 讓出排程後才等待推測或生成敘事，之後只使用複製的狀態
+                            future = self._match_speculation(result)
+                            state = self.engine.state.fork()
+                            story = self._narrate(ticket, state, result, future)
+                    else:
+                        story = None
+                    turn = self._turn_result(result, story, state)
+                    self._journal_story(seq, turn["story"], start_time)
+                    if not ticket.cancelled.is_set():
+                        self.speculate()
+                    return turn
+                except Exception as e:
+                    span.set(status = "error")
+                    return self._error_result(e)
+        finally:
+            self.scheduler.release(ticket)
+
+    async def process_input_async(self, user_input: str) -> Dict[str, Any]:
+        """以 asyncio 處理玩家輸入，等待 LLM 時不會阻塞其他遊戲（經過回合排程）"""
+        ticket = await self.scheduler.acquire_async(user_input)
+        if ticket is None:
+            return self._skipped_result()
+        try:
+            if self._is_exit(user_input):
+                self._journal("exit", input = user_input)
+                return self._exit_result()
+            with TELEMETRY.span("process_input") as span:
+                try:
+                    start_time = time.perf_counter()
+                    command, fused = await self._parse_async(user_input)
+                    parse_time = time.perf_counter() - start_time
+                    result, seq = self._execute(user_input, command, start_time, parse_time)
+                    state = None
+                    if self.engine.llm_response:
+                        story = self._fused_story(fused, result)
+                        if story is None:
+                            future = self._match_speculation(result)
+                            state = self.engine.state.fork()
+                            story = await self._narrate_async(ticket, state, result, future)
+                    else:
+                        story = None
+                    turn = self._turn_result(result, story, state)
+                    self._journal_story(seq, turn["story"], start_time)
+                    if not ticket.cancelled.is_set():
+                        self.speculate()
+                    return turn
+                except Exception as e:
+                    span.set(status = "error")
+                    return self._error_result(e)
+        finally:
+            self.scheduler.release(ticket)
+
+    def _narrate(self, ticket: TurnTicket, state: GameState, result: str, speculation: Optional[Future] = None) -> str:
+        """讓出排程後等待推測或以串流生成敘事，玩家送出下一個行動時停止等待、關閉串流（讓後端停止生成）並改用行動結果"""
+        self.scheduler.narrate(ticket)
+        if speculation is not None:
+            done = threading.Event()
+            speculation.add_done_callback(lambda _: done.set())
+            ticket.on_cancel(done.set)
+            done.wait()
+            if speculation.done() and not speculation.cancelled() and speculation.result():
+                return speculation.result()
+        if ticket.cancelled.is_set():
+            self.logger("【PROCESS】", "玩家已送出下一個行動，取消敘事。")
+            return result
+        stream = self.narrator.stream_story(state, result)
+        ticket.on_cancel(stream.close)
+        return "".join(self._narration_stream(ticket, stream, result))
+
+    async def _narrate_async(self, ticket: TurnTicket, state: GameState, result: str, speculation: Optional[Future] = None) -> str:
+        """讓出排程後以 asyncio 等待推測或生成敘事，玩家送出下一個行動時取消等待與呼叫並改用行動結果"""
+        self.scheduler.narrate(ticket)
+        if speculation is not None:
+            story = await self._until_cancelled(ticket, asyncio.wrap_future(speculation))
+            if story:
+                return story
+        if not ticket.cancelled.is_set():
+            story = await self._until_cancelled(ticket, self.narrator.generate_story_async(state, result))
+            if story is not None:
+                return story
+        self.logger("【PROCESS】", "玩家已送出下一個行動，取消敘事。")
+        return result
+
+    @staticmethod
+    async def _until_cancelled(ticket: TurnTicket, awaitable: Awaitable[Optional[str]]) -> Optional[str]:
+        """等待呼叫完成，玩家送出下一個行動（或推測被取消）時回傳 None"""
+        loop = asyncio.get_running_loop()
+        task = asyncio.ensure_future(awaitable)
+        ticket.on_cancel(lambda: loop.call_soon_threadsafe(task.cancel))
+        try:
+            # 以 wait 等待，外部取消（如連線中斷）只會在這裡拋出，不會與排程取消的呼叫混淆
+            await asyncio.wait((task,))
+        except asyncio.CancelledError:
+            task.cancel()
+            raise
+        return None if task.cancelled() else task.result()
+
+    def process_input_stream(self, user_input: str) -> Dict[str, Any]:
+        """處理玩家輸入，回傳結果中的 story 為逐段產生文字的迭代器（遊戲狀態在回傳時已更新，經過回合排程）"""
+        ticket = self.scheduler.acquire(user_input)
+        if ticket is None:
+            turn = self._skipped_result()
+            turn["story"] = iter([turn["story"]])
+            return turn
+        streaming = False
+        try:
+            if self._is_exit(user_input):
+                self._journal("exit", input = user_input)
+                turn = self._exit_result()
             else:
-                story = result
-                self.engine.llm_response = True
-            return {
-                "success": True,
-                "story": story,
-                "game_state": self.engine.state.get_state_dict(),
-                "game_over": self.engine.state.game_over,
-                "ending": self.engine.state.ending
-            }
-        except Exception as e:
-            self.logger("【PROCESS】", f"發生錯誤。\n錯誤訊息：{e}")
-            return {
-                "success": False,
-                "story": "請重新嘗試。",
-                "game_state": self.engine.state.get_state_dict(),
-                "game_over": self.engine.state.game_over,
-                "ending": None
-            }
+                # 串流的敘事在回傳後才讀取，不屬於這個區段
+                with TELEMETRY.span("process_input", stream = True) as span:
+                    try:
+                        start_time = time.perf_counter()
+                        command, fused = self._parse(user_input)
+                        parse_time = time.perf_counter() - start_time
+                        result, seq = self._execute(user_input, command, start_time, parse_time)
+                        if self.engine.llm_response:
+                            story = self._fused_story(fused, result)
+                            if story is None:
+                                # 串流時只使用已完成的推測，避免等待推測而延後第一段文字
+                                future = self._match_speculation(result, wait = False)
+                                story = future.result() if future else None
+                            if story:
+                                turn = self._turn_result(result, story)
+                            else:
+                                # 敘事文本改為串流，回合結果中的文字先以串流取代，串流結束後才寫入敘事紀錄
+                                # 串流使用複製的狀態並讓出排程，玩家送出下一個行動時關閉串流
+                                state = self.engine.state.fork()
+                                turn = self._turn_result(result, "", state)
+                                stream = self.narrator.stream_story(state, result)
+                                ticket.on_cancel(stream.close)
+                                chunks = itertools.chain(self._narration_stream(ticket, stream, result), [self._story_suffix(state)])
+                                turn["story"] = itertools.chain(self._journal_stream(chunks, seq, start_time), self._speculate_after_stream(ticket))
+                                self.scheduler.narrate(ticket)
+                                streaming = True
+                                return turn
+                        else:
+                            turn = self._turn_result(result, None)
+                        self._journal_story(seq, turn["story"], start_time)
+                        self.speculate()
+                    except Exception as e:
+                        span.set(status = "error")
+                        turn = self._error_result(e)
+            turn["story"] = iter([turn["story"]])
+            return turn
+        finally:
+            # 串流的回合在串流結束時才通知排程
+            if not streaming:
+                self.scheduler.release(ticket)
+
+    def _narration_stream(self, ticket: TurnTicket, stream: Iterator[str], result: str) -> Iterator[str]:
+        """逐段回傳串流的敘事，玩家送出下一個行動時停止（關閉串流讓後端停止生成）並改用行動結果，結束後通知排程"""
+        started = False
+        try:
+            for chunk in stream:
+                if ticket.cancelled.is_set():
+                    break
+                started = True
+                yield chunk
+        finally:
+            stream.close()
+            self.scheduler.release(ticket)
+        if ticket.cancelled.is_set():
+            self.logger("【PROCESS】", "玩家已送出下一個行動，停止敘事。")
+            yield "⋯⋯\n" + result if started else result
+
+    def _parse(self, user_input: str) -> Tuple[Dict[str, Any], Optional[FusedTurn]]:
+        """解析玩家輸入，融合模式下回傳融合呼叫選出的行動與敘事"""
+        if self.fused is None:
+            return self.parser.parse_input(user_input), None
+        command = self.parser.parse_local(user_input)
+        if command is not None:
+            return command, None
+        fused = self.fused.run(self.engine.state, user_input)
+        return self._accept_fused(user_input, fused) or (self.parser.parse_llm(user_input), None)
+
+    async def _parse_async(self, user_input: str) -> Tuple[Dict[str, Any], Optional[FusedTurn]]:
+        """以 asyncio 解析玩家輸入，融合模式下回傳融合呼叫選出的行動與敘事"""
+        if self.fused is None:
+            return await self.parser.parse_input_async(user_input), None
+        command = self.parser.parse_local(user_input)
+        if command is not None:
+            return command, None
+        fused = await self.fused.run_async(self.engine.state, user_input)
+        return self._accept_fused(user_input, fused) or (await self.parser.parse_llm_async(user_input), None)
+
+    def _accept_fused(self, user_input: str, fused: Optional[FusedTurn]) -> Optional[Tuple[Dict[str, Any], FusedTurn]]:
+        """採用融合呼叫選出的行動（與 Parser 的解析結果相同，寫入解析快取），沒有選出行動時回傳 None"""
+        if fused is None:
+            return None
+        self.parser.cache.put(user_input, fused.command)
+        return fused.command, fused
+
+    def _fused_story(self, fused: Optional[FusedTurn], result: str) -> Optional[str]:
+        """驗證並取得融合呼叫的敘事（實際的結果與狀態必須與推測相同），無法使用時回傳 None"""
+        if fused is None or not fused.story:
+            return None
+        state = self.engine.state
+        if result != fused.result or state.state_to_dictionary() != fused.snapshot:
+            TELEMETRY.inc("fallbacks_total", agent = self.fused.NAME)
+            self.logger("【PROCESS】", "融合呼叫的推測與實際結果不同，改用 Narrator。")
+            return None
+        return self.narrator.accept_story(state, result, fused.story)
+
+    def _execute(self, user_input: str, command: Dict[str, Any], start_time: float, parse_time: float) -> Tuple[str, int]:
+        """保存快照後執行指令，並在讓出排程前寫入日誌（依執行順序），回傳結果與回合的序號"""
+        self.history.append(self.engine.state.snapshot())
+        if len(self.history) > self.max_history:
+            self.history.pop(0)
+        with TELEMETRY.span("execute_action", action = command.get("action")):
+            result = self.engine.execute_action(command)
+        if self.engine.transition is self.engine.rules.invalid:
+            TELEMETRY.inc("invalid_commands_total")
+        seq = next(self._turn_seq)
+        if self.journal is not None:
+            timing = {"parse": round(parse_time, 6), "execute": round(time.perf_counter() - start_time, 6)}
+            self._journal("turn", seq = seq, input = user_input, command = command, result = result, llm_response = self.engine.llm_response, timing = timing)
+        return result, seq
+
+    def undo(self) -> bool:
+        """復原上一回合，沒有可復原的回合或回合正在執行指令時回傳 False（取消尚未完成的敘事）"""
+        ticket = self.scheduler.try_acquire()
+        if ticket is None:
+            return False
+        try:
+            if not self.history:
+                return False
+            self.engine.state.restore(self.history.pop())
+            self.engine.llm_response = True
+            if self.speculator is not None:
+                self.speculator.cancel()
+            self._journal("undo")
+            return True
+        finally:
+            self.scheduler.release(ticket)
+
+    def _journal(self, event: str, **fields: Any):
+        """寫入回合日誌（未啟用時不執行）"""
+        if self.journal is not None:
+            self.journal.append(self.journal_id, event, **fields)
+
+    def _journal_story(self, seq: int, story: str, start_time: float):
+        """將回合的文本寫入日誌（敘事完成時，可能晚於下一回合的紀錄，以序號對應回合；耗時以秒為單位）"""
+        if self.journal is not None:
+            self._journal("story", seq = seq, story = story, timing = {"total": round(time.perf_counter() - start_time, 6)})
+
+    def _journal_stream(self, chunks: Iterator[str], seq: int, start_time: float) -> Iterator[str]:
+        """逐段回傳串流的文本，串流結束後將完整的文本寫入日誌（中途停止讀取時寫入已產生的部分）"""
+        story = []
+        try:
+            for chunk in chunks:
+                story.append(chunk)
+                yield chunk
+        finally:
+            self._journal_story(seq, "".join(story), start_time)
+
+    def save(self, messages: Iterable[Tuple[str, str]] = (), turns: int = 0) -> bytes:
+        """將遊戲（狀態、復原用的快照）與對話紀錄編碼為存檔"""
+        return encode_record(self.engine.state, self.history, messages, turns)
+
+    def load(self, data: bytes) -> SaveRecord:
+        """載入存檔，回傳存檔內容（對話紀錄由介面還原）"""
+        record = decode_record(data)
+        self.scheduler.cancel()
+        self.engine = GameEngine(logger = self.logger, state = record.state)
+        self.history.clear()
+        self.history.extend(record.history[-self.max_history:])
+        if self.speculator is not None:
+            self.speculator.cancel()
+        if self.journal is not None:
+            self._journal("load", state = record.state.pack(), history = [GameState.from_snapshot(snapshot).pack() for snapshot in self.history])
+        return record
+
+    def _match_speculation(self, result: str, wait: bool = True) -> Optional[Future]:
+        """取得與實際行動相同的推測（wait 為 False 時只接受已完成的推測），沒有則回傳 None"""
+        if self.speculator is None:
+            return None
+        future = self.speculator.match(result, self.engine.state, wait = wait)
+        if future is not None:
+            self.logger("【PROCESS】", "使用推測執行的文本。")
+        return future
+
+    def speculate(self):
+        """針對目前狀態開始推測執行（遊戲結束或未啟用時不執行）"""
+        if self.speculator is not None and not self.engine.state.game_over:
+            self.speculator.start(self.engine.state)
+
+    def _speculate_after_stream(self, ticket: TurnTicket) -> Iterator[str]:
+        """串流結束後才開始推測，避免與目前的敘事搶用 LLM（玩家已送出下一個行動時不推測）"""
+        if not ticket.cancelled.is_set():
+            self.speculate()
+        yield from ()
+
+    @staticmethod
+    def _is_exit(user_input: str) -> bool:
+        """是否為結束遊戲的指令"""
+        return user_input == "exit" or user_input == "quit" or user_input == "結束" or user_input == "離開"
+
+    def _exit_result(self) -> Dict[str, Any]:
+        """結束遊戲，並回傳結果"""
+        self.engine.state.game_over = True
+        return {
+            "success": True,
+            "story": "",
+            "game_state": self.engine.state.get_state_dict(),
+            "game_over": self.engine.state.game_over,
+            "ending": self.engine.state.ending
+        }
+
+    def _turn_result(self, result: str, story: Optional[str], state: Optional[GameState] = None) -> Dict[str, Any]:
+        """整理回合結果（story 為 None 時，代表不需要 LLM 敘事，直接使用行動結果；state 為讓出排程前複製的狀態）"""
+        state = state or self.engine.state
+        if story is not None:
+            story += self._story_suffix(state)
+        else:
+            story = result
+            self.engine.llm_response = True
+        return {
+            "success": True,
+            "story": story,
+            "game_state": state.get_state_dict(),
+            "game_over": state.game_over,
+            "ending": state.ending
+        }
+
+    def _skipped_result(self) -> Dict[str, Any]:
+        """行動被較新的行動取代或被拒絕時的回傳結果（沒有執行，遊戲狀態不變）"""
+        return {
+            "success": False,
+            "skipped": True,
+            "story": "上一個行動仍在處理中，這個行動已略過。",
+            "game_state": self.engine.state.get_state_dict(),
+            "game_over": self.engine.state.game_over,
+            "ending": None
+        }
+
+    def _story_suffix(self, state: Optional[GameState] = None) -> str:
+        """A 在等待回覆時，附加在敘事文本後的提問"""
+        if (state or self.engine.state).npc_a["wait_for_response"]:
+            return "\n你要接受 A 的請求嗎？還是要拒絕他？"
+        return ""
+
+    def _error_result(self, e: Exception) -> Dict[str, Any]:
+        """發生錯誤時的回傳結果"""
+        self.logger("【PROCESS】", f"發生錯誤。\n錯誤訊息：{e}")
+        return {
+            "success": False,
+            "story": "請重新嘗試。",
+            "game_state": self.engine.state.get_state_dict(),
+            "game_over": self.engine.state.game_over,
+            "ending": None
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        """取得統計資訊（如規則比對省下的 LLM 呼叫次數）"""
+        return {
+            "intent": self.parser.matcher.stats(),
+            "parse_cache": self.parser.cache.stats(),
+            "narration_cache": self.narrator.cache.stats(),
+            "resilience": {"parser": self.parser.policy.stats(), "narrator": self.narrator.policy.stats()},
+            "speculation": self.speculator.stats() if self.speculator else None,
+            "fused": self.fused.stats() if self.fused else None,
+            "scheduler": self.scheduler.stats()
+        }
 
     def reset(self):
-        """重置遊戲"""
+        """重置遊戲（取消尚未完成的敘事與等待中的行動）"""
+        self.scheduler.cancel()
         self.engine = GameEngine(logger = self.logger)
+        self.history.clear()
+        if self.speculator is not None:
+            self.speculator.cancel()
+        self._journal("reset")
+
+    def close(self):
+        """關閉連線池（外部傳入的連線池由建立者負責關閉）"""
+        self.scheduler.cancel()
+        if self.speculator is not None:
+            self.speculator.close()
+        if self._owns_session:
+            self.session.close()
+
+    async def aclose(self):
+        """在事件迴圈中關閉連線池（外部傳入的連線池由建立者負責關閉）"""
+        self.scheduler.cancel()
+        if self.speculator is not None:
+            self.speculator.close()
+        if self._owns_session:
+            await self.session.aclose()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
 
     def get_intro_text(self) -> str:
         """取得開場文本"""
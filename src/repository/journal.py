@@ -0,0 +1,82 @@
+"""
+回合日誌（只附加的 JSONL 檔，用於重播、重現問題與在程序中斷後重建狀態）：
+    1. 每回合執行指令時記錄玩家輸入、解析後的指令、引擎的結果與是否需要 LLM 敘事（依執行順序），敘事完成後再以相同的序號記錄文本與耗時
+    2. 復原、重置、讀檔與結束遊戲也會記錄，重播時依序套用
+    3. 每筆紀錄立即寫入檔案（程序中斷不會遺失），fsync 則每累積一批或間隔一段時間才執行一次
+    4. 讀取時略過最後一行不完整的紀錄（寫入到一半時程序中斷）
+"""
+
+import json
+import os
+import threading
+import time
+from typing import Optional, Dict, Any, Iterator
+
+class TurnJournal:
+    """只附加的回合日誌，多場遊戲（多個執行緒）可以共用同一個日誌"""
+    def __init__(self, path: str, batch_size: int = 32, interval: float = 1.0):
+        self.path = path
+        self.batch_size = batch_size    # 累積多少筆紀錄執行一次 fsync
+        self.interval = interval        # 距離上次 fsync 超過多少秒時，下一筆紀錄寫入後立即執行
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding = "utf-8")
+        self._pending = 0
+        self._last_sync = time.monotonic()
+        self.records = 0
+        self.syncs = 0
+
+    def append(self, session: str, event: str, **fields: Any):
+        """寫入一筆紀錄（session 為遊戲編號，event 為 turn、story、undo、reset、load 或 exit）"""
+        record = {"session": session, "event": event, "time": time.time(), **fields}
+        line = json.dumps(record, ensure_ascii = False) + "\n"
+        with self._lock:
+            if self._file.closed:
+                return
+            self._file.write(line)
+            self._file.flush()
+            self.records += 1
+            self._pending += 1
+            if self._pending >= self.batch_size or time.monotonic() - self._last_sync >= self.interval:
+                self._sync()
+
+    def _sync(self):
+        """將已寫入的紀錄同步到磁碟（呼叫端需持有鎖）"""
+        os.fsync(self._file.fileno())
+        self._pending = 0
+        self._last_sync = time.monotonic()
+        self.syncs += 1
+
+    def sync(self):
+        """立即同步尚未 fsync 的紀錄"""
+        with self._lock:
+            if not self._file.closed and self._pending:
+                self._sync()
+
+    def close(self):
+        """同步並關閉檔案"""
+        with self._lock:
+            if not self._file.closed:
+                if self._pending:
+                    self._sync()
+                self._file.close()
+
+    def stats(self) -> Dict[str, Any]:
+        """統計資訊"""
+        return {"records": self.records, "syncs": self.syncs, "pending": self._pending}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+def read_journal(path: str, session: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """依序讀取日誌中的紀錄（可只讀取一場遊戲），略過不完整的行"""
+    with open(path, "r", encoding = "utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if session is None or record.get("session") == session:
+                yield record
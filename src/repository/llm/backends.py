@@ -0,0 +1,263 @@
+"""
+LLM 後端（BaseAgent 透過後端發送請求，不再寫死端點與回應格式）：
+    1. Ollama 風格的 NDJSON 串流（/api/generate，預設）
+    2. OpenAI 相容的 SSE 串流（/v1/chat/completions）
+    3. 程序內的模擬後端（不需要網路與 GPU），可設定延遲、生成速度、抖動與錯誤注入
+    4. 依網址選擇後端：fake:// 為模擬後端、含 /v1 的網址為 OpenAI 相容，其他為 Ollama
+
+模擬模型（SimulatedModel）同時用於模擬後端與本機模擬伺服器（python -m src.tools.mock_llm）。
+"""
+
+import asyncio
+import json
+import random
+import re
+import threading
+import time
+from urllib.parse import urlsplit, parse_qsl
+from typing import Optional, Dict, Any, Tuple, Iterator, AsyncIterator, List, Hashable
+
+from src.repository.llm.intent import IntentMatcher
+from src.repository.llm.prompts import describe_command
+from src.repository.llm.session import AgentSession
+
+DEFAULT_MODEL = "gemma3:4b"
+
+class LLMBackend:
+    """LLM 後端的介面"""
+    name = "base"
+
+    def __init__(self, api_url: str, api_key: str = "", model: str = DEFAULT_MODEL):
+        self.api_url = api_url
+        self.api_key = api_key
+        self.model = model
+
+    @property
+    def key(self) -> Hashable:
+        """辨識後端的鍵值（批次處理時判斷是否為相同請求）"""
+        return self.name, self.api_url, self.model
+
+    def iter_response(self, session: AgentSession, prompt: str, temperature: float, timeout: Tuple[float, float]) -> Iterator[str]:
+        """發送請求並逐一產生新增的文字（錯誤會直接拋出）"""
+        raise NotImplementedError
+
+    def aiter_response(self, session: AgentSession, prompt: str, temperature: float, timeout: Tuple[float, float]) -> AsyncIterator[str]:
+        """以 asyncio 發送請求並逐一產生新增的文字（錯誤會直接拋出）"""
+        raise NotImplementedError
+
+class HttpBackend(LLMBackend):
+    """以 HTTP 串流回應的後端（子類別決定請求內容與每一行的格式）"""
+    def build_request(self, prompt: str, temperature: float) -> Tuple[Dict[str, str], Dict[str, Any]]:
+        """建立請求的標頭與內容"""
+        raise NotImplementedError
+
+    def parse_line(self, line: str) -> Optional[str]:
+        """解析串流中的一行，回傳新增的文字"""
+        raise NotImplementedError
+
+    def headers(self) -> Dict[str, str]:
+        """請求標頭（沒有 API Key 時不送出 Authorization，httpx 不接受結尾為空白的標頭）"""
+        headers = {"Content-Type": "application/json"}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        return headers
+
+    def iter_response(self, session: AgentSession, prompt: str, temperature: float, timeout: Tuple[float, float]) -> Iterator[str]:
+        headers, data = self.build_request(prompt, temperature)
+        # 使用 with 確保串流結束後連線會歸還連線池
+        with session.post(self.api_url, headers = headers, json = data, stream = True, timeout = timeout) as response:
+            response.raise_for_status()
+            # 串流內容皆為 UTF-8，未標示編碼時 requests 會以 ISO-8859-1 解碼
+            response.encoding = "utf-8"
+            # 結束標記為最後一行，但仍需讀到串流結束，未讀完的連線無法放回連線池
+            for line in response.iter_lines(decode_unicode = True):
+                delta = self.parse_line(line)
+                if delta:
+                    yield delta
+
+    async def aiter_response(self, session: AgentSession, prompt: str, temperature: float, timeout: Tuple[float, float]) -> AsyncIterator[str]:
+        import httpx
+
+        headers, data = self.build_request(prompt, temperature)
+        client = session.async_client()
+        async with client.stream("POST", self.api_url, headers = headers, json = data, timeout = httpx.Timeout(timeout[1], connect = timeout[0])) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                delta = self.parse_line(line)
+                if delta:
+                    yield delta
+
+class OllamaBackend(HttpBackend):
+    """Ollama 風格的後端（NDJSON，每行為 {"response": ..., "done": ...}）"""
+    name = "ollama"
+
+    def __init__(self, api_url: str, api_key: str = "", model: str = DEFAULT_MODEL, keep_alive: Optional[str] = "30m"):
+        super().__init__(api_url, api_key, model)
+        # 模型保留在記憶體中的時間：模型卸載後，Prompt 相同的前綴也必須重新計算
+        self.keep_alive = keep_alive
+
+    def build_request(self, prompt: str, temperature: float) -> Tuple[Dict[str, str], Dict[str, Any]]:
+        headers = self.headers()
+        data = {
+            "model": self.model,
+            "prompt": prompt,
+            "temperature": temperature,
+            "stream": True
+        }
+        if self.keep_alive is not None:
+            data["keep_alive"] = self.keep_alive
+        return headers, data
+
+    def parse_line(self, line: str) -> Optional[str]:
+        if not line:
+            return None
+        data = json.loads(line)
+        return data.get("response") or None
+
+class OpenAIBackend(HttpBackend):
+    """OpenAI 相容的後端（SSE，每行為 data: {...}，以 data: [DONE] 結束）"""
+    name = "openai"
+
+    def __init__(self, api_url: str, api_key: str = "", model: str = DEFAULT_MODEL):
+        # 只提供到 /v1 時，補上對話的端點
+        if api_url.rstrip("/").endswith("/v1"):
+            api_url = api_url.rstrip("/") + "/chat/completions"
+        super().__init__(api_url, api_key, model)
+
+    def build_request(self, prompt: str, temperature: float) -> Tuple[Dict[str, str], Dict[str, Any]]:
+        headers = self.headers()
+        data = {
+            "model": self.model,
+            "messages": [{"role": "user", "content": prompt}],
+            "temperature": temperature,
+            "stream": True
+        }
+        return headers, data
+
+    def parse_line(self, line: str) -> Optional[str]:
+        if not line or not line.startswith("data:"):
+            return None
+        payload = line[5:].strip()
+        if payload == "[DONE]":
+            return None
+        choices = json.loads(payload).get("choices") or [{}]
+        return (choices[0].get("delta") or {}).get("content") or None
+
+class SimulatedModel:
+    """模擬的 LLM：依 Prompt 產生固定的回應，並模擬延遲、生成速度、抖動與錯誤"""
+    def __init__(self, latency: float = 0.2, token_rate: float = 50.0, jitter: float = 0.1, error_rate: float = 0.0, stall_rate: float = 0.0, stall: float = 30.0, chars_per_token: int = 2, seed: Optional[int] = None):
+        self.latency = latency                  # 第一個 token 前的延遲（秒）
+        self.token_rate = token_rate            # 每秒生成的 token 數，0 代表一次輸出全部文字
+        self.jitter = jitter                    # 延遲的相對抖動（0.1 代表 ±10%）
+        self.error_rate = error_rate            # 回傳錯誤的機率
+        self.stall_rate = stall_rate            # 卡住（延遲 stall 秒才回應）的機率
+        self.stall = stall
+        self.chars_per_token = chars_per_token  # 每個 token 的字數
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._matcher = IntentMatcher()
+        self.requests = 0
+        self.errors = 0
+        self.stalls = 0
+
+    def plan(self, prompt: str) -> Tuple[bool, float, List[str], float]:
+        """決定一次請求的結果：（是否錯誤、第一個 token 前的延遲、各段文字、每段之間的間隔）"""
+        with self._lock:
+            self.requests += 1
+            roll = self._random.random()
+            jitter = 1 + self._random.uniform(-self.jitter, self.jitter)
+            if roll < self.error_rate:
+                self.errors += 1
+                return True, self.latency * jitter, [], 0.0
+            delay = self.latency * jitter
+            if roll < self.error_rate + self.stall_rate:
+                self.stalls += 1
+                delay = self.stall
+
+        text = self.respond(prompt)
+        step = self.chars_per_token
+        chunks = [text[i:i + step] for i in range(0, len(text), step)]
+        interval = jitter / self.token_rate if self.token_rate > 0 else 0.0
+        if self.token_rate <= 0:
+            chunks = [text]
+        return False, delay, chunks, interval
+
+    def respond(self, prompt: str) -> str:
+        """依 Prompt 的種類產生回應（解析時以規則比對產生指令，敘事時改寫行動結果，融合時兩者皆做）"""
+        found = re.search(r"玩家輸入：「(.*)」", prompt)
+        if found is not None:
+            command = self._matcher.match(found.group(1)) or {"action": "explore"}
+            if "可能的行動：" not in prompt:
+                return json.dumps(command, ensure_ascii = False)
+            description = describe_command(command)
+            for number, option, result in re.findall(r"^(\d+)\. (.+)\n\s*結果：(.*)$", prompt, re.M):
+                if option == description:
+                    return f"選項：{number}\n{result}四周安靜得只剩下你的呼吸聲，你定了定神，繼續留意身邊的變化。"
+            return "選項：0"
+
+        found = re.search(r"玩家行動的結果：\s*(.*?)\s*$", prompt, re.S)
+        if found is not None:
+            return f"{found.group(1)}四周安靜得只剩下你的呼吸聲，你定了定神，繼續留意身邊的變化。"
+        return "好的。"
+
+    def stats(self) -> Dict[str, Any]:
+        """統計資訊"""
+        return {"requests": self.requests, "errors": self.errors, "stalls": self.stalls}
+
+class FakeBackend(LLMBackend):
+    """程序內的模擬後端（不經過網路）"""
+    name = "fake"
+
+    def __init__(self, api_url: str = "fake://", api_key: str = "", model: str = DEFAULT_MODEL, simulated: Optional[SimulatedModel] = None):
+        super().__init__(api_url, api_key, model)
+        # 未指定模擬模型時，由網址的參數設定（如 fake://?latency=0.5&token_rate=20）
+        self.simulated = simulated or SimulatedModel(**self.options(api_url))
+
+    @staticmethod
+    def options(api_url: str) -> Dict[str, Any]:
+        """解析網址中的模擬參數"""
+        options = {}
+        for name, value in parse_qsl(urlsplit(api_url).query):
+            options[name] = int(value) if name in ("seed", "chars_per_token") else float(value)
+        return options
+
+    def iter_response(self, session: AgentSession, prompt: str, temperature: float, timeout: Tuple[float, float]) -> Iterator[str]:
+        error, delay, chunks, interval = self.simulated.plan(prompt)
+        if delay > timeout[1]:
+            time.sleep(timeout[1])
+            raise TimeoutError("模擬後端回應超時。")
+        time.sleep(delay)
+        if error:
+            raise ConnectionError("模擬後端發生錯誤。")
+        for i, chunk in enumerate(chunks):
+            if i and interval:
+                time.sleep(interval)
+            yield chunk
+
+    async def aiter_response(self, session: AgentSession, prompt: str, temperature: float, timeout: Tuple[float, float]) -> AsyncIterator[str]:
+        error, delay, chunks, interval = self.simulated.plan(prompt)
+        if delay > timeout[1]:
+            await asyncio.sleep(timeout[1])
+            raise TimeoutError("模擬後端回應超時。")
+        await asyncio.sleep(delay)
+        if error:
+            raise ConnectionError("模擬後端發生錯誤。")
+        for i, chunk in enumerate(chunks):
+            if i and interval:
+                await asyncio.sleep(interval)
+            yield chunk
+
+BACKENDS = {"ollama": OllamaBackend, "openai": OpenAIBackend, "fake": FakeBackend}
+
+def create_backend(api_url: str, api_key: str = "", kind: Optional[str] = None, model: str = DEFAULT_MODEL) -> LLMBackend:
+    """建立後端（kind 未指定時依網址判斷）"""
+    if kind is None:
+        if api_url.startswith("fake://"):
+            kind = "fake"
+        elif "/v1/" in api_url or api_url.rstrip("/").endswith("/v1"):
+            kind = "openai"
+        else:
+            kind = "ollama"
+    if kind not in BACKENDS:
+        raise ValueError(f"不支援的後端：{kind}")
+    return BACKENDS[kind](api_url, api_key, model = model)
@@ -2,18 +2,42 @@
 Agent 基礎類別：
     1. 呼叫 LLM 並回傳回應（呼叫失敗則回傳 None）
     2. 回傳預設內容，由 Parser 與 Narrator 實作
+    3. 透過共用的連線池發送請求，重複使用連線
+       （端點、請求內容與回應格式由後端決定，見 backends.py）
+    4. 提供 asyncio 版本的呼叫方法，逐行讀取串流回應
+    5. 提供串流版本的呼叫方法，逐一產生 LLM 新增的文字
+    6. 可透過共用的 Agent 池限制 asyncio 呼叫的同時進行數
+    7. 可透過共用的批次處理合併相同的請求（串流呼叫不經過批次處理）
+    8. 依容錯策略呼叫 LLM（總期限、重試、對沖、斷路器），Parser 與 Narrator 使用不同的期限
+    9. 記錄呼叫的追蹤區段、錯誤種類與回應的 token 數（見 telemetry.py）
 """
 
 import json
-import requests
-from typing import Optional, Callable
+import threading
+from typing import Optional, Callable, Awaitable, Tuple, Iterator, Generator, Hashable
+
+from src.repository.llm.backends import LLMBackend, create_backend
+from src.repository.llm.batcher import RequestBatcher
+from src.repository.llm.pool import AgentPool
+from src.repository.llm.prompts import count_tokens
+from src.repository.llm.resilience import ResiliencePolicy, CircuitOpenError
+from src.repository.llm.session import AgentSession, http_errors
+from src.repository.telemetry import TELEMETRY
 
 class BaseAgent:
     """Agent 的基礎類別，為 Parser 與 Narrator 的原型"""
-    def __init__(self, api_url: str, api_key: str, logger: Optional[Callable[[str, str], None]] = None):
+    NAME = "agent"      # 統計資料中的 Agent 名稱
+    DEADLINE = 60.0     # 未指定容錯策略時，每次呼叫的總期限（秒）
+
+    def __init__(self, api_url: str, api_key: str, logger: Optional[Callable[[str, str], None]] = None, session: Optional[AgentSession] = None, pool: Optional[AgentPool] = None, batcher: Optional[RequestBatcher] = None, policy: Optional[ResiliencePolicy] = None, backend: Optional[LLMBackend] = None):
         self.api_url = api_url
         self.api_key = api_key
+        self.backend = backend or create_backend(api_url, api_key)    # 未指定時依網址選擇後端
         self.logger = logger or self._default_logger
+        self.session = session or AgentSession()
+        self.pool = pool        # 共用的 Agent 池，None 代表不限制同時進行的呼叫數
+        self.batcher = batcher  # 共用的批次處理，None 代表每個請求直接發送
+        self.policy = policy or ResiliencePolicy(deadline = self.DEADLINE)
 
     def _log(self, level: str, message: str):
         """內部日誌方法"""
@@ -23,44 +47,121 @@ class BaseAgent:
         """預設日誌"""
         print(f"{level}　{message}")
 
-    def call_api(self, prompt: str, temperature: float = 0.3) -> Optional[str]:
-        """呼叫 LLM，如果呼叫失敗會回傳 None"""
+    def _iter_response(self, prompt: str, temperature: float, timeout: Tuple[float, float] = (10, 60), cancel: Optional[threading.Event] = None) -> Iterator[str]:
+        """透過後端發送請求並逐一產生新增的文字（timeout 為連線與讀取的期限，cancel 設定時停止讀取並關閉連線，錯誤會直接拋出）"""
+        self._log("【API】", "發送請求...")
+        tokens = 0
+        stream = self.backend.iter_response(self.session, prompt, temperature, timeout)
         try:
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json",
-            }
-            data = {
-                "model": "gemma3:4b",
-                "prompt": prompt,
-                "temperature": temperature,
-                "stream": True
-            }
-            self._log("【API】", "發送請求...")
-            response = requests.post(self.api_url, headers = headers, json = data, stream = True, timeout = (10, 60))
-            response.raise_for_status()
-            chunks = []
-            for line in response.iter_lines(decode_unicode = True):
-                if not line:
-                    continue
-                data = json.loads(line)
-                delta = data.get("response")
-                if delta:
-                    chunks.append(delta)
-                if data.get("done"):
-                    break
-            self._log("【API】", "回應成功！")
-            return "".join(chunks)
-
-        except requests.exceptions.Timeout:
+            for delta in stream:
+                if cancel is not None and cancel.is_set():
+                    self._log("【API】", "請求已放棄，關閉連線。")
+                    return
+                tokens += 1
+                yield delta
+        finally:
+            stream.close()
+        self._log("【API】", "回應成功！")
+        TELEMETRY.observe("llm_response_tokens", tokens, agent = self.NAME)
+
+    def _log_error(self, e: Exception):
+        """記錄呼叫 LLM 時發生的錯誤"""
+        if isinstance(e, CircuitOpenError):
+            kind = "circuit_open"
+            self._log("【API】", "LLM 後端異常，暫時略過呼叫。")
+        elif isinstance(e, (TimeoutError,) + http_errors("Timeout", "TimeoutException")):
+            kind = "timeout"
             self._log("【API】", "請求超時。")
-            return None
-        except requests.exceptions.RequestException as e:
+        elif isinstance(e, (ConnectionError,) + http_errors("RequestException", "HTTPError")):
+            kind = "network"
             self._log("【API】", f"網路錯誤。\n錯誤訊息：{e}")
-            return None
-        except json.JSONDecodeError as e:
+        elif isinstance(e, json.JSONDecodeError):
+            kind = "json"
             self._log("【API】", f"JSON 解析錯誤。\n錯誤訊息：{e}")
-            return None
-        except Exception as e:
+        else:
+            kind = "unknown"
             self._log("【API】", f"未知錯誤。\n錯誤訊息：{e}")
-            return None
\ No newline at end of file
+        TELEMETRY.inc("llm_errors_total", agent = self.NAME, kind = kind)
+
+    def _record_prompt(self, prompt: str):
+        """記錄 Prompt 的 token 數（只在啟用統計時計算）"""
+        if TELEMETRY.enabled:
+            TELEMETRY.observe("llm_prompt_tokens", count_tokens(prompt), agent = self.NAME)
+
+    def _batch_key(self, prompt: str, temperature: float) -> Tuple[Hashable, str, float]:
+        """批次處理中判斷是否為相同請求的鍵值"""
+        return self.backend.key, prompt, temperature
+
+    def call_api(self, prompt: str, temperature: float = 0.3) -> Optional[str]:
+        """呼叫 LLM，如果呼叫失敗會回傳 None"""
+        def request() -> str:
+            return self.policy.run(lambda timeout, cancel: "".join(self._iter_response(prompt, temperature, timeout, cancel)))
+
+        self._record_prompt(prompt)
+        with TELEMETRY.span("call_api", agent = self.NAME) as span:
+            try:
+                if self.batcher is not None:
+                    return self.batcher.call(self._batch_key(prompt, temperature), request)
+                return request()
+            except Exception as e:
+                span.set(status = "error")
+                self._log_error(e)
+                return None
+
+    def stream_api(self, prompt: str, temperature: float = 0.3) -> Generator[str, None, bool]:
+        """串流呼叫 LLM，逐一產生新增的文字，結束時回傳是否成功（可透過 yield from 取得）"""
+        # 串流已輸出的文字無法收回，因此不重試也不對沖，只檢查斷路器並限制讀取期限
+        breaker = self.policy.breaker
+        self._record_prompt(prompt)
+        with TELEMETRY.span("stream_api", agent = self.NAME) as span:
+            try:
+                if not breaker.allow():
+                    raise CircuitOpenError("LLM 後端異常，暫時停止呼叫。")
+                yield from self._iter_response(prompt, temperature, self.policy.timeout(self.policy.deadline))
+                breaker.record_success()
+                return True
+            except CircuitOpenError as e:
+                span.set(status = "error")
+                self._log_error(e)
+                return False
+            except Exception as e:
+                span.set(status = "error")
+                breaker.record_failure()
+                self._log_error(e)
+                return False
+
+    async def call_api_async(self, prompt: str, temperature: float = 0.3) -> Optional[str]:
+        """以 asyncio 呼叫 LLM，逐行讀取串流回應，如果呼叫失敗會回傳 None"""
+        self._record_prompt(prompt)
+        with TELEMETRY.span("call_api", agent = self.NAME) as span:
+            if self.pool is None:
+                response = await self._call_api_async(prompt, temperature)
+            else:
+                async with self.pool.slot():
+                    response = await self._call_api_async(prompt, temperature)
+            if response is None:
+                span.set(status = "error")
+            return response
+
+    async def _call_api_async(self, prompt: str, temperature: float) -> Optional[str]:
+        """以 asyncio 呼叫 LLM（不經過 Agent 池）"""
+        def request() -> Awaitable[str]:
+            return self.policy.run_async(lambda timeout: self._request_async(prompt, temperature, timeout))
+
+        try:
+            if self.batcher is not None:
+                return await self.batcher.call_async(self._batch_key(prompt, temperature), request)
+            return await request()
+        except Exception as e:
+            self._log_error(e)
+            return None
+
+    async def _request_async(self, prompt: str, temperature: float, timeout: Tuple[float, float] = (10, 60)) -> str:
+        """以 asyncio 透過後端發送請求並讀取串流回應（timeout 為連線與讀取的期限，錯誤會直接拋出）"""
+        self._log("【API】", "發送請求...")
+        chunks = []
+        async for delta in self.backend.aiter_response(self.session, prompt, temperature, timeout):
+            chunks.append(delta)
+        self._log("【API】", "回應成功！")
+        TELEMETRY.observe("llm_response_tokens", len(chunks), agent = self.NAME)
+        return "".join(chunks)
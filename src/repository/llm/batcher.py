@@ -0,0 +1,206 @@
+"""
+LLM 請求的批次處理（位於 BaseAgent.call_api 之下，多個遊戲共用）：
+    1. 在短暫的時間窗內收集請求，達到批次上限或時間窗結束時一起送出（同時發送，後端沒有批次 API）
+    2. 合併相同的請求（相同的網址、Prompt 與溫度），進行中的請求只呼叫一次 LLM，結果回傳給所有等待者
+    3. 提供同步（執行緒）與 asyncio 兩種版本
+    4. 回報統計資訊（批次大小、排隊時間、省下的呼叫次數）
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Optional, Callable, Awaitable, Dict, Any, Hashable, List, Tuple
+
+class RequestBatcher:
+    """收集短時間內的 LLM 請求後一起送出，並合併相同的進行中請求"""
+    def __init__(self, window_ms: float = 5.0, max_batch: int = 8, coalesce: bool = True, max_workers: Optional[int] = None):
+        self.window = window_ms / 1000  # 收集請求的時間窗（秒），0 代表收到就送出
+        self.max_batch = max_batch      # 每批最多的請求數，達到時立即送出
+        self.coalesce = coalesce        # 是否合併相同的進行中請求
+
+        # 同步版本：背景執行緒收集請求，再交給執行緒池同時發送
+        self._lock = threading.Condition()
+        self._pending: List[Tuple[Hashable, Callable[[], str], Future, float]] = []    # （鍵值、呼叫、結果、加入時間）
+        self._inflight: Dict[Hashable, Future] = {}
+        self._executor = ThreadPoolExecutor(max_workers = max_workers or max_batch * 2, thread_name_prefix = "batcher")
+        self._dispatcher: Optional[threading.Thread] = None
+        self._closed = False
+
+        # asyncio 版本：綁定第一次使用時的事件迴圈
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._async_pending: List[Tuple[Hashable, Callable[[], Awaitable[str]], asyncio.Future, float]] = []
+        self._async_inflight: Dict[Hashable, asyncio.Future] = {}
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._tasks = set()     # 進行中的呼叫（保留參照，避免被回收）
+
+        self.requests = 0
+        self.calls = 0
+        self.coalesced = 0
+        self.batches = 0
+        self.max_batch_size = 0
+        self.queue_wait = 0.0
+        self.max_queue_wait = 0.0
+
+    def _record_batch(self, size: int, waits: List[float]):
+        """記錄一批請求的大小與排隊時間"""
+        self.batches += 1
+        self.calls += size
+        self.max_batch_size = max(self.max_batch_size, size)
+        self.queue_wait += sum(waits)
+        self.max_queue_wait = max(self.max_queue_wait, max(waits))
+
+    # ─── 同步版本 ───
+
+    def call(self, key: Hashable, request: Callable[[], str]) -> str:
+        """送出請求並等待結果（key 相同的進行中請求只會呼叫一次 request，錯誤會拋給所有等待者）"""
+        return self.submit(key, request).result()
+
+    def submit(self, key: Hashable, request: Callable[[], str]) -> Future:
+        """送出請求，回傳結果的 Future"""
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("批次處理已關閉。")
+            self.requests += 1
+            if self.coalesce:
+                future = self._inflight.get(key)
+                if future is not None:
+                    self.coalesced += 1
+                    return future
+            future = Future()
+            if self.coalesce:
+                self._inflight[key] = future
+            self._pending.append((key, request, future, time.perf_counter()))
+            if self._dispatcher is None:
+                self._dispatcher = threading.Thread(target = self._dispatch_loop, name = "batcher-dispatcher", daemon = True)
+                self._dispatcher.start()
+            self._lock.notify()
+        return future
+
+    def _dispatch_loop(self):
+        """背景執行緒：等待時間窗結束或批次已滿後送出"""
+        while True:
+            with self._lock:
+                while not self._pending and not self._closed:
+                    self._lock.wait()
+                if not self._pending:
+                    return
+                deadline = self._pending[0][3] + self.window
+                while len(self._pending) < self.max_batch and not self._closed:
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        break
+                    self._lock.wait(remaining)
+                batch = self._pending[:self.max_batch]
+                del self._pending[:self.max_batch]
+                now = time.perf_counter()
+                self._record_batch(len(batch), [now - enqueued for _, _, _, enqueued in batch])
+            for key, request, future, _ in batch:
+                self._executor.submit(self._run, key, request, future)
+
+    def _run(self, key: Hashable, request: Callable[[], str], future: Future):
+        """執行一個請求，並將結果交給所有等待者"""
+        try:
+            result = request()
+        except BaseException as e:
+            self._finish(key, future)
+            future.set_exception(e)
+        else:
+            self._finish(key, future)
+            future.set_result(result)
+
+    def _finish(self, key: Hashable, future: Future):
+        """請求完成，之後相同的請求會重新呼叫"""
+        with self._lock:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    # ─── asyncio 版本 ───
+
+    async def call_async(self, key: Hashable, request: Callable[[], Awaitable[str]]) -> str:
+        """以 asyncio 送出請求並等待結果（取消單一等待者不會取消合併的呼叫）"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # 換事件迴圈時，舊迴圈的請求已無法繼續
+            self._loop = loop
+            self._async_pending = []
+            self._async_inflight = {}
+            self._flush_handle = None
+
+        self.requests += 1
+        if self.coalesce:
+            future = self._async_inflight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return await asyncio.shield(future)
+
+        future = loop.create_future()
+        if self.coalesce:
+            self._async_inflight[key] = future
+        self._async_pending.append((key, request, future, time.perf_counter()))
+        if len(self._async_pending) >= self.max_batch:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.window, self._flush)
+        return await asyncio.shield(future)
+
+    def _flush(self):
+        """送出目前收集的請求"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._async_pending = self._async_pending, []
+        if not batch:
+            return
+        now = time.perf_counter()
+        self._record_batch(len(batch), [now - enqueued for _, _, _, enqueued in batch])
+        for key, request, future, _ in batch:
+            task = self._loop.create_task(self._run_async(key, request, future))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run_async(self, key: Hashable, request: Callable[[], Awaitable[str]], future: asyncio.Future):
+        """以 asyncio 執行一個請求，並將結果交給所有等待者"""
+        try:
+            result = await request()
+        except asyncio.CancelledError:
+            self._finish_async(key, future)
+            future.cancel()
+            raise
+        except Exception as e:
+            self._finish_async(key, future)
+            if not future.done():
+                future.set_exception(e)
+        else:
+            self._finish_async(key, future)
+            if not future.done():
+                future.set_result(result)
+
+    def _finish_async(self, key: Hashable, future: asyncio.Future):
+        """請求完成，之後相同的請求會重新呼叫"""
+        if self._async_inflight.get(key) is future:
+            del self._async_inflight[key]
+
+    # ─── 統計、關閉 ───
+
+    def stats(self) -> Dict[str, Any]:
+        """統計資訊"""
+        return {
+            "requests": self.requests,
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "batches": self.batches,
+            "average_batch_size": self.calls / self.batches if self.batches else 0.0,
+            "max_batch_size": self.max_batch_size,
+            "average_queue_wait": self.queue_wait / self.calls if self.calls else 0.0,
+            "max_queue_wait": self.max_queue_wait
+        }
+
+    def close(self):
+        """送出剩餘的請求後停止背景執行緒"""
+        with self._lock:
+            self._closed = True
+            self._lock.notify()
+        if self._dispatcher is not None:
+            self._dispatcher.join()
+        self._executor.shutdown(wait = False)
@@ -0,0 +1,240 @@
+"""
+Agent 快取：
+    1. 解析結果快取，以正規化後的玩家輸入作為鍵值
+    2. LRU 淘汰、TTL 過期、命中統計
+    3. 可選擇以 SQLite 保存，讓不同遊戲、不同程序共用快取（限制列數，超過時刪除最早寫入的項目）
+    4. 敘事快取，以遊戲狀態的投影與行動結果作為鍵值，每個鍵值保留多個版本
+"""
+
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List, Tuple
+
+from src.repository.core.state import GameState
+from src.repository.llm.intent import IntentMatcher
+
+# 可以快取的指令（解析失敗的 {"action": "invalid"} 不快取）
+CACHEABLE_ACTIONS = ("move", "explore", "talk", "use", "choose")
+
+class ParseCache:
+    """解析結果快取（LRU + TTL，可選擇以 SQLite 保存）"""
+    def __init__(self, max_size: int = 1024, ttl: Optional[float] = None, path: Optional[str] = None, max_rows: int = 65536):
+        self.max_size = max_size    # 記憶體中最多保留的項目數
+        self.ttl = ttl              # 項目的存活秒數，None 代表不過期
+        self.path = path            # SQLite 檔案路徑，None 代表只使用記憶體
+        self.max_rows = max_rows    # SQLite 中最多保留的項目數
+
+        self._items = OrderedDict()     # 鍵值 -> (指令, 建立時間)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._db = None
+        if path is not None:
+            self._db = sqlite3.connect(path, check_same_thread = False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS parse_cache (key TEXT PRIMARY KEY, command TEXT NOT NULL, created REAL NOT NULL)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS parse_cache_created ON parse_cache (created)")
+            if ttl is not None:
+                self._db.execute("DELETE FROM parse_cache WHERE created < ?", (time.time() - ttl,))
+            self._trim()
+            self._db.commit()
+
+    @staticmethod
+    def make_key(user_input: str) -> str:
+        """正規化玩家輸入（全形轉半形、移除空白與標點）作為鍵值"""
+        return IntentMatcher.normalize(user_input)
+
+    def _expired(self, created: float) -> bool:
+        """項目是否已過期"""
+        return self.ttl is not None and time.time() - created > self.ttl
+
+    def get(self, user_input: str) -> Optional[Dict[str, Any]]:
+        """取得快取的指令，沒有則回傳 None"""
+        key = self.make_key(user_input)
+        with self._lock:
+            entry = self._items.get(key)
+            if entry is None and self._db is not None:
+                row = self._db.execute("SELECT command, created FROM parse_cache WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    entry = (json.loads(row[0]), row[1])
+                    self._store(key, entry)
+
+            if entry is None or self._expired(entry[1]):
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+
+            self._items.move_to_end(key)
+            self.hits += 1
+            return dict(entry[0])
+
+    def put(self, user_input: str, command: Dict[str, Any]):
+        """寫入快取，只接受合法的指令"""
+        if not isinstance(command, dict) or command.get("action") not in CACHEABLE_ACTIONS:
+            return
+        key = self.make_key(user_input)
+        entry = (dict(command), time.time())
+        with self._lock:
+            self._store(key, entry)
+            if self._db is not None:
+                self._db.execute("INSERT OR REPLACE INTO parse_cache VALUES (?, ?, ?)", (key, json.dumps(entry[0], ensure_ascii = False), entry[1]))
+                self._trim()
+                self._db.commit()
+
+    def _store(self, key: str, entry: tuple):
+        """寫入記憶體，超過上限時淘汰最久未使用的項目"""
+        self._items[key] = entry
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_size:
+            self._items.popitem(last = False)
+            self.evictions += 1
+
+    def _trim(self):
+        """SQLite 超過列數上限時，刪除最早寫入的項目（呼叫端需持有鎖並提交）"""
+        excess = self._db.execute("SELECT COUNT(*) FROM parse_cache").fetchone()[0] - self.max_rows
+        if excess > 0:
+            self._db.execute("DELETE FROM parse_cache WHERE key IN (SELECT key FROM parse_cache ORDER BY created LIMIT ?)", (excess,))
+
+    def _remove(self, key: str):
+        """移除過期項目"""
+        self._items.pop(key, None)
+        if self._db is not None:
+            self._db.execute("DELETE FROM parse_cache WHERE key = ?", (key,))
+            self._db.commit()
+
+    def clear(self):
+        """清空快取"""
+        with self._lock:
+            self._items.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM parse_cache")
+                self._db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        """命中統計"""
+        total = self.hits + self.misses
+        return {
+            "size": len(self._items),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0
+        }
+
+    def close(self):
+        """關閉 SQLite 連線"""
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+class NarrationCache:
+    """敘事快取（以狀態轉換為鍵值，每個鍵值保留多個版本，LRU 淘汰，可從檔案預熱）"""
+    VERSION = 1
+
+    def __init__(self, max_size: int = 4096, max_variants: int = 3, min_variants: int = 1, fill_rate: float = 0.2, path: Optional[str] = None, seed: Optional[int] = None):
+        self.max_size = max_size            # 最多保留的鍵值數
+        self.max_variants = max_variants    # 每個鍵值最多保留的版本數
+        self.min_variants = min_variants    # 至少累積幾個版本後才開始使用快取
+        self.fill_rate = fill_rate          # 版本未滿時，仍呼叫 LLM 產生新版本的機率
+        self.path = path                    # 預熱與保存的 JSON 檔案路徑
+
+        self._items = OrderedDict()     # 鍵值 -> 版本列表
+        self._lock = threading.Lock()
+        self._random = random.Random(seed)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if path is not None and os.path.exists(path):
+            self.load(path)
+
+    @staticmethod
+    def make_key(game_state: GameState, action_result: str) -> Tuple:
+        """Narrator 會用到的狀態欄位（體力分為高、中、低三段）加上行動結果"""
+        health = game_state.player_health
+        return (
+            game_state.player_location,
+            2 if health >= 7 else 1 if health >= 4 else 0,
+            game_state.player_sanity,
+            game_state.npc_a["sanity"], game_state.npc_a["collapsed"],
+            game_state.npc_b["sanity"], game_state.npc_b["collapsed"],
+            game_state.npc_c["sanity"], game_state.npc_c["collapsed"],
+            action_result
+        )
+
+    def get(self, game_state: GameState, action_result: str) -> Optional[str]:
+        """隨機取得一個快取的版本，沒有（或需要產生新版本）則回傳 None"""
+        key = self.make_key(game_state, action_result)
+        with self._lock:
+            variants = self._items.get(key)
+            if variants is None or len(variants) < self.min_variants:
+                self.misses += 1
+                return None
+            if len(variants) < self.max_variants and self._random.random() < self.fill_rate:
+                self.misses += 1
+                return None
+
+            self._items.move_to_end(key)
+            self.hits += 1
+            return self._random.choice(variants)
+
+    def put(self, game_state: GameState, action_result: str, story: str):
+        """新增一個版本，版本已滿時取代最舊的版本"""
+        key = self.make_key(game_state, action_result)
+        with self._lock:
+            self._add(key, story)
+
+    def _add(self, key: Tuple, story: str):
+        """寫入版本，超過上限時淘汰最久未使用的鍵值"""
+        variants = self._items.setdefault(key, [])
+        if story in variants:
+            return
+        variants.append(story)
+        if len(variants) > self.max_variants:
+            variants.pop(0)
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_size:
+            self._items.popitem(last = False)
+            self.evictions += 1
+
+    def load(self, path: str):
+        """從 JSON 檔案預熱快取"""
+        with open(path, "r", encoding = "utf-8") as f:
+            data = json.load(f)
+        if data.get("version") != self.VERSION:
+            return
+        with self._lock:
+            for key, variants in data["entries"]:
+                for story in variants:
+                    self._add(tuple(key), story)
+
+    def save(self, path: Optional[str] = None):
+        """將快取保存為 JSON 檔案（未指定路徑時使用建立時的路徑）"""
+        path = path or self.path
+        if path is None:
+            raise ValueError("未指定敘事快取的保存路徑。")
+        with self._lock:
+            entries: List = [[list(key), variants] for key, variants in self._items.items()]
+        # 先寫入暫存檔再取代，避免寫到一半時中斷而損毀
+        with open(path + ".tmp", "w", encoding = "utf-8") as f:
+            json.dump({"version": self.VERSION, "entries": entries}, f, ensure_ascii = False)
+        os.replace(path + ".tmp", path)
+
+    def stats(self) -> Dict[str, Any]:
+        """命中統計"""
+        total = self.hits + self.misses
+        return {
+            "size": len(self._items),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0
+        }
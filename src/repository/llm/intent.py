@@ -0,0 +1,186 @@
+"""
+規則式意圖比對（Parser 的快速路徑）：
+    1. 根據遊戲引擎中的地點、NPC、物品建立關鍵字與句型表
+    2. 將簡短、格式固定的輸入直接轉換為結構化指令，不需要呼叫 LLM
+    3. 信心不足時回傳 None，交由 LLM 解析
+    4. 統計命中率，用於確認省下多少 LLM 呼叫
+"""
+
+import re
+import unicodedata
+from typing import Optional, Dict, Any, Tuple, List, Iterable
+
+from src.repository.core.engine import LOCATIONS, NPCS, ITEMS
+
+# 各種行動的動詞（較長的詞放前面，避免「移動到」被「到」搶先比對）
+MOVE_VERBS = ("移動到", "移動去", "前往", "走到", "走去", "跑到", "跑去", "回到", "進入", "去", "到", "回")
+EXPLORE_VERBS = ("四處看看", "到處看看", "看看四周", "環顧四周", "探索", "調查", "搜索", "搜尋", "尋找", "找找", "翻找", "查看")
+TALK_VERBS = ("聊天", "聊聊", "說話", "講話", "交談", "談話", "對話", "搭話", "攀談", "打招呼")
+USE_VERBS = ("使用", "交給", "拿給", "歸還", "宣布", "吃掉", "喝掉", "打開", "吃", "喝", "用", "給", "還", "放", "買")
+ACCEPT_VERBS = ("接受", "答應", "同意", "好啊", "好的", "沒問題", "可以")
+REJECT_VERBS = ("拒絕", "不要", "不行", "不願意", "不答應", "不接受", "不同意", "算了")
+
+# 出現否定詞時，除了「選擇」以外的行動都交給 LLM 判斷
+NEGATIONS = ("不", "別", "沒")
+
+# 地點別名
+LOCATION_ALIASES = {
+    "辦公室": "教師辦公室",
+    "老師辦公室": "教師辦公室",
+    "圖書室": "圖書館",
+    "合作社": "福利社",
+    "販賣部": "福利社",
+}
+
+# 物品別名
+ITEM_ALIASES = {
+    "書": "書籍",
+    "試卷": "考卷",
+    "錢": "現金",
+}
+
+# 移除的標點符號（NFKC 正規化後）
+PUNCTUATION = re.compile(r"[\s,.!?;:~'\"()\[\]{}<>「」『』【】、。…⋯—-]+")
+
+# 問句的結尾（NFKC 正規化後，問號會在正規化時移除，因此先檢查原始輸入）
+QUESTION = re.compile(r"[?嗎呢][^\w?]*$")
+
+class IntentMatcher:
+    """規則式意圖比對器，信心足夠時直接產生指令，否則交由 LLM"""
+    def __init__(self, locations: Iterable[str] = LOCATIONS, npcs: Iterable[str] = NPCS, items: Iterable[str] = ITEMS, max_residual: int = 4):
+        # 名稱表：正規化後的名稱 -> 引擎使用的名稱（長的名稱優先比對）
+        self.locations = self._build_table(list(locations), LOCATION_ALIASES)
+        self.items = self._build_table(list(items), ITEM_ALIASES)
+        self.npcs = tuple(npcs)
+        self.max_residual = max_residual    # 去掉動詞與名稱後，允許剩下的字數（如「我想」、「一下」）
+
+        self.hits = 0
+        self.misses = 0
+
+    def _build_table(self, names: List[str], aliases: Dict[str, str]) -> List[Tuple[str, str]]:
+        """建立名稱表"""
+        table = {self.normalize(name): name for name in names}
+        table.update({self.normalize(alias): name for alias, name in aliases.items() if name in names})
+        return sorted(table.items(), key = lambda pair: len(pair[0]), reverse = True)
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """正規化輸入：全形轉半形、移除空白與標點、英文轉大寫"""
+        text = unicodedata.normalize("NFKC", text)
+        return PUNCTUATION.sub("", text).upper()
+
+    @staticmethod
+    def _find(text: str, words: Iterable[str]) -> Optional[str]:
+        """找出第一個出現在輸入中的詞"""
+        for word in words:
+            if word in text:
+                return word
+        return None
+
+    def _find_name(self, text: str, table: List[Tuple[str, str]]) -> Tuple[Optional[str], Optional[str]]:
+        """找出輸入中唯一的名稱，回傳（比對到的文字、引擎名稱），出現多個不同名稱則視為無法判斷"""
+        found = []
+        for key, name in table:
+            # 略過包含在較長名稱中的短名稱（如「遺書」中的「書」）
+            if key in text and not any(key in longer for longer, _ in found):
+                found.append((key, name))
+        if len({name for _, name in found}) != 1:
+            return None, None
+        return found[0]
+
+    @staticmethod
+    def _mask(text: str, table: List[Tuple[str, str]]) -> str:
+        """以空白遮蔽名稱表中的名稱"""
+        for key, _ in table:
+            text = text.replace(key, " ")
+        return text
+
+    def match(self, user_input: str) -> Optional[Dict[str, Any]]:
+        """比對玩家輸入，信心足夠時回傳結構化指令，否則回傳 None"""
+        question = QUESTION.search(unicodedata.normalize("NFKC", user_input)) is not None
+        command = self._match(self.normalize(user_input), question)
+        if command is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return command
+
+    def _reply(self, text: str) -> Optional[str]:
+        """整個輸入只有回覆（可以在前後加上一個 NPC 代號，如「接受」、「拒絕A」）時回傳選擇，否則回傳 None"""
+        for npc in self.npcs:
+            if text.startswith(npc):
+                text = text[len(npc):]
+                break
+            if text.endswith(npc):
+                text = text[:-len(npc)]
+                break
+        if text in REJECT_VERBS:
+            return "拒絕"
+        if text in ACCEPT_VERBS:
+            return "接受"
+        return None
+
+    def _match(self, text: str, question: bool = False) -> Optional[Dict[str, Any]]:
+        """比對正規化後的輸入（question 為 True 代表輸入是問句）"""
+        if not text:
+            return None
+
+        # 選擇：只有整個輸入就是回覆時成立，問句（如「可以嗎？」）或帶有其他內容（如「不要去圖書館」）時交給 LLM
+        choice = self._reply(text)
+        if choice is not None and not question:
+            return {"action": "choose", "choice": choice}
+        if choice is not None or self._find(text, REJECT_VERBS + ACCEPT_VERBS):
+            return None
+
+        if self._find(text, NEGATIONS):
+            return None
+
+        candidates = []
+
+        # 遮蔽地點名稱後再比對物品（如「圖書館」中的「書」不是物品）
+        location_key, location = self._find_name(text, self.locations)
+        item_key, item = self._find_name(self._mask(text, self.locations), self.items)
+
+        # 使用物品：物品名稱 + 使用動詞（物品名稱可能包含 NPC 代號，之後的比對都先移除）
+        rest = text.replace(item_key, "", 1) if item_key else text
+        verb = self._find(self._mask(rest, self.locations), USE_VERBS)
+        if item and verb:
+            candidates.append(({"action": "use", "object": item}, item_key + verb))
+
+        # 移動：地點名稱 + 移動動詞
+        verb = self._find(rest, MOVE_VERBS)
+        if location and verb:
+            candidates.append(({"action": "move", "target": location}, location_key + verb))
+
+        # 對話：唯一的 NPC 代號 + 對話動詞
+        npcs = [npc for npc in self.npcs if npc in rest]
+        verb = self._find(rest, TALK_VERBS)
+        if len(npcs) == 1 and verb:
+            candidates.append(({"action": "talk", "target": npcs[0]}, npcs[0] + verb))
+
+        # 探索
+        verb = self._find(text, EXPLORE_VERBS)
+        if verb and not item and not npcs:
+            candidates.append(({"action": "explore"}, verb + (location_key or "")))
+
+        # 只接受唯一、且沒有多餘內容的比對結果
+        if len(candidates) != 1:
+            return None
+        command, matched = candidates[0]
+        if len(text) - len(matched) > self.max_residual:
+            return None
+        return command
+
+    @property
+    def hit_rate(self) -> float:
+        """命中率"""
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        """命中統計（命中次數即為省下的 LLM 呼叫次數）"""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hit_rate
+        }
@@ -2,58 +2,146 @@
 Narrator agent（根據遊戲狀態與行動結果產生故事）：
     1. 根據遊戲狀態與行動結果，呼叫 LLM 後回傳文本
     2. 回傳預設內容
+    3. 提供 asyncio 版本的生成方法
+    4. 快取生成的文本，相同的狀態轉換不再重複呼叫 LLM
+    5. 串流生成文本，逐段產生 LLM 新增的文字
+    6. 記錄生成的追蹤區段、快取命中與改用預設文本的次數
+    7. 採用融合模式生成的文本（與自己生成的文本相同，寫入快取並附加理智值的描述）
 """
 
-import textwrap
+from typing import Optional, Callable, Generator
 
 from src.repository.core.state import GameState
+from src.repository.llm.backends import LLMBackend
 from src.repository.llm.base_model import BaseAgent
+from src.repository.llm.batcher import RequestBatcher
+from src.repository.llm.cache import NarrationCache
+from src.repository.llm.pool import AgentPool
+from src.repository.llm.prompts import NARRATOR_PROMPT, render_state
+from src.repository.llm.resilience import ResiliencePolicy
+from src.repository.llm.session import AgentSession
+from src.repository.telemetry import TELEMETRY
 
 class NarratorAgent(BaseAgent):
     """Narrator agent，根據前的遊戲狀態和行動結果產生故事"""
+    NAME = "narrator"
+    DEADLINE = 30.0     # 每次呼叫的總期限（秒），敘事較長，期限較寬鬆，超過期限時改用行動結果
+
+    def __init__(self, api_url: str, api_key: str, logger: Optional[Callable[[str, str], None]] = None, session: Optional[AgentSession] = None, pool: Optional[AgentPool] = None, batcher: Optional[RequestBatcher] = None, policy: Optional[ResiliencePolicy] = None, backend: Optional[LLMBackend] = None, cache: Optional[NarrationCache] = None):
+        super().__init__(api_url, api_key, logger = logger, session = session, pool = pool, batcher = batcher, policy = policy, backend = backend)
+        self.cache = cache or NarrationCache()
+
     def generate_story(self, game_state: GameState, action_result: str) -> str:
         """生成並回傳敘事文本"""
-        sanity_suffix = ""
+        with TELEMETRY.span("generate_story"):
+            story = self._cached_story(game_state, action_result)
+            if story is not None:
+                return story
+
+            prompt = self._build_prompt(game_state, action_result)
+            self._log("【NARRATOR】", "生成敘事...")
+            response = self.call_api(prompt, temperature = 0.3)
+            return self._finish_story(response, game_state, action_result)
+
+    async def generate_story_async(self, game_state: GameState, action_result: str) -> str:
+        """以 asyncio 生成並回傳敘事文本"""
+        with TELEMETRY.span("generate_story"):
+            story = self._cached_story(game_state, action_result)
+            if story is not None:
+                return story
+
+            prompt = self._build_prompt(game_state, action_result)
+            self._log("【NARRATOR】", "生成敘事...")
+            response = await self.call_api_async(prompt, temperature = 0.3)
+            return self._finish_story(response, game_state, action_result)
+
+    def stream_story(self, game_state: GameState, action_result: str) -> Generator[str, None, bool]:
+        """串流生成敘事文本，逐段產生文字（去除頭尾空白的結果與 generate_story 相同），結束時回傳是否為完整的敘事（可透過 yield from 取得）"""
+        story = self._cached_story(game_state, action_result)
+        if story is not None:
+            yield story
+            return True
+
+        prompt = self._build_prompt(game_state, action_result)
+        self._log("【NARRATOR】", "生成敘事...")
+        stream = self.stream_api(prompt, temperature = 0.3)
+        chunks = []
+        pending = ""    # 暫存結尾的空白，確認後面還有文字才輸出
+        while True:
+            try:
+                delta = next(stream)
+            except StopIteration as stop:
+                success = stop.value
+                break
+            if not chunks:
+                delta = delta.lstrip()
+                if not delta:
+                    continue
+            chunks.append(delta)
+            body = delta.rstrip()
+            if body:
+                yield pending + body
+                pending = delta[len(body):]
+            else:
+                pending += delta
+
+        sanity_suffix = self._sanity_suffix(game_state)
+        if not chunks:
+            TELEMETRY.inc("fallbacks_total", agent = self.NAME)
+            self._log("【NARRATOR】", "生成失敗，使用預設文本。")
+            yield action_result + sanity_suffix
+            return False
+
+        story = "".join(chunks).strip()
+        if success:
+            self._log("【NARRATOR】", "生成成功！")
+            self.cache.put(game_state, action_result, story)
+        else:
+            self._log("【NARRATOR】", "生成中斷。")
+        if sanity_suffix:
+            yield sanity_suffix
+        return success
+
+    def accept_story(self, game_state: GameState, action_result: str, story: str) -> str:
+        """採用其他來源（如融合模式）生成的文本：寫入快取並附加理智值的描述"""
+        story = story.strip()
+        self.cache.put(game_state, action_result, story)
+        return story + self._sanity_suffix(game_state)
+
+    def _cached_story(self, game_state: GameState, action_result: str) -> Optional[str]:
+        """從快取取得文本，沒有則回傳 None"""
+        story = self.cache.get(game_state, action_result)
+        if story is None:
+            TELEMETRY.inc("cache_misses_total", cache = "narration")
+            return None
+        TELEMETRY.inc("cache_hits_total", cache = "narration")
+        self._log("【NARRATOR】", "快取命中！")
+        return story + self._sanity_suffix(game_state)
+
+    @staticmethod
+    def _sanity_suffix(game_state: GameState) -> str:
+        """根據玩家理智值，取得附加在文本後的描述"""
         if game_state.player_sanity <= 1:
-            sanity_suffix = "\n你感覺腦子亂七八糟，不知道如何思考才是對的，集中精神變得異常困難。"
+            return "\n你感覺腦子亂七八糟，不知道如何思考才是對的，集中精神變得異常困難。"
         elif game_state.player_sanity <= 2:
-            sanity_suffix = "\n你覺得自己精神有點恍惚，似乎快分不清什麼是真實的、什麼是腦中的聲響。"
-
-        # 呼叫 LLM
-        prompt = textwrap.dedent(f"""
-            你是一個遊戲文本的生成助理，負責根據遊戲狀態與行動結果，使用繁體中文撰寫合理且一致的故事描述。
-            
-            當前遊戲狀態如下：
-            - 玩家所在位置：{game_state.player_location}
-            - 玩家體力：{game_state.player_health} / 10
-            - 玩家理智：{game_state.player_sanity} / 5
-            - NPC A 理智：{game_state.npc_a['sanity']} / 3 （是否發生異樣：{game_state.npc_a['collapsed']}）
-            - NPC B 理智：{game_state.npc_b['sanity']} / 3 （是否發生異樣：{game_state.npc_b['collapsed']}）
-            - NPC C 理智：{game_state.npc_c['sanity']} / 5 （是否發生異樣：{game_state.npc_c['collapsed']}）
-            
-            玩家行動的結果：
-            {action_result}
-            
-            請根據「玩家理智值」調整敘事語氣，生成約 100 字連貫的故事描述，但不可以提到「理智值」：
-            - 理智值為 4 ~ 5：語氣平靜、清楚，偏向客觀描述
-            - 理智值為 2 ~ 3：開始出現不安、遲疑或對環境的懷疑
-            - 理智值為 0 ~ 1：語言壓抑、扭曲，充滿恐懼或對現實感崩解的感受
-            
-            敘事規則：
-            - 使用第三人稱或貼近玩家感受的敘事角度，但不要直接評論數據，比如數值的高低
-            - 不要使用條列或項目符號
-            - 請以自然段落輸出
-            - 只回傳故事文本，不要包含任何說明或標記
-            - 不要使用在行動中沒有提及的人名
-            - 如果人名（A、B、C）出現在行動結果中，請在句子中提及
-            - 如果行動結果中出現「A 詢問你」，請用一句話讓 A 提出問題
-        """)
-        self._log("【NARRATOR】", "生成敘事...")
-        response = self.call_api(prompt, temperature = 0.3)
+            return "\n你覺得自己精神有點恍惚，似乎快分不清什麼是真實的、什麼是腦中的聲響。"
+        return ""
+
+    @staticmethod
+    def _build_prompt(game_state: GameState, action_result: str) -> str:
+        """產生敘事用的 Prompt（固定的說明在前，遊戲狀態與行動結果在最後）"""
+        return NARRATOR_PROMPT.render(state = render_state(game_state), action_result = action_result)
 
+    def _finish_story(self, response: Optional[str], game_state: GameState, action_result: str) -> str:
+        """整理 LLM 回應，失敗則使用行動結果作為預設文本"""
+        sanity_suffix = self._sanity_suffix(game_state)
         if response is None:
+            TELEMETRY.inc("fallbacks_total", agent = self.NAME)
             self._log("【NARRATOR】", "生成失敗，使用預設文本。")
             return action_result + sanity_suffix
 
         self._log("【NARRATOR】", "生成成功！")
-        return response.strip() + sanity_suffix
\ No newline at end of file
+        story = response.strip()
+        if story:
+            self.cache.put(game_state, action_result, story)
+        return story + sanity_suffix
\ No newline at end of file
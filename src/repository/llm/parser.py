@@ -2,50 +2,100 @@
 Parser agent（解析玩家的自然語言）：
     1. 解析玩家指令，呼叫 LLM 後回傳 JSON
     2. 回傳預設內容
+    3. 提供 asyncio 版本的解析方法
+    4. 先以規則比對格式固定的輸入，信心不足時才呼叫 LLM
+    5. 快取 LLM 的解析結果，相同（正規化後）的輸入不再重複呼叫
+    6. 記錄解析的追蹤區段、規則比對與快取的命中、改用預設指令的次數
+    7. 分開提供本地解析與 LLM 解析，供融合模式在兩者之間插入一次融合呼叫
 """
 
 import json
-import textwrap
-from typing import Dict, Any
+from typing import Optional, Callable, Dict, Any
 
+from src.repository.llm.backends import LLMBackend
 from src.repository.llm.base_model import BaseAgent
+from src.repository.llm.batcher import RequestBatcher
+from src.repository.llm.cache import ParseCache
+from src.repository.llm.intent import IntentMatcher
+from src.repository.llm.pool import AgentPool
+from src.repository.llm.prompts import PARSER_PROMPT
+from src.repository.llm.resilience import ResiliencePolicy
+from src.repository.llm.session import AgentSession
+from src.repository.telemetry import TELEMETRY
 
 class ParserAgent(BaseAgent):
     """Parser agent，將玩家的自然語言解析為結構化指令"""
+    NAME = "parser"
+    DEADLINE = 10.0     # 每次呼叫的總期限（秒），解析應在短時間內完成，超過期限時改用預設指令
+
+    def __init__(self, api_url: str, api_key: str, logger: Optional[Callable[[str, str], None]] = None, session: Optional[AgentSession] = None, pool: Optional[AgentPool] = None, batcher: Optional[RequestBatcher] = None, policy: Optional[ResiliencePolicy] = None, backend: Optional[LLMBackend] = None, matcher: Optional[IntentMatcher] = None, cache: Optional[ParseCache] = None):
+        super().__init__(api_url, api_key, logger = logger, session = session, pool = pool, batcher = batcher, policy = policy, backend = backend)
+        self.matcher = matcher or IntentMatcher()
+        self.cache = cache or ParseCache()
+
     def parse_input(self, user_input: str) -> Dict[str, Any]:
         """解析玩家輸入，並回傳結構化指令字典"""
+        with TELEMETRY.span("parse_input"):
+            command = self.parse_local(user_input)
+            if command is not None:
+                return command
+            return self.parse_llm(user_input)
+
+    async def parse_input_async(self, user_input: str) -> Dict[str, Any]:
+        """以 asyncio 解析玩家輸入，並回傳結構化指令字典"""
+        with TELEMETRY.span("parse_input"):
+            command = self.parse_local(user_input)
+            if command is not None:
+                return command
+            return await self.parse_llm_async(user_input)
 
-        prompt = textwrap.dedent(f"""
-            你是一個遊戲指令的解析助理，負責將玩家的自然語言轉換為結構化的遊戲指令。
-
-            請根據玩家的語意，產生最合理的一個指令，並使用以下 JSON 結構之一：
-            - {{"action": "move", "target": "<地點名稱>"}}
-            - {{"action": "explore"}}
-            - {{"action": "talk", "target": "<NPC 代號或名稱>"}}
-            - {{"action": "use", "object": "<物品名稱>"}}
-            - {{"action": "choose", "choice": "<是否接受>"}}
-
-            說明：
-            - "action" 為固定的英文單字，只能使用 "move"、"explore"、"talk"、"use"、"choose" 其中之一
-            - "target"、"object" 請直接使用玩家輸入中出現的名稱或稱呼
-            - "choice" 請依照玩家的語意使用 "接受" 或 "拒絕"
-            - 不需要檢查該地點、NPC 或物品是否存在
-            - 不需要嘗試將名稱翻譯成英文或內部代碼
-
-            範例（僅供理解，不代表唯一合法值）：
-            - 「去教室」的結構化指令為 {{"action": "move", "target": "教室"}}
-            - 「跟老師說話」的結構化指令為 {{"action": "talk", "target": "老師"}}
-            - 「使用鑰匙開門」的結構化指令為 {{"action": "use", "object": "鑰匙"}}
-            - 「拒絕老師」的結構化指令為 {{"action": "choose", "choice": "拒絕"}}
-
-            玩家輸入：「{user_input}」
-
-            請只回傳 JSON 格式的指令，不要包含任何其他文字、補充說明或 Markdown 標記。
-        """)
+    def parse_llm(self, user_input: str) -> Dict[str, Any]:
+        """只以 LLM 解析玩家輸入（不經過規則比對與快取）"""
+        prompt = self._build_prompt(user_input)
         self._log("【PARSER】", "解析語句...")
         response = self.call_api(prompt, temperature = 0.3)
+        return self._cache_response(user_input, response)
+
+    async def parse_llm_async(self, user_input: str) -> Dict[str, Any]:
+        """以 asyncio 只以 LLM 解析玩家輸入（不經過規則比對與快取）"""
+        prompt = self._build_prompt(user_input)
+        self._log("【PARSER】", "解析語句...")
+        response = await self.call_api_async(prompt, temperature = 0.3)
+        return self._cache_response(user_input, response)
+
+    def parse_local(self, user_input: str) -> Optional[Dict[str, Any]]:
+        """不呼叫 LLM 的解析（規則比對、快取），失敗則回傳 None"""
+        command = self.matcher.match(user_input)
+        if command is not None:
+            TELEMETRY.inc("intent_matches_total", result = "hit")
+            self._log("【PARSER】", f"規則比對成功！\n解析結果：{command}")
+            return command
+        TELEMETRY.inc("intent_matches_total", result = "miss")
+
+        command = self.cache.get(user_input)
+        if command is not None:
+            TELEMETRY.inc("cache_hits_total", cache = "parse")
+            self._log("【PARSER】", f"快取命中！\n解析結果：{command}")
+        else:
+            TELEMETRY.inc("cache_misses_total", cache = "parse")
+        return command
+
+    def _cache_response(self, user_input: str, response: Optional[str]) -> Dict[str, Any]:
+        """解析 LLM 回應並寫入快取（呼叫失敗或解析失敗的預設指令不會寫入）"""
+        command = self._parse_response(response)
+        if response is not None:
+            self.cache.put(user_input, command)
+        return command
+
+    @staticmethod
+    def _build_prompt(user_input: str) -> str:
+        """產生解析用的 Prompt（固定的說明在前，玩家輸入在最後）"""
+        return PARSER_PROMPT.render(user_input = user_input)
 
+    def _parse_response(self, response: Optional[str]) -> Dict[str, Any]:
+        """將 LLM 回應轉換為結構化指令，失敗則回傳預設指令"""
         if response is None:
+            TELEMETRY.inc("fallbacks_total", agent = self.NAME)
             self._log("【PARSER】", "解析失敗，使用預設指令。")
             return {"action": "invalid"}
 
@@ -59,5 +109,6 @@ class ParserAgent(BaseAgent):
             return command
 
         except json.JSONDecodeError as e:
+            TELEMETRY.inc("fallbacks_total", agent = self.NAME)
             self._log("【PARSER】", f"JSON 解析失敗。\n原始回應{repr(response)}")
             return {"action": "invalid"}
\ No newline at end of file
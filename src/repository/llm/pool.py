@@ -0,0 +1,158 @@
+"""
+Agent 共用池（伺服器模式下所有遊戲共用同一組 Parser 與 Narrator）：
+    1. 限制同時進行的 LLM 呼叫數，超過時排隊等待
+    2. 依遊戲輪流分配呼叫名額，並限制單一遊戲同時進行的呼叫數，避免一個遊戲佔滿所有名額
+    3. 以 contextvars 記錄目前處理的遊戲，Agent 呼叫 LLM 時不需要額外傳入遊戲編號
+    4. 回報統計資訊（進行中、等待中、等待時間）
+"""
+
+import asyncio
+import contextvars
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Optional, Dict, Any, Deque, Tuple, AsyncIterator, Iterator
+
+# 目前處理的遊戲編號（由伺服器在處理每個請求時設定）
+CURRENT_SESSION: contextvars.ContextVar[str] = contextvars.ContextVar("current_session", default = "default")
+
+class AgentPool:
+    """限制同時進行的 LLM 呼叫數，並依遊戲輪流分配名額（只能在同一個事件迴圈中使用）"""
+    def __init__(self, max_concurrency: int = 4, max_per_session: int = 1):
+        self.max_concurrency = max_concurrency  # 同時進行的 LLM 呼叫上限
+        self.max_per_session = max_per_session  # 單一遊戲同時進行的 LLM 呼叫上限
+
+        self._waiters: Dict[str, Deque[Tuple[asyncio.Future, float]]] = {}  # 遊戲 -> 等待中的呼叫（名額、開始等待的時間）
+        self._order: Deque[str] = deque()                                   # 有呼叫在等待的遊戲（輪流分配的順序）
+        self._active: Dict[str, int] = {}                                   # 遊戲 -> 進行中的呼叫數
+        self.in_flight = 0
+
+        self.granted = 0
+        self.queued = 0
+        self.wait_time = 0.0
+        self.max_wait = 0.0
+
+    @staticmethod
+    @contextmanager
+    def bind(session_id: str) -> Iterator[None]:
+        """在區塊內將目前處理的遊戲設為 session_id"""
+        token = CURRENT_SESSION.set(session_id)
+        try:
+            yield
+        finally:
+            CURRENT_SESSION.reset(token)
+
+    def _available(self, session_id: str) -> bool:
+        """是否還有名額可以分配給該遊戲"""
+        return self.in_flight < self.max_concurrency and self._active.get(session_id, 0) < self.max_per_session
+
+    def _grant(self, session_id: str):
+        """分配名額"""
+        self.in_flight += 1
+        self._active[session_id] = self._active.get(session_id, 0) + 1
+        self.granted += 1
+
+    async def acquire(self, session_id: Optional[str] = None) -> str:
+        """取得呼叫名額，回傳名額所屬的遊戲（釋放時使用）"""
+        session_id = session_id or CURRENT_SESSION.get()
+
+        # 該遊戲沒有呼叫在排隊，且還有名額時直接分配（其他遊戲的呼叫若能分配，早已被喚醒）
+        if not self._waiters.get(session_id) and self._available(session_id):
+            self._grant(session_id)
+            return session_id
+
+        future = asyncio.get_running_loop().create_future()
+        start_time = time.perf_counter()
+        waiters = self._waiters.setdefault(session_id, deque())
+        waiters.append((future, start_time))
+        if len(waiters) == 1:
+            self._order.append(session_id)
+        self.queued += 1
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # 名額已分配但呼叫被取消，直接歸還
+                self.release(session_id)
+            else:
+                self._remove(session_id, future)
+            raise
+
+        waited = time.perf_counter() - start_time
+        self.wait_time += waited
+        self.max_wait = max(self.max_wait, waited)
+        return session_id
+
+    def _remove(self, session_id: str, future: asyncio.Future):
+        """移除被取消的等待"""
+        waiters = self._waiters.get(session_id)
+        if not waiters:
+            return
+        for i, (waiter, _) in enumerate(waiters):
+            if waiter is future:
+                del waiters[i]
+                break
+        if not waiters:
+            del self._waiters[session_id]
+            self._order.remove(session_id)
+
+    def release(self, session_id: str):
+        """歸還呼叫名額，並依序喚醒等待中的遊戲"""
+        self.in_flight -= 1
+        self._active[session_id] -= 1
+        if not self._active[session_id]:
+            del self._active[session_id]
+        self._wake()
+
+    def _wake(self):
+        """依輪流順序分配名額，每個遊戲每輪只分配一個"""
+        while self.in_flight < self.max_concurrency and self._order:
+            for _ in range(len(self._order)):
+                session_id = self._order.popleft()
+                if not self._available(session_id):
+                    self._order.append(session_id)
+                    continue
+                # 略過已被取消、但呼叫端尚未移除的等待（如回合排程取消敘事）
+                waiters = self._waiters[session_id]
+                while waiters and waiters[0][0].done():
+                    waiters.popleft()
+                if not waiters:
+                    del self._waiters[session_id]
+                    continue
+                future, _ = waiters.popleft()
+                self._grant(session_id)
+                future.set_result(None)
+                if waiters:
+                    self._order.append(session_id)
+                else:
+                    del self._waiters[session_id]
+                break
+            else:
+                # 等待中的遊戲都已達到單一遊戲的上限
+                return
+
+    @asynccontextmanager
+    async def slot(self, session_id: Optional[str] = None) -> AsyncIterator[None]:
+        """在區塊內佔用一個呼叫名額"""
+        session_id = await self.acquire(session_id)
+        try:
+            yield
+        finally:
+            self.release(session_id)
+
+    @property
+    def waiting(self) -> int:
+        """等待中的呼叫數"""
+        return sum(len(waiters) for waiters in self._waiters.values())
+
+    def stats(self) -> Dict[str, Any]:
+        """統計資訊"""
+        return {
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "granted": self.granted,
+            "queued": self.queued,
+            "average_wait": self.wait_time / self.queued if self.queued else 0.0,
+            "max_wait": self.max_wait
+        }
@@ -0,0 +1,147 @@
+"""
+Prompt 範本（Parser 與 Narrator 共用的格式與計數工具）：
+    1. 範本在載入時只建立一次，每次呼叫只填入變動的部分，不再重新 dedent 整段文字
+    2. 固定的說明放在最前面，變動的部分（玩家輸入、遊戲狀態與行動結果）放在最後，
+       固定的前綴每次都完全相同，支援前綴快取的後端（如 Ollama 保留在記憶體中的模型）可以重複使用
+    3. 估計 Prompt 的 token 數，用於量測與縮減每回合的 Prompt 大小
+    4. 融合模式的 Prompt：一次呼叫同時選出行動並生成敘事
+"""
+
+import re
+import textwrap
+from typing import Dict, Any
+
+from src.repository.core.state import GameState
+
+# 估計 token 數：中日韓文字與全形標點各為一個 token，英文單字與數字依長度計算，其他符號各為一個 token
+_TOKEN = re.compile(r"[\u3000-\u303f\u3400-\u9fff\uf900-\ufaff\uff00-\uffef]|[A-Za-z]+|\d+|\S")
+
+def count_tokens(text: str) -> int:
+    """估計文字的 token 數（沒有模型的 tokenizer，以字元種類近似）"""
+    count = 0
+    for match in _TOKEN.finditer(text):
+        token = match.group()
+        count += (len(token) + 3) // 4 if token.isascii() and token.isalnum() else 1
+    return count
+
+class PromptTemplate:
+    """固定前綴 + 變動後綴的 Prompt 範本"""
+    def __init__(self, prefix: str, suffix: str):
+        self.prefix = textwrap.dedent(prefix).strip() + "\n\n"  # 固定的前綴（每次都完全相同）
+        self.suffix = textwrap.dedent(suffix).strip() + "\n"    # 以 str.format 填入的後綴
+        self.prefix_tokens = count_tokens(self.prefix)
+
+    def render(self, **fields: Any) -> str:
+        """填入變動的部分"""
+        return self.prefix + self.suffix.format(**fields)
+
+    def stats(self, **fields: Any) -> Dict[str, int]:
+        """前綴與完整 Prompt 的 token 數"""
+        return {"prefix_tokens": self.prefix_tokens, "total_tokens": count_tokens(self.render(**fields))}
+
+PARSER_PROMPT = PromptTemplate(
+    """
+    你是一個遊戲指令的解析助理，負責將玩家的自然語言轉換為結構化的遊戲指令。
+
+    請根據玩家的語意，產生最合理的一個指令，並使用以下 JSON 結構之一：
+    - {"action": "move", "target": "<地點名稱>"}
+    - {"action": "explore"}
+    - {"action": "talk", "target": "<NPC 代號或名稱>"}
+    - {"action": "use", "object": "<物品名稱>"}
+    - {"action": "choose", "choice": "<是否接受>"}
+
+    說明：
+    - "action" 只能使用 "move"、"explore"、"talk"、"use"、"choose" 其中之一
+    - "target"、"object" 直接使用玩家輸入中的名稱或稱呼，不需要檢查是否存在，也不要翻譯
+    - "choice" 依照玩家的語意使用 "接受" 或 "拒絕"
+    - 只回傳 JSON 格式的指令，不要包含任何其他文字、說明或 Markdown 標記
+
+    範例：
+    - 「去教室」→ {"action": "move", "target": "教室"}
+    - 「跟老師說話」→ {"action": "talk", "target": "老師"}
+    - 「使用鑰匙開門」→ {"action": "use", "object": "鑰匙"}
+    - 「拒絕老師」→ {"action": "choose", "choice": "拒絕"}
+    """,
+    """
+    玩家輸入：「{user_input}」
+    """
+)
+
+# 敘事的語氣與規則（Narrator 與融合模式共用）
+NARRATION_STYLE = textwrap.dedent("""
+    請根據「玩家理智值」調整敘事語氣，生成約 100 字連貫的故事描述，但不可以提到「理智值」：
+    - 理智值為 4 ~ 5：語氣平靜、清楚，偏向客觀描述
+    - 理智值為 2 ~ 3：開始出現不安、遲疑或對環境的懷疑
+    - 理智值為 0 ~ 1：語言壓抑、扭曲，充滿恐懼或對現實感崩解的感受
+
+    敘事規則：
+    - 使用第三人稱或貼近玩家感受的敘事角度，但不要直接評論數據，比如數值的高低
+    - 以自然段落輸出，不要使用條列或項目符號
+    - 不要使用在行動中沒有提及的人名；如果人名（A、B、C）出現在行動結果中，請在句子中提及
+    - 如果行動結果中出現「A 詢問你」，請用一句話讓 A 提出問題
+""").strip()
+
+# 遊戲狀態的摘要（放在變動的部分）
+STATE_BLOCK = textwrap.dedent("""
+    遊戲狀態：
+    - 玩家：位於{location}，體力 {health} / 10，理智 {sanity} / 5
+    - NPC：A 理智 {a_sanity} / 3{a_collapsed}，B 理智 {b_sanity} / 3{b_collapsed}，C 理智 {c_sanity} / 5{c_collapsed}
+""").strip()
+
+def render_state(game_state: GameState) -> str:
+    """產生遊戲狀態的摘要（NPC 只在發生異樣時註明）"""
+    npc_a, npc_b, npc_c = game_state.npc_a, game_state.npc_b, game_state.npc_c
+    return STATE_BLOCK.format(
+        location = game_state.player_location,
+        health = game_state.player_health,
+        sanity = game_state.player_sanity,
+        a_sanity = npc_a["sanity"], a_collapsed = "（已發生異樣）" if npc_a["collapsed"] else "",
+        b_sanity = npc_b["sanity"], b_collapsed = "（已發生異樣）" if npc_b["collapsed"] else "",
+        c_sanity = npc_c["sanity"], c_collapsed = "（已發生異樣）" if npc_c["collapsed"] else ""
+    )
+
+def describe_command(command: Dict[str, Any]) -> str:
+    """以一句話描述結構化指令（融合模式的選項）"""
+    action = command.get("action")
+    if action == "move":
+        return f"前往{command.get('target')}"
+    if action == "explore":
+        return "探索周圍"
+    if action == "talk":
+        return f"和 {command.get('target')} 交談"
+    if action == "use":
+        return f"使用{command.get('object')}"
+    if action == "choose":
+        return f"{command.get('choice')} A 的請求"
+    return "其他行動"
+
+NARRATOR_PROMPT = PromptTemplate(
+    "你是一個遊戲文本的生成助理，負責根據遊戲狀態與行動結果，使用繁體中文撰寫合理且一致的故事描述。\n\n"
+    + NARRATION_STYLE + "\n- 只回傳故事文本，不要包含任何說明或標記",
+    """
+    {state}
+
+    玩家行動的結果：
+    {action_result}
+    """
+)
+
+# 融合模式：一次呼叫同時選出行動（解析）並生成敘事，可能的行動與結果已由遊戲引擎算出
+FUSED_PROMPT = PromptTemplate(
+    "你是一個文字冒險遊戲的解析與敘事助理。遊戲規則已經算出玩家各種可能行動的結果，請：\n"
+    "1. 根據玩家輸入的語意，從「可能的行動」中選出最符合的一個\n"
+    "2. 根據該行動的結果，使用繁體中文撰寫故事描述\n\n"
+    "輸出格式（第一行為選項編號，接著為故事文本，不要包含任何其他說明或標記）：\n"
+    "選項：<編號>\n"
+    "<故事文本>\n\n"
+    "如果沒有任何行動符合玩家輸入，只輸出「選項：0」。\n\n"
+    + NARRATION_STYLE,
+    """
+    {state}
+
+    可能的行動：
+    {options}
+
+    玩家輸入：「{user_input}」
+    """
+)
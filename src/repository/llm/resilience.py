@@ -0,0 +1,286 @@
+"""
+LLM 呼叫的容錯策略（由 BaseAgent 使用，Parser 與 Narrator 可設定不同的期限）：
+    1. 每次呼叫有總期限（包含重試），不會因為後端卡住而讓玩家等待過久
+    2. 失敗時有限次數地重試，等待時間以指數成長並加入隨機抖動，避免同時重試
+    3. 對沖請求：等待時間超過近期延遲的百分位數時，再送出一個相同的請求，採用先完成的結果
+    4. 斷路器：連續失敗達到門檻後暫停呼叫 LLM，經過冷卻時間後只放行一個試探請求
+    5. 提供同步（執行緒）與 asyncio 兩種版本，放棄的請求（超過期限、對沖落敗）會停止讀取並關閉連線
+"""
+
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from typing import Optional, Callable, Awaitable, Dict, Any, List, TypeVar
+
+from src.repository.llm.session import http_errors
+
+T = TypeVar("T")
+
+class CircuitOpenError(Exception):
+    """斷路器開啟中，不呼叫 LLM"""
+
+class CircuitBreaker:
+    """斷路器（同一個後端的 Agent 共用）"""
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold  # 連續失敗幾次後開啟
+        self.reset_timeout = reset_timeout          # 開啟後多少秒放行試探請求
+
+        self._lock = threading.Lock()
+        self.state = self.CLOSED
+        self.failures = 0           # 連續失敗次數
+        self.opened_at = 0.0
+        self._probing = False       # 半開狀態下是否已放行試探請求
+        self.rejected = 0
+        self.trips = 0
+
+    def allow(self) -> bool:
+        """是否可以呼叫 LLM（半開狀態只放行一個試探請求）"""
+        with self._lock:
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._probing = False
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        """呼叫成功，關閉斷路器"""
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        """呼叫失敗，達到門檻（或試探失敗）時開啟斷路器"""
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or (self.state == self.CLOSED and self.failures >= self.failure_threshold):
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+                self._probing = False
+                self.trips += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """統計資訊"""
+        return {"state": self.state, "failures": self.failures, "trips": self.trips, "rejected": self.rejected}
+
+class ResiliencePolicy:
+    """LLM 呼叫的容錯策略（期限、重試、對沖、斷路器）"""
+    _executor: Optional[ThreadPoolExecutor] = None  # 同步版本共用的執行緒池
+    _executor_lock = threading.Lock()
+
+    def __init__(self, deadline: float = 60.0, connect_timeout: float = 10.0, retries: int = 2, backoff: float = 0.2, max_backoff: float = 2.0, hedge_percentile: Optional[float] = 0.95, hedge_min_samples: int = 20, hedge_budget: float = 0.1, breaker: Optional[CircuitBreaker] = None):
+        self.deadline = deadline                    # 每次呼叫的總期限（秒，包含重試與等待）
+        self.connect_timeout = connect_timeout      # 建立連線的期限（秒）
+        self.retries = retries                      # 失敗後最多重試的次數
+        self.backoff = backoff                      # 第一次重試前的等待秒數（之後每次加倍）
+        self.max_backoff = max_backoff              # 重試前等待秒數的上限
+        self.hedge_percentile = hedge_percentile    # 超過近期延遲的該百分位數時送出對沖請求，None 代表不對沖
+        self.hedge_min_samples = hedge_min_samples  # 至少累積多少次延遲後才開始對沖
+        self.hedge_budget = hedge_budget            # 對沖請求佔所有請求的比例上限
+        self.breaker = breaker or CircuitBreaker()
+
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen = 200)   # 近期成功請求的延遲
+        self.calls = 0
+        self.attempts = 0
+        self.retried = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.timeouts = 0
+        self.failures = 0
+
+    # ─── 共用 ───
+
+    def timeout(self, remaining: float) -> tuple:
+        """單次請求的（連線、讀取）期限"""
+        return min(self.connect_timeout, remaining), remaining
+
+    def hedge_delay(self) -> Optional[float]:
+        """送出對沖請求前的等待秒數，不需要對沖時回傳 None"""
+        if self.hedge_percentile is None:
+            return None
+        with self._lock:
+            if len(self._latencies) < self.hedge_min_samples or self.hedged >= self.hedge_budget * max(self.attempts, 1):
+                return None
+            latencies = sorted(self._latencies)
+        return latencies[min(int(len(latencies) * self.hedge_percentile), len(latencies) - 1)]
+
+    def _record_latency(self, latency: float):
+        """記錄成功請求的延遲"""
+        with self._lock:
+            self._latencies.append(latency)
+
+    def _backoff(self, attempt: int) -> float:
+        """第 attempt 次重試前的等待秒數（加入隨機抖動）"""
+        return min(self.max_backoff, self.backoff * (2 ** attempt)) * random.uniform(0.5, 1.5)
+
+    @staticmethod
+    def retryable(e: BaseException) -> bool:
+        """是否值得重試（逾時、連線錯誤、伺服器錯誤與 429）"""
+        if isinstance(e, http_errors("HTTPError", "HTTPStatusError")):
+            status = e.response.status_code if e.response is not None else 500
+            return status >= 500 or status == 429
+        return isinstance(e, (TimeoutError, ConnectionError, ValueError) + http_errors("RequestException", "TransportError"))
+
+    def _admit(self):
+        """呼叫前檢查斷路器"""
+        if not self.breaker.allow():
+            raise CircuitOpenError("LLM 後端異常，暫時停止呼叫。")
+
+    def _failed(self, e: BaseException, attempt: int, end: float) -> float:
+        """記錄失敗，回傳重試前的等待秒數（不重試時直接拋出）"""
+        self.breaker.record_failure()
+        if isinstance(e, (TimeoutError,) + http_errors("Timeout", "TimeoutException")):
+            self.timeouts += 1
+        delay = self._backoff(attempt)
+        if attempt >= self.retries or not self.retryable(e) or time.monotonic() + delay >= end:
+            self.failures += 1
+            raise e
+        self.retried += 1
+        return delay
+
+    # ─── 同步版本 ───
+
+    @classmethod
+    def _pool(cls) -> ThreadPoolExecutor:
+        """取得共用的執行緒池"""
+        with cls._executor_lock:
+            if cls._executor is None:
+                cls._executor = ThreadPoolExecutor(max_workers = 32, thread_name_prefix = "resilience")
+            return cls._executor
+
+    def run(self, request: Callable[[tuple, threading.Event], T]) -> T:
+        """以容錯策略執行請求，超過總期限時拋出 TimeoutError
+        request 的參數為單次請求的期限與取消事件（放棄該請求時設定，request 應停止讀取並關閉連線）"""
+        self.calls += 1
+        end = time.monotonic() + self.deadline
+        attempt = 0
+        while True:
+            self._admit()
+            try:
+                return self._attempt(request, end)
+            except CircuitOpenError:
+                raise
+            except Exception as e:
+                delay = self._failed(e, attempt, end)
+            time.sleep(delay)
+            attempt += 1
+
+    def _attempt(self, request: Callable[[tuple, threading.Event], T], end: float) -> T:
+        """送出一次請求，超過對沖門檻時再送出一個，採用先成功的結果，結束時取消其他請求"""
+        start_time = time.monotonic()
+        self.attempts += 1
+        executor = self._pool()
+        cancel = threading.Event()  # 結束時設定，未完成的請求不再佔用執行緒池與後端
+        primary = executor.submit(request, self.timeout(end - start_time), cancel)
+        futures: List[Future] = [primary]
+        hedge_delay = self.hedge_delay()
+        error = None
+        try:
+            while futures:
+                remaining = end - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError("LLM 呼叫超過期限。")
+                can_hedge = hedge_delay is not None and self.hedged < self.hedge_budget * self.attempts
+                done, _ = wait(futures, timeout = min(remaining, hedge_delay) if can_hedge else remaining, return_when = FIRST_COMPLETED)
+                if not done:
+                    if can_hedge:
+                        # 目前的請求比近期大多數請求慢，再送出一個相同的請求
+                        self.hedged += 1
+                        futures.append(executor.submit(request, self.timeout(end - time.monotonic()), cancel))
+                        hedge_delay = None
+                    continue
+                for future in done:
+                    futures.remove(future)
+                    if future.exception() is None:
+                        if future is not primary:
+                            self.hedge_wins += 1
+                        self._record_latency(time.monotonic() - start_time)
+                        self.breaker.record_success()
+                        return future.result()
+                    error = error or future.exception()
+                if futures:
+                    hedge_delay = None
+            raise error
+        finally:
+            cancel.set()
+
+    # ─── asyncio 版本 ───
+
+    async def run_async(self, request: Callable[[tuple], Awaitable[T]]) -> T:
+        """以 asyncio 及容錯策略執行請求，超過總期限時拋出 TimeoutError（未完成的請求會被取消）"""
+        self.calls += 1
+        end = time.monotonic() + self.deadline
+        attempt = 0
+        while True:
+            self._admit()
+            try:
+                return await self._attempt_async(request, end)
+            except CircuitOpenError:
+                raise
+            except Exception as e:
+                delay = self._failed(e, attempt, end)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def _attempt_async(self, request: Callable[[tuple], Awaitable[T]], end: float) -> T:
+        """以 asyncio 送出一次請求（可能對沖），結束時取消其他請求"""
+        start_time = time.monotonic()
+        self.attempts += 1
+        primary = asyncio.ensure_future(request(self.timeout(end - start_time)))
+        tasks = [primary]
+        hedge_delay = self.hedge_delay()
+        error = None
+        try:
+            while tasks:
+                remaining = end - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError("LLM 呼叫超過期限。")
+                can_hedge = hedge_delay is not None and self.hedged < self.hedge_budget * self.attempts
+                done, _ = await asyncio.wait(tasks, timeout = min(remaining, hedge_delay) if can_hedge else remaining, return_when = asyncio.FIRST_COMPLETED)
+                if not done:
+                    if can_hedge:
+                        self.hedged += 1
+                        tasks.append(asyncio.ensure_future(request(self.timeout(end - time.monotonic()))))
+                        hedge_delay = None
+                    continue
+                for task in done:
+                    tasks.remove(task)
+                    if task.exception() is None:
+                        if task is not primary:
+                            self.hedge_wins += 1
+                        self._record_latency(time.monotonic() - start_time)
+                        self.breaker.record_success()
+                        return task.result()
+                    error = error or task.exception()
+                hedge_delay = None
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        """統計資訊"""
+        return {
+            "deadline": self.deadline,
+            "calls": self.calls,
+            "attempts": self.attempts,
+            "retried": self.retried,
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "timeouts": self.timeouts,
+            "failures": self.failures,
+            "breaker": self.breaker.stats()
+        }
@@ -0,0 +1,133 @@
+"""
+HTTP 連線池（由 GameAssemble 持有，Parser 與 Narrator 共用）：
+    1. 重複使用 TCP / TLS 連線（keep-alive），避免每次呼叫 LLM 都重新握手
+    2. 設定連線池大小與每個主機的連線上限
+    3. 提供 asyncio 版本的連線池（httpx），讓單一事件迴圈同時服務多個遊戲
+    4. 關閉連線池，釋放 Socket
+    5. 延遲載入 requests 與 httpx（第一次發送請求時才載入），只使用其中一種或模擬後端時不需要載入另一個套件
+"""
+
+import asyncio
+import sys
+import threading
+import weakref
+from typing import Tuple, List
+
+def http_errors(requests_error: str, httpx_error: str) -> Tuple[type, ...]:
+    """requests.exceptions 與 httpx 中指定名稱的例外（只包含已載入的套件，尚未載入的套件不會拋出例外）"""
+    errors = []
+    requests = sys.modules.get("requests")
+    if requests is not None:
+        errors.append(getattr(requests.exceptions, requests_error))
+    httpx = sys.modules.get("httpx")
+    if httpx is not None:
+        errors.append(getattr(httpx, httpx_error))
+    return tuple(errors)
+
+def _close_sessions(sessions: List):
+    """關閉已建立的 requests 連線池"""
+    for session in sessions:
+        session.close()
+    sessions.clear()
+
+class AgentSession:
+    """Agent 共用的 HTTP 連線池"""
+    def __init__(self, pool_connections: int = 4, pool_maxsize: int = 8, pool_block: bool = False, keep_alive: bool = True):
+        self.pool_connections = pool_connections    # 快取的主機連線池數量
+        self.pool_maxsize = pool_maxsize            # 每個主機最多保留的連線數
+        self.pool_block = pool_block                # 達到上限時是否等待連線釋放（否則建立不保留的暫時連線）
+        self.keep_alive = keep_alive                # 是否保留連線供下次使用
+
+        # requests 連線池：第一次發送請求時才建立
+        self._session = None
+        self._sessions = []
+        self._lock = threading.Lock()
+
+        # 物件被回收或程式結束時，確保連線會被關閉
+        self._finalizer = weakref.finalize(self, _close_sessions, self._sessions)
+
+        # asyncio 連線池：綁定第一次使用時的事件迴圈，延遲建立
+        self._async_client = None
+        self._async_loop = None
+
+    @property
+    def closed(self) -> bool:
+        """連線池是否已關閉"""
+        return not self._finalizer.alive
+
+    def post(self, url: str, **kwargs) -> "requests.Response":
+        """透過連線池發送 POST 請求"""
+        if self.closed:
+            raise RuntimeError("連線池已關閉。")
+        if self._session is None:
+            self._create_session()
+        return self._session.post(url, **kwargs)
+
+    def _create_session(self):
+        """建立 requests 連線池"""
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        with self._lock:
+            if self._session is not None:
+                return
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections = self.pool_connections, pool_maxsize = self.pool_maxsize, pool_block = self.pool_block)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            if not self.keep_alive:
+                session.headers["Connection"] = "close"
+            self._sessions.append(session)
+            self._session = session
+
+    def async_client(self) -> "httpx.AsyncClient":
+        """取得目前事件迴圈的 asyncio 連線池"""
+        if self.closed:
+            raise RuntimeError("連線池已關閉。")
+        loop = asyncio.get_running_loop()
+        if self._async_client is None or self._async_loop is not loop:
+            # httpx 的連線無法跨事件迴圈使用，換迴圈時重新建立
+            import httpx
+
+            self._discard_async_client()
+            limits = httpx.Limits(
+                max_connections = self.pool_maxsize if self.pool_block else None,
+                max_keepalive_connections = self.pool_maxsize if self.keep_alive else 0,
+            )
+            self._async_client = httpx.AsyncClient(limits = limits)
+            self._async_loop = loop
+        return self._async_client
+
+    def _discard_async_client(self):
+        """關閉 asyncio 連線池（若其事件迴圈仍存在）"""
+        client, loop = self._async_client, self._async_loop
+        self._async_client = None
+        self._async_loop = None
+        if client is not None and not loop.is_closed():
+            asyncio.run_coroutine_threadsafe(client.aclose(), loop)
+
+    def close(self):
+        """關閉連線池（可重複呼叫）"""
+        self._finalizer()
+        self._discard_async_client()
+
+    async def aclose(self):
+        """在事件迴圈中關閉連線池（可重複呼叫）"""
+        self._finalizer()
+        client = self._async_client
+        self._async_client = None
+        self._async_loop = None
+        if client is not None:
+            await client.aclose()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.aclose()
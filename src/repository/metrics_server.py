@@ -0,0 +1,53 @@
+"""
+本機的 Prometheus 端點（由 Telemetry.serve_metrics 啟動時才載入）：
+    1. 於背景執行緒提供 /metrics，回傳 Prometheus 文字格式
+    2. 不輸出存取日誌
+"""
+
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    """/metrics 的請求處理"""
+    server: "MetricsServer"
+
+    def log_message(self, format, *args):
+        """不輸出存取日誌"""
+
+    def do_GET(self):
+        """回傳 Prometheus 文字格式"""
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body = self.server.telemetry.render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+class MetricsServer(ThreadingHTTPServer):
+    """本機的 Prometheus 端點"""
+    daemon_threads = True
+
+    def __init__(self, telemetry: "Telemetry", host: str = "127.0.0.1", port: int = 9100):
+        super().__init__((host, port), _MetricsHandler)
+        self.telemetry = telemetry
+
+    @property
+    def url(self) -> str:
+        """端點網址"""
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/metrics"
+
+    def start(self) -> "MetricsServer":
+        """在背景執行緒中啟動"""
+        threading.Thread(target = self.serve_forever, name = "metrics", daemon = True).start()
+        return self
+
+    def stop(self):
+        """停止伺服器"""
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,222 @@
+"""
+回合排程（每場遊戲一個，由 GameAssemble 使用）：
+    1. 同一場遊戲的解析與執行指令依序進行，不會同時修改遊戲狀態
+    2. 回合進行中送出的行動依策略處理：coalesce 只保留最新的等待中行動（較舊的直接略過），reject 直接拒絕
+    3. 執行指令後即讓出排程，下一個行動不需要等待敘事完成；下一個行動被接受（或復原、重置、讀檔）時，取消尚未完成的敘事
+    4. 提供同步（執行緒）與 asyncio 兩種版本
+    5. 回報統計資訊（等待中的行動數、等待時間、略過、拒絕與取消的次數）
+"""
+
+import asyncio
+import threading
+import time
+from collections import deque
+from typing import Optional, Callable, Dict, Any, Deque, List
+
+from src.repository.telemetry import TELEMETRY
+
+POLICIES = ("coalesce", "reject")
+
+class TurnTicket:
+    """一個送出的行動（排程的單位）"""
+    def __init__(self, user_input: str):
+        self.user_input = user_input
+        self.submitted = time.monotonic()
+        self.superseded = False                 # 被較新的行動取代，不會執行
+        self.cancelled = threading.Event()      # 敘事已取消（玩家送出了下一個行動）
+        self._wake: Optional[Callable[[], None]] = None
+        self._on_cancel: List[Callable[[], None]] = []
+
+    def on_cancel(self, callback: Callable[[], None]):
+        """註冊取消敘事時執行的動作（如關閉串流讓後端停止生成），已取消時立即執行"""
+        if self.cancelled.is_set():
+            self._run(callback)
+        else:
+            self._on_cancel.append(callback)
+
+    def cancel(self):
+        """取消敘事"""
+        self.cancelled.set()
+        callbacks, self._on_cancel = self._on_cancel, []
+        for callback in callbacks:
+            self._run(callback)
+
+    @staticmethod
+    def _run(callback: Callable[[], None]):
+        """執行取消的動作（串流正在其他執行緒讀取時無法關閉，由讀取端檢查旗標後停止）"""
+        try:
+            callback()
+        except (ValueError, RuntimeError):
+            pass
+
+class TurnScheduler:
+    """單一遊戲的回合排程"""
+    def __init__(self, policy: str = "coalesce", max_pending: int = 1):
+        if policy not in POLICIES:
+            raise ValueError(f"不支援的排程策略：{policy}")
+        self.policy = policy            # 回合進行中送出行動時的處理方式
+        self.max_pending = max_pending  # coalesce 時最多保留的等待中行動數
+
+        self._lock = threading.RLock()  # 取消敘事時關閉串流，串流結束的處理可能在同一個執行緒中再次呼叫 release()
+        self._active: Optional[TurnTicket] = None       # 正在解析、執行指令的行動
+        self._narrating: Optional[TurnTicket] = None    # 已執行指令、正在生成敘事的行動
+        self._queue: Deque[TurnTicket] = deque()
+
+        self.submitted = 0
+        self.started = 0
+        self.coalesced = 0
+        self.rejected = 0
+        self.cancelled = 0
+        self.max_depth = 0
+        self.wait_time = 0.0
+        self.max_wait = 0.0
+
+    @property
+    def busy(self) -> bool:
+        """是否有行動正在執行或等待"""
+        return self._active is not None or bool(self._queue)
+
+    def depth(self) -> int:
+        """等待中的行動數"""
+        return len(self._queue)
+
+    def _submit(self, ticket: TurnTicket, wake: Callable[[], None]) -> Optional[bool]:
+        """送出行動（呼叫端需持有鎖）：回傳 True 代表立即開始，False 代表被拒絕，None 代表需要等待"""
+        self.submitted += 1
+        if self._active is None and not self._queue:
+            self._cancel_narration()
+            self._start(ticket)
+            return True
+        if self.policy == "reject":
+            # 被拒絕的行動不會取消進行中的敘事
+            self.rejected += 1
+            TELEMETRY.inc("turns_skipped_total", reason = "rejected")
+            return False
+
+        # 只保留最新的等待中行動，較舊的行動被取代（喚醒後回傳略過的結果）
+        self._cancel_narration()
+        while len(self._queue) >= self.max_pending:
+            old = self._queue.popleft()
+            old.superseded = True
+            self.coalesced += 1
+            TELEMETRY.inc("turns_skipped_total", reason = "coalesced")
+            old._wake()
+        ticket._wake = wake
+        self._queue.append(ticket)
+        self.max_depth = max(self.max_depth, len(self._queue))
+        return None
+
+    def _start(self, ticket: TurnTicket):
+        """開始執行行動（呼叫端需持有鎖）"""
+        wait = time.monotonic() - ticket.submitted
+        self._active = ticket
+        self.started += 1
+        self.wait_time += wait
+        self.max_wait = max(self.max_wait, wait)
+        TELEMETRY.observe("turn_queue_wait_seconds", wait)
+
+    def _next(self):
+        """讓出排程，喚醒下一個等待中的行動（呼叫端需持有鎖）"""
+        self._active = None
+        if self._queue:
+            ticket = self._queue.popleft()
+            self._start(ticket)
+            ticket._wake()
+
+    def _cancel_narration(self):
+        """取消尚未完成的敘事（呼叫端需持有鎖）"""
+        if self._narrating is not None:
+            self._narrating.cancel()
+            self._narrating = None
+            self.cancelled += 1
+            TELEMETRY.inc("narrations_cancelled_total")
+
+    # ─── 同步版本 ───
+
+    def acquire(self, user_input: str) -> Optional[TurnTicket]:
+        """送出行動並等待輪到它執行，被拒絕或被較新的行動取代時回傳 None"""
+        ticket = TurnTicket(user_input)
+        ready = threading.Event()
+        with self._lock:
+            started = self._submit(ticket, ready.set)
+        if started is None:
+            ready.wait()
+            started = not ticket.superseded
+        return ticket if started else None
+
+    def try_acquire(self) -> Optional[TurnTicket]:
+        """不等待的版本（用於復原），有行動正在執行或等待時回傳 None"""
+        with self._lock:
+            if self.busy:
+                return None
+            self._cancel_narration()
+            self._active = TurnTicket("")
+            return self._active
+
+    def narrate(self, ticket: TurnTicket):
+        """指令已執行，讓出排程給下一個行動，之後的敘事可以被取消"""
+        with self._lock:
+            if self._active is ticket:
+                self._narrating = ticket
+                self._next()
+
+    def release(self, ticket: TurnTicket):
+        """回合結束（未呼叫 narrate() 時同時讓出排程）"""
+        with self._lock:
+            if self._narrating is ticket:
+                self._narrating = None
+            if self._active is ticket:
+                self._next()
+
+    def cancel(self):
+        """取消尚未完成的敘事與所有等待中的行動（重置、讀檔或關閉遊戲時）"""
+        with self._lock:
+            self._cancel_narration()
+            while self._queue:
+                ticket = self._queue.popleft()
+                ticket.superseded = True
+                self.coalesced += 1
+                ticket._wake()
+
+    # ─── asyncio 版本 ───
+
+    async def acquire_async(self, user_input: str) -> Optional[TurnTicket]:
+        """以 asyncio 等待輪到行動執行，被拒絕或被較新的行動取代時回傳 None"""
+        loop = asyncio.get_running_loop()
+        ready = loop.create_future()
+
+        def wake():
+            loop.call_soon_threadsafe(lambda: ready.done() or ready.set_result(None))
+
+        ticket = TurnTicket(user_input)
+        with self._lock:
+            started = self._submit(ticket, wake)
+        if started is None:
+            try:
+                await ready
+            except asyncio.CancelledError:
+                # 等待時被取消（如連線中斷）：移出佇列，已輪到時讓出排程
+                with self._lock:
+                    if ticket in self._queue:
+                        self._queue.remove(ticket)
+                    elif self._active is ticket:
+                        self._next()
+                raise
+            started = not ticket.superseded
+        return ticket if started else None
+
+    def stats(self) -> Dict[str, Any]:
+        """排程統計"""
+        return {
+            "policy": self.policy,
+            "in_flight": self._active is not None,
+            "depth": len(self._queue),
+            "max_depth": self.max_depth,
+            "submitted": self.submitted,
+            "started": self.started,
+            "coalesced": self.coalesced,
+            "rejected": self.rejected,
+            "cancelled_narrations": self.cancelled,
+            "average_wait": self.wait_time / self.started if self.started else 0.0,
+            "max_wait": self.max_wait
+        }
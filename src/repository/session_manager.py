@@ -0,0 +1,287 @@
+"""
+多遊戲管理（伺服器模式，在同一個程序中進行多場遊戲）：
+    1. 建立、取得、刪除遊戲，所有遊戲共用同一組 Parser、Narrator 與連線池
+    2. 所有 LLM 呼叫經過共用的 Agent 池，依遊戲輪流分配呼叫名額，並可經過共用的批次處理合併相同的請求
+    3. 同一場遊戲的回合經過該遊戲的回合排程（依序執行指令，進行中送出的行動合併或拒絕），不同遊戲的回合可以同時進行
+    4. 將閒置的遊戲壓縮後移出記憶體（保存到資料夾或保留二進位的存檔紀錄），再次使用時自動還原
+    5. 可啟用融合模式，所有遊戲共用同一個 FusedAgent
+    6. 將所有遊戲寫入同一個存檔，並可由存檔（以 mmap 開啟）載入大量的遊戲，使用時才還原
+    7. 所有遊戲共用同一個回合日誌，以遊戲編號區分
+"""
+
+import asyncio
+import os
+import re
+import time
+import uuid
+from typing import Optional, Callable, Dict, Any, List
+
+from src.repository.core.savefile import SaveFile, write_savefile
+from src.repository.fused import FusedAgent
+from src.repository.game_assemble import GameAssemble
+from src.repository.journal import TurnJournal
+from src.repository.llm.backends import LLMBackend, create_backend
+from src.repository.llm.batcher import RequestBatcher
+from src.repository.llm.cache import ParseCache, NarrationCache
+from src.repository.llm.narrator import NarratorAgent
+from src.repository.llm.parser import ParserAgent
+from src.repository.llm.pool import AgentPool
+from src.repository.llm.resilience import ResiliencePolicy, CircuitBreaker
+from src.repository.llm.session import AgentSession
+
+# 遊戲編號的格式（同時作為檔名，避免路徑穿越）
+SESSION_ID = re.compile(r"[0-9a-f]{32}")
+
+class GameSession:
+    """伺服器中的一場遊戲"""
+    def __init__(self, session_id: str, game: GameAssemble):
+        self.session_id = session_id
+        self.game = game                        # 同一場遊戲的回合由 game.scheduler 排程
+        self.last_active = time.monotonic()     # 最後一次處理回合的時間
+        self.turns = 0
+
+class SessionManager:
+    """管理多場遊戲，並共用 Agent 與連線池"""
+    def __init__(self, api_url: str, api_key: str, pool: Optional[AgentPool] = None, batcher: Optional[RequestBatcher] = None, parser_policy: Optional[ResiliencePolicy] = None, narrator_policy: Optional[ResiliencePolicy] = None, backend: Optional[LLMBackend] = None, directory: Optional[str] = None, max_idle: float = 600.0, max_sessions: Optional[int] = None, logger: Optional[Callable[[str, str], None]] = None, parse_cache: Optional[ParseCache] = None, narration_cache: Optional[NarrationCache] = None, fused: bool = False, journal: Optional[TurnJournal] = None, turn_policy: str = "coalesce", max_pending: int = 1):
+        self.api_url = api_url
+        self.api_key = api_key
+        self.logger = logger or self._default_logger
+        self.journal = journal              # 共用的回合日誌（由建立者負責關閉）
+        self.turn_policy = turn_policy      # 每場遊戲的回合排程策略（coalesce 或 reject）
+        self.max_pending = max_pending      # 每場遊戲最多等待中的行動數
+        self.directory = directory          # 閒置遊戲的保存資料夾，None 代表保留在記憶體中（只保留壓縮後的整數）
+        self.max_idle = max_idle            # 閒置多少秒後移出記憶體
+        self.max_sessions = max_sessions    # 記憶體中最多保留的遊戲數，None 代表不限制
+        if directory is not None:
+            os.makedirs(directory, exist_ok = True)
+
+        # 共用的 Agent 池、連線池與 Agent（連線數至少要能容納同時進行的呼叫）
+        self.pool = pool or AgentPool()
+        self.batcher = batcher  # None 代表不經過批次處理
+        self.session = AgentSession(pool_maxsize = max(8, self.pool.max_concurrency))
+        breaker = CircuitBreaker()
+        parser_policy = parser_policy or ResiliencePolicy(deadline = ParserAgent.DEADLINE, breaker = breaker)
+        narrator_policy = narrator_policy or ResiliencePolicy(deadline = NarratorAgent.DEADLINE, breaker = breaker)
+        self.backend = backend or create_backend(api_url, api_key)
+        self.parser = ParserAgent(api_url, api_key, logger = self.logger, session = self.session, pool = self.pool, batcher = batcher, policy = parser_policy, backend = self.backend, cache = parse_cache)
+        self.narrator = NarratorAgent(api_url, api_key, logger = self.logger, session = self.session, pool = self.pool, batcher = batcher, policy = narrator_policy, backend = self.backend, cache = narration_cache)
+        self.fused = FusedAgent(api_url, api_key, logger = self.logger, session = self.session, pool = self.pool, batcher = batcher, policy = ResiliencePolicy(deadline = FusedAgent.DEADLINE, breaker = breaker), backend = self.backend) if fused else None
+
+        self._sessions: Dict[str, GameSession] = {}
+        self._evicted: Dict[str, bytes] = {}    # 遊戲編號 -> 存檔紀錄（未指定資料夾時使用）
+        self.savefile: Optional[SaveFile] = None    # 載入的存檔，其中的遊戲在使用時才還原
+        self._taken = set()                         # 存檔中已還原或刪除的遊戲
+        self.created = 0
+        self.evictions = 0
+        self.restores = 0
+
+    def _default_logger(self, level: str, message: str):
+        """預設日誌"""
+        print(f"{level}　{message}")
+
+    def _new_game(self, session_id: str) -> GameAssemble:
+        """建立使用共用 Agent 的遊戲（不啟用推測執行，避免背景呼叫佔用共用的名額）"""
+        return GameAssemble(self.api_url, self.api_key, logger = self.logger, parser = self.parser, narrator = self.narrator, fused_agent = self.fused, journal = self.journal, journal_id = session_id, turn_policy = self.turn_policy, max_pending = self.max_pending)
+
+    def create(self) -> GameSession:
+        """建立新的遊戲"""
+        if self.max_sessions is not None and len(self._sessions) >= self.max_sessions:
+            self._evict_oldest()
+        session_id = uuid.uuid4().hex
+        session = GameSession(session_id, self._new_game(session_id))
+        self._sessions[session.session_id] = session
+        self.created += 1
+        self.logger("【SERVER】", f"建立遊戲：{session.session_id}")
+        return session
+
+    def get(self, session_id: str) -> GameSession:
+        """取得遊戲，已移出記憶體的遊戲會自動還原（不存在時拋出 KeyError）"""
+        session = self._sessions.get(session_id)
+        if session is not None:
+            return session
+        payload = self._load(session_id)
+        if payload is None:
+            raise KeyError(session_id)
+
+        game = self._new_game(session_id)
+        record = game.load(payload)
+        session = GameSession(session_id, game)
+        session.turns = record.turns
+        self._sessions[session_id] = session
+        self.restores += 1
+        self.logger("【SERVER】", f"還原遊戲：{session_id}")
+        return session
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._sessions or self._load(session_id, remove = False) is not None
+
+    async def process(self, session_id: str, user_input: str) -> Dict[str, Any]:
+        """處理玩家輸入（經過遊戲的回合排程，LLM 呼叫依遊戲輪流分配名額）"""
+        session = self.get(session_id)
+        with AgentPool.bind(session_id):
+            turn = await session.game.process_input_async(user_input)
+        session.last_active = time.monotonic()
+        if not turn.get("skipped"):
+            session.turns += 1
+        return turn
+
+    async def undo(self, session_id: str) -> bool:
+        """復原上一回合（回合正在執行指令時回傳 False），成功時回合數減一"""
+        session = self.get(session_id)
+        session.last_active = time.monotonic()
+        if not session.game.undo():
+            return False
+        session.turns -= 1
+        return True
+
+    def delete(self, session_id: str) -> bool:
+        """刪除遊戲（取消進行中的回合與推測），不存在時回傳 False"""
+        session = self._sessions.pop(session_id, None)
+        if session is not None:
+            session.game.close()
+        removed = self._load(session_id) is not None
+        return session is not None or removed
+
+    # ─── 移出記憶體 ───
+
+    def _path(self, session_id: str) -> str:
+        """保存檔的路徑"""
+        return os.path.join(self.directory, f"{session_id}.sav")
+
+    def _load(self, session_id: str, remove: bool = True) -> Optional[bytes]:
+        """取得已移出記憶體的遊戲內容（remove 為 True 時同時刪除保存的內容），不存在時回傳 None"""
+        if not SESSION_ID.fullmatch(session_id):
+            return None
+        if self.directory is None:
+            payload = self._evicted.pop(session_id, None) if remove else self._evicted.get(session_id)
+        else:
+            path = self._path(session_id)
+            try:
+                with open(path, "rb") as f:
+                    payload = f.read()
+                if remove:
+                    os.remove(path)
+            except FileNotFoundError:
+                payload = None
+
+        # 存檔中的內容比移出記憶體的內容舊，只在沒有其他內容時使用，但刪除時一併標記
+        if self.savefile is not None and session_id in self.savefile and session_id not in self._taken:
+            if payload is None:
+                with self.savefile.read(session_id) as data:
+                    payload = bytes(data)
+            if remove:
+                self._taken.add(session_id)
+        return payload
+
+    def evict(self, session_id: str) -> bool:
+        """將遊戲移出記憶體（正在處理回合的遊戲不會移出）"""
+        session = self._sessions.get(session_id)
+        if session is None or session.game.scheduler.busy:
+            return False
+
+        payload = session.game.save(turns = session.turns)
+        if self.directory is None:
+            self._evicted[session_id] = payload
+        else:
+            # 先寫入暫存檔再取代，避免程序中斷時留下不完整的檔案
+            path = self._path(session_id)
+            with open(path + ".tmp", "wb") as f:
+                f.write(payload)
+            os.replace(path + ".tmp", path)
+
+        del self._sessions[session_id]
+        self.evictions += 1
+        self.logger("【SERVER】", f"移出閒置的遊戲：{session_id}")
+        return True
+
+    def _evict_oldest(self):
+        """移出最久沒有使用的遊戲"""
+        for session in sorted(self._sessions.values(), key = lambda session: session.last_active):
+            if self.evict(session.session_id):
+                return
+
+    def evict_idle(self, now: Optional[float] = None) -> List[str]:
+        """移出所有閒置超過 max_idle 秒的遊戲，回傳移出的遊戲編號"""
+        now = time.monotonic() if now is None else now
+        idle = [session_id for session_id, session in self._sessions.items() if now - session.last_active >= self.max_idle]
+        return [session_id for session_id in idle if self.evict(session_id)]
+
+    # ─── 存檔 ───
+
+    def open_savefile(self, path: str) -> int:
+        """載入存檔（只讀取索引，遊戲在使用時才還原），回傳存檔中的遊戲數"""
+        self.close_savefile()
+        self.savefile = SaveFile(path)
+        self._taken.clear()
+        self.logger("【SERVER】", f"載入存檔：{path}（{len(self.savefile)} 場遊戲）")
+        return len(self.savefile)
+
+    def close_savefile(self):
+        """關閉存檔（尚未還原的遊戲無法再取得）"""
+        if self.savefile is not None:
+            self.savefile.close()
+            self.savefile = None
+
+    def dump(self, path: str) -> int:
+        """將所有遊戲（記憶體中、已移出與存檔中尚未還原的遊戲）寫入同一個存檔，回傳寫入的遊戲數"""
+        records: Dict[str, bytes] = {}
+        if self.savefile is not None:
+            for session_id in self.savefile:
+                if session_id not in self._taken:
+                    records[session_id] = self._load(session_id, remove = False)
+        if self.directory is None:
+            records.update(self._evicted)
+        else:
+            for name in os.listdir(self.directory):
+                session_id, extension = os.path.splitext(name)
+                if extension == ".sav" and SESSION_ID.fullmatch(session_id):
+                    records[session_id] = self._load(session_id, remove = False)
+        for session_id, session in self._sessions.items():
+            records[session_id] = session.game.save(turns = session.turns)
+
+        # 寫入目前載入的存檔時，先關閉再取代（部分系統無法取代已經 mmap 的檔案），寫入後重新載入
+        reopen = self.savefile is not None and os.path.abspath(self.savefile.path) == os.path.abspath(path)
+        if reopen:
+            self.close_savefile()
+        write_savefile(path, records)
+        if reopen:
+            self.open_savefile(path)
+        self.logger("【SERVER】", f"寫入存檔：{path}（{len(records)} 場遊戲）")
+        return len(records)
+
+    async def run_evictor(self, interval: float = 30.0):
+        """定期移出閒置的遊戲（以背景工作執行，取消即停止）"""
+        while True:
+            await asyncio.sleep(interval)
+            self.evict_idle()
+
+    def stats(self) -> Dict[str, Any]:
+        """統計資訊"""
+        return {
+            "active_sessions": len(self._sessions),
+            "evicted_sessions": len(self._evicted) if self.directory is None else None,
+            "created": self.created,
+            "evictions": self.evictions,
+            "restores": self.restores,
+            "pool": self.pool.stats(),
+            "batcher": self.batcher.stats() if self.batcher else None,
+            "resilience": {"parser": self.parser.policy.stats(), "narrator": self.narrator.policy.stats()},
+            "intent": self.parser.matcher.stats(),
+            "parse_cache": self.parser.cache.stats(),
+            "narration_cache": self.narrator.cache.stats(),
+            "fused": self.fused.stats() if self.fused else None,
+            "turn_queue": {
+                "in_flight": sum(session.game.scheduler.busy for session in self._sessions.values()),
+                "depth": sum(session.game.scheduler.depth() for session in self._sessions.values())
+            }
+        }
+
+    async def aclose(self):
+        """關閉共用的連線池與批次處理，敘事快取有指定路徑時寫回檔案"""
+        if self.narrator.cache.path is not None:
+            self.narrator.cache.save()
+        self.parser.cache.close()
+        await self.session.aclose()
+        self.close_savefile()
+        if self.batcher is not None:
+            self.batcher.close()
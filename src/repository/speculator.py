@@ -0,0 +1,139 @@
+"""
+推測執行（在玩家閱讀、輸入時預先生成敘事）：
+    1. 根據目前的遊戲狀態，列出最可能的幾個行動
+    2. 在複製的狀態上執行遊戲引擎，並於背景生成敘事文本
+    3. 玩家的實際行動與推測結果相同時，直接回傳預先生成的文本
+    4. 限制每回合與總共的推測次數，新回合開始時取消未使用的推測
+"""
+
+import threading
+from contextlib import closing
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Optional, Dict, Any, List, Tuple
+
+from src.repository.core.engine import GameEngine, LOCATIONS
+from src.repository.core.state import GameState
+from src.repository.llm.narrator import NarratorAgent
+
+class Speculator:
+    """推測執行器，於背景預先生成可能行動的敘事文本"""
+    def __init__(self, narrator: NarratorAgent, top_k: int = 3, max_workers: int = 2, max_calls: Optional[int] = None):
+        self.top_k = top_k            # 每回合最多推測的行動數
+        self.max_calls = max_calls    # 總共最多推測的 LLM 呼叫次數，None 代表不限制
+
+        # 背景使用的 Narrator 不輸出日誌，但與主要的 Narrator 共用後端、連線池、容錯策略與快取（推測與實際行動相同時只呼叫一次 LLM）
+        # 推測以串流生成以便隨時取消，串流不經過批次處理
+        self.narrator = NarratorAgent(narrator.api_url, narrator.api_key, logger = lambda level, message: None, session = narrator.session, policy = narrator.policy, backend = narrator.backend, cache = narrator.cache)
+        self._executor = ThreadPoolExecutor(max_workers = max_workers, thread_name_prefix = "speculator")
+        self._lock = threading.Lock()
+        self._pending: List[Tuple[str, Dict[str, Any], Future, threading.Event]] = []   # （行動結果、行動後的狀態、文本、取消旗標）
+
+        self.launched = 0
+        self.hits = 0
+        self.misses = 0
+        self.cancelled = 0
+
+    @staticmethod
+    def candidates(state: GameState) -> List[Dict[str, Any]]:
+        """依可能性排序，列出目前狀態下有意義的行動"""
+        commands = []
+
+        # A 正在等待回覆
+        if state.npc_a["wait_for_response"]:
+            commands.append({"action": "choose", "choice": "接受"})
+            commands.append({"action": "choose", "choice": "拒絕"})
+
+        # 同一地點的 NPC
+        for npc, npc_state in (("A", state.npc_a), ("B", state.npc_b), ("C", state.npc_c)):
+            if npc_state["location"] == state.player_location:
+                commands.append({"action": "talk", "target": npc})
+
+        # 持有的物品
+        for item in dict.fromkeys(state.inventory):
+            commands.append({"action": "use", "object": item})
+
+        commands.append({"action": "explore"})
+
+        # 可以前往的地點
+        for location in LOCATIONS:
+            if location != state.player_location:
+                commands.append({"action": "move", "target": location})
+        return commands
+
+    def start(self, state: GameState):
+        """取消上一回合的推測，並針對目前狀態開始新的推測"""
+        self.cancel()
+        if state.game_over:
+            return
+
+        for command in self.candidates(state):
+            if len(self._pending) >= self.top_k:
+                break
+            if self.max_calls is not None and self.launched >= self.max_calls:
+                break
+
+            # 在複製的狀態上執行引擎，只推測需要 LLM 生成敘事的行動
+            engine = GameEngine(logger = lambda level, message: None, state = state.fork())
+            result = engine.execute_action(command)
+            if not engine.llm_response:
+                continue
+
+            cancel = threading.Event()
+            future = self._executor.submit(self._generate, engine.state, result, cancel)
+            with self._lock:
+                self._pending.append((result, engine.state.state_to_dictionary(), future, cancel))
+            self.launched += 1
+
+    def _generate(self, state: GameState, result: str, cancel: threading.Event) -> Optional[str]:
+        """於背景串流生成文本，被取消時中斷串流（關閉連線讓後端停止生成），生成失敗或中斷時回傳 None（不使用預設文本或不完整的文本）"""
+        chunks = []
+        with closing(self.narrator.stream_story(state, result)) as stream:
+            while not cancel.is_set():
+                try:
+                    chunks.append(next(stream))
+                except StopIteration as stop:
+                    return "".join(chunks) if stop.value else None
+        return None
+
+    def match(self, result: str, state: GameState, wait: bool = True) -> Optional[Future]:
+        """尋找與實際行動結果、狀態相同的推測（wait 為 False 時只接受已完成的推測），並取消其餘的推測"""
+        found = None
+        snapshot = state.state_to_dictionary()
+        with self._lock:
+            for entry in self._pending:
+                if entry[0] == result and entry[1] == snapshot:
+                    if wait or entry[2].done():
+                        found = entry
+                    break
+            if found is not None:
+                self._pending.remove(found)
+
+        self.cancel()
+        if found is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return found[2]
+
+    def cancel(self):
+        """取消所有尚未使用的推測"""
+        with self._lock:
+            pending, self._pending = self._pending, []
+        for _, _, future, cancel in pending:
+            cancel.set()
+            future.cancel()
+        self.cancelled += len(pending)
+
+    def stats(self) -> Dict[str, Any]:
+        """推測統計"""
+        return {
+            "launched": self.launched,
+            "hits": self.hits,
+            "misses": self.misses,
+            "cancelled": self.cancelled
+        }
+
+    def close(self):
+        """取消推測並關閉背景執行緒"""
+        self.cancel()
+        self._executor.shutdown(wait = False, cancel_futures = True)
@@ -0,0 +1,280 @@
+"""
+結構化的追蹤與統計（與 logger 的文字日誌並存，日誌給人看，這裡的資料給程式彙整）：
+    1. 追蹤區段（span）：記錄呼叫 LLM、解析、執行指令、生成敘事的耗時與結果，巢狀的區段屬於同一個追蹤
+    2. 計數器：快取命中、改用預設內容、無法理解的指令、LLM 錯誤、略過的行動與取消的敘事
+    3. 直方圖：各區段的耗時、Prompt 與 LLM 回應的 token 數、行動的排隊時間
+    4. 輸出：Prometheus 文字格式（本機 HTTP 端點或伺服器的 /metrics）與 JSONL 追蹤檔
+    5. 預設停用，停用時區段與計數只有一次屬性檢查的成本
+    6. 本機的 /metrics 端點在 metrics_server.py，啟動時才載入 http.server
+
+使用方式：TELEMETRY.enable(trace_path = "trace.jsonl")，TELEMETRY.serve_metrics(9100)
+"""
+
+import contextvars
+import json
+import os
+import threading
+import time
+from typing import Optional, Dict, Any, List, Tuple
+
+# 計數器：名稱 -> （說明、標籤）
+COUNTERS = {
+    "cache_hits_total": ("快取命中次數", ("cache",)),
+    "cache_misses_total": ("快取未命中次數", ("cache",)),
+    "intent_matches_total": ("規則比對的結果（hit 代表不需要呼叫 LLM）", ("result",)),
+    "fallbacks_total": ("呼叫 LLM 失敗而改用預設內容的次數", ("agent",)),
+    "invalid_commands_total": ("無法理解的指令數", ()),
+    "llm_errors_total": ("呼叫 LLM 發生錯誤的次數", ("agent", "kind")),
+    "turns_skipped_total": ("回合進行中送出而未執行的行動數（coalesced 為被較新的行動取代，rejected 為被拒絕）", ("reason",)),
+    "narrations_cancelled_total": ("玩家送出下一個行動而取消的敘事數", ()),
+}
+
+# 直方圖：名稱 -> （說明、標籤、區間上限）
+HISTOGRAMS = {
+    "span_duration_seconds": ("各區段的耗時（秒）", ("span", "status"), (0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)),
+    "llm_response_tokens": ("LLM 回應的 token 數（以串流的段數計算）", ("agent",), (4, 8, 16, 32, 64, 128, 256, 512, 1024)),
+    "llm_prompt_tokens": ("Prompt 的 token 數（估計值）", ("agent",), (64, 128, 256, 384, 512, 768, 1024, 2048)),
+    "turn_queue_wait_seconds": ("行動等待前一回合執行完指令的時間（秒）", (), (0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)),
+}
+
+_CURRENT_SPAN: contextvars.ContextVar = contextvars.ContextVar("current_span", default = None)
+
+def _escape(value: Any) -> str:
+    """Prometheus 標籤值的跳脫"""
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def _labels(names: Tuple[str, ...], values: Tuple[Any, ...], extra: str = "") -> str:
+    """組合 Prometheus 的標籤字串"""
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Counter:
+    """只會增加的計數器"""
+    def __init__(self, name: str, help: str, label_names: Tuple[str, ...]):
+        self.name = name
+        self.help = help
+        self.label_names = label_names
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[Any, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        """增加計數"""
+        key = tuple(labels.get(name, "") for name in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        """取得計數"""
+        return self._values.get(tuple(labels.get(name, "") for name in self.label_names), 0)
+
+    def render(self) -> List[str]:
+        """Prometheus 文字格式"""
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        lines.extend(f"{self.name}{_labels(self.label_names, key)} {value:g}" for key, value in items)
+        return lines
+
+class Histogram:
+    """分區間統計的直方圖"""
+    def __init__(self, name: str, help: str, label_names: Tuple[str, ...], buckets: Tuple[float, ...]):
+        self.name = name
+        self.help = help
+        self.label_names = label_names
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[Any, ...], List[float]] = {}  # 標籤 -> 各區間的次數 + [總和, 次數]
+
+    def observe(self, value: float, **labels):
+        """記錄一個數值"""
+        key = tuple(labels.get(name, "") for name in self.label_names)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                counts = self._values[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            counts[-2] += value
+            counts[-1] += 1
+
+    def count(self, **labels) -> int:
+        """取得記錄的次數"""
+        counts = self._values.get(tuple(labels.get(name, "") for name in self.label_names))
+        return int(counts[-1]) if counts else 0
+
+    def render(self) -> List[str]:
+        """Prometheus 文字格式（區間為累計次數）"""
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((key, list(counts)) for key, counts in self._values.items())
+        for key, counts in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                le = f'le="{bound:g}"'
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, key, le)} {cumulative}")
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_labels(self.label_names, key, le)} {int(counts[-1])}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {counts[-2]:g}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, key)} {int(counts[-1])}")
+        return lines
+
+class Span:
+    """追蹤區段（以 with 使用，結束時記錄耗時並交給輸出）"""
+    def __init__(self, telemetry: "Telemetry", name: str, attributes: Dict[str, Any]):
+        self.telemetry = telemetry
+        self.name = name
+        self.attributes = attributes
+        self.status = "ok"
+        self.span_id = os.urandom(8).hex()
+        self.trace_id = ""
+        self.parent_id: Optional[str] = None
+        self.start = 0.0        # 開始的時間（epoch 秒）
+        self.duration = 0.0     # 耗時（秒）
+        self._start = 0.0
+        self._token = None
+
+    def set(self, **attributes):
+        """設定屬性（status 會改變區段的狀態）"""
+        status = attributes.pop("status", None)
+        if status is not None:
+            self.status = status
+        self.attributes.update(attributes)
+
+    def __enter__(self) -> "Span":
+        parent = _CURRENT_SPAN.get()
+        if parent is not None:
+            self.trace_id, self.parent_id = parent.trace_id, parent.span_id
+        else:
+            self.trace_id = os.urandom(16).hex()
+        self._token = _CURRENT_SPAN.set(self)
+        self.start = time.time()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.duration = time.perf_counter() - self._start
+        if exc_type is not None:
+            self.status = "error"
+            self.attributes["error"] = repr(exc_value)
+        try:
+            _CURRENT_SPAN.reset(self._token)
+        except ValueError:
+            # 產生器在其他 Context 中結束（如串流被其他執行緒讀完），只清除目前的區段
+            _CURRENT_SPAN.set(None)
+        self.telemetry._finish(self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON 格式"""
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": round(self.start, 6),
+            "duration_ms": round(self.duration * 1000, 3),
+            "status": self.status,
+            "attributes": self.attributes
+        }
+
+class _NoopSpan:
+    """停用時的區段（不記錄任何資料）"""
+    def set(self, **attributes):
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+NOOP_SPAN = _NoopSpan()
+
+class JsonlExporter:
+    """將結束的區段逐行寫入 JSONL 檔"""
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding = "utf-8", buffering = 1)
+
+    def export(self, span: Span):
+        """寫入一個區段"""
+        line = json.dumps(span.to_dict(), ensure_ascii = False, default = str) + "\n"
+        with self._lock:
+            if not self._file.closed:
+                self._file.write(line)
+
+    def close(self):
+        """關閉檔案"""
+        with self._lock:
+            self._file.close()
+
+class Telemetry:
+    """追蹤與統計的集合（整個程序共用 TELEMETRY）"""
+    def __init__(self):
+        self.enabled = False
+        self.counters = {name: Counter(name, help, labels) for name, (help, labels) in COUNTERS.items()}
+        self.histograms = {name: Histogram(name, help, labels, buckets) for name, (help, labels, buckets) in HISTOGRAMS.items()}
+        self.exporters: List[Any] = []
+        self._servers: List["MetricsServer"] = []
+
+    def enable(self, trace_path: Optional[str] = None) -> "Telemetry":
+        """啟用（指定 trace_path 時同時輸出 JSONL 追蹤檔）"""
+        if trace_path is not None:
+            self.exporters.append(JsonlExporter(trace_path))
+        self.enabled = True
+        return self
+
+    def disable(self):
+        """停用並關閉所有輸出"""
+        self.enabled = False
+        for exporter in self.exporters:
+            exporter.close()
+        self.exporters.clear()
+        for server in self._servers:
+            server.stop()
+        self._servers.clear()
+
+    def span(self, name: str, **attributes):
+        """建立追蹤區段（停用時回傳不記錄的區段）"""
+        if not self.enabled:
+            return NOOP_SPAN
+        return Span(self, name, attributes)
+
+    def inc(self, name: str, amount: float = 1, **labels):
+        """增加計數器"""
+        if self.enabled:
+            self.counters[name].inc(amount, **labels)
+
+    def observe(self, name: str, value: float, **labels):
+        """記錄直方圖的數值"""
+        if self.enabled:
+            self.histograms[name].observe(value, **labels)
+
+    def _finish(self, span: Span):
+        """區段結束：記錄耗時並交給輸出"""
+        self.histograms["span_duration_seconds"].observe(span.duration, span = span.name, status = span.status)
+        for exporter in self.exporters:
+            exporter.export(span)
+
+    def render_prometheus(self) -> str:
+        """所有統計的 Prometheus 文字格式"""
+        lines = []
+        for metric in (*self.counters.values(), *self.histograms.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def serve_metrics(self, port: int = 9100, host: str = "127.0.0.1") -> "MetricsServer":
+        """在背景執行緒啟動 Prometheus 的 /metrics 端點（同時啟用統計）"""
+        from src.repository.metrics_server import MetricsServer
+
+        self.enabled = True
+        server = MetricsServer(self, host = host, port = port).start()
+        self._servers.append(server)
+        return server
+
+TELEMETRY = Telemetry()
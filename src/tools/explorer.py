@@ -0,0 +1,266 @@
+"""
+遊戲狀態空間的窮舉（不呼叫 LLM）：
+    1. 以廣度優先搜尋，對每個狀態執行所有結構化指令，列出所有可到達的遊戲狀態
+    2. 以向量化的模擬器（simulator.py）批次執行狀態轉換，每個狀態編碼為一個整數（物品欄以每種物品的數量表示，不計順序）
+    3. 記錄到達每個結局的最短路徑、從未發揮作用的指令、無法到達任何結局的狀態
+    4. 以 GameEngine 重播部分狀態的最短路徑，確認模擬器與遊戲引擎的結果一致
+    5. 可將摘要保存為 JSON，修改遊戲規則後與之比較，作為回歸檢查
+
+執行方式：python -m src.tools.explorer [--max-depth N] [--sample N] [--save PATH] [--check PATH]
+"""
+
+import argparse
+import json
+import sys
+import time
+from typing import Optional, Dict, Any, List, Tuple
+
+import numpy as np
+
+from src.repository.core.engine import GameEngine
+from src.repository.core.state import ENDINGS
+from src.tools.simulator import BatchSimulator, STATE_FIELDS, all_commands, describe, encode, decode, project
+
+GAME_OVER = list(STATE_FIELDS).index("game_over")
+ENDING = list(STATE_FIELDS).index("ending")
+
+class StateExplorer:
+    """遊戲狀態空間的窮舉器"""
+    CHUNK = 8192    # 每批展開的狀態數（每批的模擬器有 CHUNK * 指令數 個遊戲）
+
+    def __init__(self, commands: Optional[List[Dict[str, Any]]] = None, max_depth: Optional[int] = None, record_edges: bool = True, sample: int = 1000):
+        self.commands = commands or all_commands()
+        self.max_depth = max_depth          # 最多搜尋的步數，None 代表搜尋到沒有新狀態為止
+        self.record_edges = record_edges    # 是否記錄狀態轉換（計算無法到達結局的狀態時需要）
+        self.sample = sample                # 以 GameEngine 重播驗證的狀態數
+
+        self._keys = np.zeros(0, dtype = np.int64)      # 狀態編號 -> 鍵值
+        self._parents = np.zeros(0, dtype = np.int64)   # 狀態編號 -> 上一個狀態編號 * 指令數 + 指令編號（初始狀態為 -1）
+        self._sources = np.zeros(0, dtype = np.int32)   # 狀態轉換的起點
+        self._targets = np.zeros(0, dtype = np.int32)   # 狀態轉換的終點
+
+        self.levels: List[int] = []                 # 每一步新增的狀態數
+        self.endings: Dict[str, int] = {}           # 結局 -> 最先到達的狀態編號
+        self.terminals = np.zeros(0, dtype = np.int64)  # 遊戲結束的狀態編號
+        self.ending_counts: Dict[str, int] = {}     # 結局 -> 到達該結局的狀態數
+        self.effective = [0] * len(self.commands)   # 每個指令改變狀態的次數
+        self.errors: List[Tuple[List[str], str]] = []   # 重播時發生的例外或與模擬器不一致的狀態（路徑、錯誤訊息）
+        self.transitions = 0
+        self.complete = False
+        self.elapsed = 0.0
+
+    def run(self) -> "StateExplorer":
+        """執行廣度優先搜尋（每一步依序展開目前的狀態，新狀態的編號依第一次到達的順序）"""
+        start_time = time.perf_counter()
+        count = len(self.commands)
+        simulator = BatchSimulator(1, self.commands)
+        rows = simulator.matrix()
+        self._keys = encode(rows)
+        self._parents = np.array([-1], dtype = np.int64)
+        sorted_keys, sorted_indices = self._keys.copy(), np.zeros(1, dtype = np.int64)   # 已到達的狀態（依鍵值排序，用於查詢）
+        sources, targets = [], []
+        effective = np.zeros(count, dtype = np.int64)
+
+        frontier = np.zeros(1, dtype = np.int64)
+        self.levels.append(1)
+        depth = 0
+        while len(frontier) and (self.max_depth is None or depth < self.max_depth):
+            # 對目前的每個狀態執行所有指令，只保留狀態有改變的遊戲（大部分的指令不會改變狀態）
+            level_rows, level_keys, level_edges, level_sources = [], [], [], []
+            for start in range(0, len(frontier), self.CHUNK):
+                chunk = frontier[start:start + self.CHUNK]
+                before = np.repeat(rows[start:start + self.CHUNK].T, count, axis = 1).T
+                actions = np.tile(np.arange(count), len(chunk))
+                simulator.load(before)
+                simulator.step(actions)
+                after = simulator.matrix()
+
+                changed = np.flatnonzero((after != before).any(axis = 1))
+                level_rows.append(after[changed])
+                level_keys.append(encode(level_rows[-1]))
+                level_edges.append(np.repeat(chunk, count)[changed] * count + actions[changed])
+                level_sources.append(np.repeat(chunk, count)[changed])
+                effective += np.bincount(actions[changed], minlength = count)
+                self.transitions += len(changed)
+
+            # 查詢到達的狀態，之前沒有到達過的狀態依第一次到達的順序編號
+            keys = np.concatenate(level_keys)
+            edges = np.concatenate(level_edges)
+            unique, first, inverse = np.unique(keys, return_index = True, return_inverse = True)
+            found = np.full(len(unique), -1, dtype = np.int64)
+            position = np.minimum(np.searchsorted(sorted_keys, unique), len(sorted_keys) - 1)
+            hit = sorted_keys[position] == unique
+            found[hit] = sorted_indices[position[hit]]
+            new = np.flatnonzero(~hit)
+            new = new[np.argsort(first[new])]
+            new_indices = np.arange(len(self._keys), len(self._keys) + len(new), dtype = np.int64)
+            found[new] = new_indices
+
+            self._keys = np.concatenate((self._keys, unique[new]))
+            self._parents = np.concatenate((self._parents, edges[first[new]]))
+            inserted = np.sort(new)     # 新狀態依鍵值排序
+            position = np.searchsorted(sorted_keys, unique[inserted])
+            sorted_keys = np.insert(sorted_keys, position, unique[inserted])
+            sorted_indices = np.insert(sorted_indices, position, found[inserted])
+            if self.record_edges:
+                sources.append(np.concatenate(level_sources).astype(np.int32))
+                targets.append(found[inverse].astype(np.int32))
+
+            # 遊戲結束的狀態不再展開
+            rows = np.concatenate(level_rows)[first[new]]
+            over = rows[:, GAME_OVER].astype(bool)
+            for ending_id in np.unique(rows[over, ENDING]):
+                reached = new_indices[over & (rows[:, ENDING] == ending_id)]
+                ending = ENDINGS[ending_id - 1]
+                self.endings.setdefault(ending, int(reached[0]))
+                self.ending_counts[ending] = self.ending_counts.get(ending, 0) + len(reached)
+            self.terminals = np.concatenate((self.terminals, new_indices[over]))
+            frontier = new_indices[~over]
+            rows = rows[~over]
+            depth += 1
+            if len(frontier):
+                self.levels.append(len(frontier))
+
+        self.terminals.sort()
+        self.effective = [int(value) for value in effective]
+        if self.record_edges:
+            self._sources = np.concatenate(sources) if sources else self._sources
+            self._targets = np.concatenate(targets) if targets else self._targets
+        self.complete = not len(frontier)
+        self.verify()
+        self.elapsed = time.perf_counter() - start_time
+        return self
+
+    def verify(self):
+        """以 GameEngine 重播部分狀態（平均分布的狀態與各結局最先到達的狀態）的最短路徑，記錄例外與不一致的狀態"""
+        if not self.sample:
+            return
+        spread = np.linspace(0, self.states - 1, min(self.sample, self.states)).astype(np.int64)
+        indices = np.unique(np.concatenate((spread, np.array(list(self.endings.values()), dtype = np.int64))))
+        simulator = BatchSimulator(1, self.commands)
+        simulator.load(decode(self._keys[indices]))
+        for i, index in enumerate(indices):
+            path = self._commands(int(index))
+            names = [describe(self.commands[c]) for c in path]
+            engine = GameEngine(logger = lambda level, message: None)
+            try:
+                for c in path:
+                    engine.execute_action(dict(self.commands[c]))
+            except Exception as e:
+                self.errors.append((names, repr(e)))
+                continue
+            if project(engine.state) != simulator.row(i):
+                self.errors.append((names, f"GameEngine 與模擬器的狀態不同：{project(engine.state)} / {simulator.row(i)}"))
+
+    @property
+    def states(self) -> int:
+        """可到達的狀態數"""
+        return len(self._keys)
+
+    def _commands(self, index: int) -> List[int]:
+        """從初始狀態到指定狀態的最短指令序列（指令編號）"""
+        count = len(self.commands)
+        path = []
+        parent = int(self._parents[index])
+        while parent >= 0:
+            index, c = divmod(parent, count)
+            path.append(c)
+            parent = int(self._parents[index])
+        return path[::-1]
+
+    def path(self, index: int) -> List[str]:
+        """從初始狀態到指定狀態的最短指令序列"""
+        return [describe(self.commands[c]) for c in self._commands(index)]
+
+    def row(self, index: int) -> Tuple:
+        """取得指定狀態（與 simulator.project() 的格式相同）"""
+        simulator = BatchSimulator(1, self.commands)
+        simulator.load(decode(self._keys[index:index + 1]))
+        return simulator.row(0)
+
+    def dead_states(self) -> Optional[List[int]]:
+        """無法到達任何結局的狀態（需要完整搜尋並記錄狀態轉換，否則回傳 None）"""
+        if not self.complete or not self.record_edges:
+            return None
+
+        # 由結局往回搜尋：每一輪將可以到達結局的狀態的起點標記為可以到達，直到沒有新的狀態
+        alive = np.zeros(self.states, dtype = bool)
+        alive[self.terminals] = True
+        sources, targets = self._sources, self._targets
+        while True:
+            reached = sources[alive[targets] & ~alive[sources]]
+            if not len(reached):
+                break
+            alive[reached] = True
+        return np.flatnonzero(~alive).tolist()
+
+    def summary(self) -> Dict[str, Any]:
+        """搜尋結果摘要（可保存為 JSON 作為回歸檢查的基準）"""
+        dead = self.dead_states()
+        return {
+            "states": self.states,
+            "transitions": self.transitions,
+            "complete": self.complete,
+            "levels": self.levels,
+            "endings": {
+                ending: {
+                    "states": self.ending_counts.get(ending, 0),
+                    "shortest_path": self.path(self.endings[ending]) if ending in self.endings else None
+                }
+                for ending in ENDINGS
+            },
+            "unreachable_endings": [ending for ending in ENDINGS if ending not in self.endings],
+            "ineffective_commands": [describe(command) for command, count in zip(self.commands, self.effective) if count == 0],
+            "dead_states": None if dead is None else len(dead),
+            "errors": [{"path": path, "error": error} for path, error in self.errors[:10]]
+        }
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any]) -> List[str]:
+    """比較兩份摘要，回傳不同的欄位"""
+    differences = []
+    for key in baseline:
+        if baseline[key] != current.get(key):
+            differences.append(key)
+    return differences
+
+def main():
+    """主程式"""
+    parser = argparse.ArgumentParser(description = "窮舉遊戲引擎的狀態空間")
+    parser.add_argument("--max-depth", type = int, help = "最多搜尋的步數（預設搜尋全部狀態）")
+    parser.add_argument("--no-edges", action = "store_true", help = "不記錄狀態轉換（節省記憶體，但不計算無法到達結局的狀態）")
+    parser.add_argument("--sample", type = int, default = 1000, help = "以 GameEngine 重播驗證的狀態數（0 代表不驗證）")
+    parser.add_argument("--save", help = "將摘要保存為 JSON")
+    parser.add_argument("--check", help = "與保存的摘要比較，不同時回傳非零的結束代碼")
+    args = parser.parse_args()
+
+    explorer = StateExplorer(max_depth = args.max_depth, record_edges = not args.no_edges, sample = args.sample).run()
+    summary = explorer.summary()
+
+    print(f"狀態數：{summary['states']}，狀態轉換：{summary['transitions']}，耗時：{explorer.elapsed:.1f} 秒{'' if summary['complete'] else '（未搜尋完畢）'}")
+    for ending, info in summary["endings"].items():
+        path = info["shortest_path"]
+        if path is None:
+            print(f"{ending}：無法到達")
+        else:
+            print(f"{ending}：{info['states']} 個狀態，最短 {len(path)} 步：{' → '.join(path)}")
+    print(f"從未發揮作用的指令：{'、'.join(summary['ineffective_commands']) or '無'}")
+    if summary["dead_states"] is not None:
+        print(f"無法到達任何結局的狀態：{summary['dead_states']}")
+    for error in summary["errors"]:
+        print(f"重播錯誤：{error['error']}\n路徑：{' → '.join(error['path'])}")
+
+    if args.save:
+        with open(args.save, "w", encoding = "utf-8") as f:
+            json.dump(summary, f, ensure_ascii = False, indent = 2)
+
+    if args.check:
+        with open(args.check, "r", encoding = "utf-8") as f:
+            baseline = json.load(f)
+        differences = compare(baseline, summary)
+        if differences:
+            print(f"與基準不同：{'、'.join(differences)}")
+            sys.exit(1)
+        print("與基準相同。")
+
+if __name__ == "__main__":
+    main()
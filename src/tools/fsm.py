@@ -0,0 +1,97 @@
+"""
+由遊戲規則表產生狀態圖（Graphviz DOT）：
+    1. 地點為節點，移動為地點之間的邊
+    2. 只在特定地點發生的狀態轉換畫在該地點上，不限地點的狀態轉換畫在「任何地點」上
+    3. 檢查規則連到其觸發的結局，並標示會觸發檢查的欄位
+    4. 若有安裝 Graphviz，可直接輸出 SVG
+
+執行方式：python -m src.tools.fsm [--output fsm.dot] [--svg fsm.svg]
+"""
+
+import argparse
+import shutil
+import subprocess
+import sys
+from typing import List
+
+from src.repository.core.rules import Transition, Invariant, TRANSITIONS, INVARIANTS, OTHER
+from src.repository.core.state import LOCATIONS, ENDINGS
+
+ANYWHERE = "任何地點"
+
+def _quote(text: str) -> str:
+    """DOT 字串"""
+    return '"' + text.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+def label(transition: Transition) -> str:
+    """狀態轉換的標籤（如 talk:A（A 崩潰））"""
+    target = transition.target
+    if isinstance(target, tuple):
+        target = "、".join(target)
+    head = transition.action if target is None else f"{transition.action}:{target}"
+    return f"{head}（{transition.note}）"
+
+def to_dot(transitions: List[Transition] = TRANSITIONS, invariants: List[Invariant] = INVARIANTS) -> str:
+    """產生 DOT 文字"""
+    lines = [
+        "digraph fsm {",
+        "    rankdir=LR;",
+        '    node [fontname="Noto Sans CJK TC"];',
+        '    edge [fontname="Noto Sans CJK TC", fontsize=10];',
+        '    start [shape=point];',
+        f"    start -> {_quote(LOCATIONS[0])};"
+    ]
+
+    # 地點與移動
+    for location in LOCATIONS + (ANYWHERE,):
+        lines.append(f"    {_quote(location)} [shape={'box' if location != ANYWHERE else 'box, style=dashed'}];")
+    for source in LOCATIONS:
+        for target in LOCATIONS:
+            if source != target:
+                lines.append(f"    {_quote(source)} -> {_quote(target)} [label=\"move\", color=gray];")
+
+    # 其他狀態轉換（不存在的參數只是提示文字，不畫出）
+    for transition in transitions:
+        if transition.target == OTHER or (transition.action == "move" and not transition.effects):
+            continue
+        node = _quote(transition.location or ANYWHERE)
+        style = "solid" if transition.effects else "dotted"
+        lines.append(f"    {node} -> {node} [label={_quote(label(transition))}, style={style}];")
+
+    # 檢查規則與結局
+    for ending in ENDINGS:
+        lines.append(f"    {_quote(ending)} [shape=doublecircle];")
+    for invariant in invariants:
+        node = _quote(f"檢查：{invariant.name}")
+        lines.append(f"    {node} [shape=diamond];")
+        lines.append(f"    {_quote(ANYWHERE)} -> {node} [label={_quote('、'.join(sorted(invariant.reads)))}, style=dashed];")
+        for condition, ending in invariant.endings:
+            lines.append(f"    {node} -> {_quote(ending)} [label={_quote(condition)}];")
+
+    lines.append("}")
+    return "\n".join(lines) + "\n"
+
+def main():
+    """主程式"""
+    parser = argparse.ArgumentParser(description = "由遊戲規則表產生狀態圖")
+    parser.add_argument("--output", default = "fsm.dot", help = "DOT 檔案路徑（- 代表輸出到螢幕）")
+    parser.add_argument("--svg", help = "以 Graphviz 輸出 SVG 的路徑")
+    args = parser.parse_args()
+
+    dot = to_dot()
+    if args.output == "-":
+        sys.stdout.write(dot)
+    else:
+        with open(args.output, "w", encoding = "utf-8") as f:
+            f.write(dot)
+        print(f"已輸出：{args.output}")
+
+    if args.svg:
+        if shutil.which("dot") is None:
+            print("找不到 Graphviz（dot），無法輸出 SVG。")
+            sys.exit(1)
+        subprocess.run(["dot", "-Tsvg", "-o", args.svg], input = dot.encode("utf-8"), check = True)
+        print(f"已輸出：{args.svg}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+本機的 LLM 模擬伺服器（不需要網路與 GPU，用於效能測試與壓力測試）：
+    1. 提供 Ollama 風格的 /api/generate（NDJSON）與 OpenAI 相容的 /v1/chat/completions（SSE）
+    2. 回應由模擬模型產生（解析時以規則比對產生指令，敘事時改寫行動結果）
+    3. 可設定延遲、生成速度、抖動、錯誤與卡住的機率，並可固定亂數種子以重現結果
+    4. 可在同一個程序中啟動（背景執行緒），供效能測試使用
+
+執行方式：python -m src.tools.mock_llm [--port 11434] [--latency 0.2] [--token-rate 50] [--jitter 0.1] [--error-rate 0] [--stall-rate 0] [--seed N]
+"""
+
+import argparse
+import json
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Optional
+
+from src.repository.llm.backends import SimulatedModel
+
+class MockHandler(BaseHTTPRequestHandler):
+    """模擬伺服器的請求處理"""
+    protocol_version = "HTTP/1.1"
+    server: "MockLLMServer"
+
+    def log_message(self, format, *args):
+        """不輸出存取日誌"""
+
+    def do_POST(self):
+        """處理生成請求"""
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError:
+            self._empty(400)
+            return
+
+        if self.path.startswith("/api/generate"):
+            prompt, openai = body.get("prompt", ""), False
+        elif self.path.startswith("/v1/chat/completions"):
+            messages = body.get("messages") or [{}]
+            prompt, openai = messages[-1].get("content", ""), True
+        else:
+            self._empty(404)
+            return
+
+        error, delay, chunks, interval = self.server.model.plan(prompt)
+        time.sleep(delay)
+        if error:
+            self._empty(500)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream; charset=utf-8" if openai else "application/x-ndjson; charset=utf-8")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for i, chunk in enumerate(chunks):
+                if i and interval:
+                    time.sleep(interval)
+                self._chunk(self._format(chunk, openai, False))
+            self._chunk(self._format("", openai, True))
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # 用戶端已放棄（如逾時或對沖請求被取消）
+            self.close_connection = True
+
+    def _format(self, text: str, openai: bool, done: bool) -> str:
+        """將一段文字轉換為串流中的一行"""
+        if openai:
+            if done:
+                return "data: [DONE]\n\n"
+            return "data: " + json.dumps({"choices": [{"delta": {"content": text}}]}, ensure_ascii = False) + "\n\n"
+        return json.dumps({"model": "mock", "response": text, "done": done}, ensure_ascii = False) + "\n"
+
+    def _chunk(self, line: str):
+        """以 chunked 編碼送出一行"""
+        data = line.encode("utf-8")
+        self.wfile.write(f"{len(data):x}\r\n".encode("latin-1") + data + b"\r\n")
+        self.wfile.flush()
+
+    def _empty(self, status: int):
+        """回傳沒有內容的錯誤"""
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+class MockLLMServer(ThreadingHTTPServer):
+    """LLM 模擬伺服器"""
+    daemon_threads = True
+
+    def __init__(self, model: Optional[SimulatedModel] = None, host: str = "127.0.0.1", port: int = 0):
+        super().__init__((host, port), MockHandler)
+        self.model = model or SimulatedModel()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        """Ollama 風格的端點網址"""
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/api/generate"
+
+    @property
+    def openai_url(self) -> str:
+        """OpenAI 相容的端點網址"""
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1/chat/completions"
+
+    def start(self) -> "MockLLMServer":
+        """在背景執行緒中啟動"""
+        self._thread = threading.Thread(target = self.serve_forever, name = "mock-llm", daemon = True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """停止伺服器"""
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+def main():
+    """主程式"""
+    parser = argparse.ArgumentParser(description = "啟動本機的 LLM 模擬伺服器")
+    parser.add_argument("--host", default = "127.0.0.1")
+    parser.add_argument("--port", type = int, default = 11434)
+    parser.add_argument("--latency", type = float, default = 0.2, help = "第一個 token 前的延遲（秒）")
+    parser.add_argument("--token-rate", type = float, default = 50.0, help = "每秒生成的 token 數（0 代表一次輸出）")
+    parser.add_argument("--jitter", type = float, default = 0.1, help = "延遲的相對抖動（0.1 代表 ±10%%）")
+    parser.add_argument("--error-rate", type = float, default = 0.0, help = "回傳 500 錯誤的機率")
+    parser.add_argument("--stall-rate", type = float, default = 0.0, help = "卡住的機率")
+    parser.add_argument("--stall", type = float, default = 30.0, help = "卡住的秒數")
+    parser.add_argument("--seed", type = int, help = "亂數種子")
+    args = parser.parse_args()
+
+    model = SimulatedModel(latency = args.latency, token_rate = args.token_rate, jitter = args.jitter, error_rate = args.error_rate, stall_rate = args.stall_rate, stall = args.stall, seed = args.seed)
+    server = MockLLMServer(model, host = args.host, port = args.port)
+    print(f"模擬伺服器啟動：{server.url}（OpenAI 相容：{server.openai_url}）")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+重播回合日誌（不呼叫 LLM，以遊戲引擎全速重新執行記錄的指令）：
+    1. 依遊戲分組，依序套用回合、復原、重置、讀檔與結束遊戲（回合依執行順序記錄，敘事文本以序號對應回合）
+    2. 比對引擎的結果與是否需要敘事，列出與紀錄不同的回合（規則修改後的差異或無法重現的問題）
+    3. 可印出每回合的文本（使用記錄的敘事，不需要再呼叫 LLM）
+    4. 可將重建後的所有遊戲寫入存檔，用於程序中斷後還原伺服器（python -m src.ui.server.server --savefile PATH）
+    5. 回報每秒重播的回合數
+
+執行方式：python -m src.tools.replay JOURNAL [--session ID] [--show] [--savefile PATH] [--check]
+"""
+
+import argparse
+import sys
+import time
+from typing import Dict, Any, List, Tuple, Iterable
+
+from src.repository.core.engine import GameEngine
+from src.repository.core.savefile import encode_record, write_savefile
+from src.repository.core.state import GameState, GameSnapshot
+from src.repository.journal import read_journal
+
+class ReplayedGame:
+    """重播中的一場遊戲（與 GameAssemble 相同的復原規則）"""
+    def __init__(self, max_history: int = 100):
+        self.engine = GameEngine(logger = lambda level, message: None)
+        self.history: List[GameSnapshot] = []
+        self.max_history = max_history
+        self.turns = 0
+        self.messages: List[Tuple[str, str]] = []   # 玩家輸入與記錄的文本
+        self.pending: Dict[int, Tuple[int, int, str]] = {}  # 回合序號 -> 尚未記錄文本的回合（文本在對話紀錄中的位置、第幾回合、玩家輸入）
+
+class Replayer:
+    """依序套用日誌中的紀錄"""
+    def __init__(self, max_history: int = 100):
+        self.max_history = max_history
+        self.games: Dict[str, ReplayedGame] = {}
+        self.turns = 0
+        self.mismatches: List[Dict[str, Any]] = []
+        self.elapsed = 0.0
+
+    def run(self, records: Iterable[Dict[str, Any]], show: bool = False) -> "Replayer":
+        """重播所有紀錄"""
+        start_time = time.perf_counter()
+        for record in records:
+            self.apply(record, show = show)
+        self.elapsed = time.perf_counter() - start_time
+        return self
+
+    def apply(self, record: Dict[str, Any], show: bool = False):
+        """套用一筆紀錄"""
+        session = record["session"]
+        game = self.games.get(session)
+        if game is None:
+            game = self.games[session] = ReplayedGame(self.max_history)
+        event = record["event"]
+
+        if event == "turn":
+            self._turn(session, game, record, show)
+        elif event == "story":
+            self._story(session, game, record, show)
+        elif event == "undo":
+            if game.history:
+                game.engine.state.restore(game.history.pop())
+        elif event == "reset":
+            self.games[session] = ReplayedGame(self.max_history)
+        elif event == "load":
+            game.engine.state = GameState.unpack(record["state"])
+            game.history = [GameState.unpack_snapshot(code) for code in record["history"]]
+        elif event == "exit":
+            game.engine.state.game_over = True
+
+    def _turn(self, session: str, game: ReplayedGame, record: Dict[str, Any], show: bool):
+        """重新執行一回合並比對結果"""
+        game.history.append(game.engine.state.snapshot())
+        if len(game.history) > game.max_history:
+            game.history.pop(0)
+        engine = game.engine
+        engine.llm_response = True
+        result = engine.execute_action(record["command"])
+        game.turns += 1
+        self.turns += 1
+        game.messages.append(("user", record["input"]))
+        game.messages.append(("system", record.get("story", "")))
+        if "seq" in record:
+            # 文本由之後的 story 紀錄補上
+            game.pending[record["seq"]] = (len(game.messages) - 1, game.turns, record["input"])
+
+        if result != record["result"] or engine.llm_response != record["llm_response"]:
+            self.mismatches.append({
+                "session": session,
+                "turn": game.turns,
+                "input": record["input"],
+                "command": record["command"],
+                "recorded": record["result"],
+                "replayed": result
+            })
+        if show and "seq" not in record:
+            print(f"[{session[:8]} #{game.turns}] {record['input']}\n{record['story']}\n")
+
+    @staticmethod
+    def _story(session: str, game: ReplayedGame, record: Dict[str, Any], show: bool):
+        """補上回合的文本（重置後才完成的敘事沒有對應的回合，略過）"""
+        pending = game.pending.pop(record["seq"], None)
+        if pending is None:
+            return
+        index, turn, user_input = pending
+        game.messages[index] = ("system", record["story"])
+        if show:
+            print(f"[{session[:8]} #{turn}] {user_input}\n{record['story']}\n")
+
+    def save(self, path: str) -> int:
+        """將重建後的所有遊戲（含對話紀錄）寫入存檔，回傳寫入的遊戲數"""
+        records = {session: encode_record(game.engine.state, game.history, game.messages, game.turns) for session, game in self.games.items()}
+        write_savefile(path, records)
+        return len(records)
+
+def main():
+    """主程式"""
+    parser = argparse.ArgumentParser(description = "重播回合日誌")
+    parser.add_argument("journal", help = "回合日誌（JSONL）的路徑")
+    parser.add_argument("--session", help = "只重播一場遊戲")
+    parser.add_argument("--show", action = "store_true", help = "印出每回合的輸入與記錄的文本")
+    parser.add_argument("--savefile", help = "將重建後的所有遊戲寫入存檔")
+    parser.add_argument("--check", action = "store_true", help = "結果與紀錄不同時回傳非零的結束代碼")
+    args = parser.parse_args()
+
+    replayer = Replayer().run(read_journal(args.journal, session = args.session), show = args.show)
+    rate = replayer.turns / replayer.elapsed if replayer.elapsed > 0 else 0.0
+    print(f"遊戲數：{len(replayer.games)}，回合數：{replayer.turns}，耗時：{replayer.elapsed * 1000:.1f} ms（{rate:.0f} 回合/秒）")
+    for mismatch in replayer.mismatches:
+        print(f"結果不同：{mismatch['session']} 第 {mismatch['turn']} 回合「{mismatch['input']}」{mismatch['command']}\n  紀錄：{mismatch['recorded']}\n  重播：{mismatch['replayed']}")
+
+    if args.savefile:
+        print(f"已寫入 {replayer.save(args.savefile)} 場遊戲至 {args.savefile}")
+    if args.check and replayer.mismatches:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,578 @@
+"""
+向量化的批次模擬器（蒙地卡羅遊玩，不呼叫 LLM）：
+    1. 以 NumPy 陣列同時保存 N 個遊戲的狀態（體力、理智、NPC 計數、旗標、物品數量）
+    2. 每一步對所有遊戲套用一組行動，規則與 GameEngine 的 _handle_* 與 _check_* 相同
+    3. 支援隨機策略與腳本策略，統計結局分布與每秒模擬的步數
+    4. 記錄每個遊戲每一步採用的狀態轉換（rules.py 的轉換表），可產生結果文字與是否需要 LLM 生成敘事
+    5. 與 GameEngine 逐步比對狀態、結果文字與是否需要 LLM，確認兩者的規則一致
+    6. 可將所有遊戲的狀態匯出為矩陣、由矩陣載入，並將每個狀態編碼為一個 64 位元整數（狀態空間窮舉使用）
+
+執行方式：python -m src.tools.simulator [--games N] [--steps N] [--script PATH] [--verify]
+"""
+
+import argparse
+import json
+import time
+from functools import lru_cache
+from typing import Optional, Dict, Any, List, Tuple
+
+import numpy as np
+
+from src.repository.core.engine import GameEngine
+from src.repository.core.rules import TRANSITIONS, INVALID, ARGUMENT_KEYS
+from src.repository.core.state import GameState, LOCATIONS, NPCS, ITEMS, CHOICES, ENDINGS
+
+# 行動種類
+MOVE, EXPLORE, TALK, USE, CHOOSE = range(5)
+ACTIONS = ("move", "explore", "talk", "use", "choose")
+
+# 地點、NPC、物品、選項的編號
+CLASSROOM, LIBRARY, SHOP, OFFICE = (LOCATIONS.index(name) for name in ("教室", "圖書館", "福利社", "教師辦公室"))
+NPC_A, NPC_B, NPC_C = (NPCS.index(name) for name in ("A", "B", "C"))
+KEY, BREAD, EXAM, NOTICE, BOOK, MICROPHONE, CASH, COFFEE, A_QUESTION, B_QUESTION, WILL = (ITEMS.index(name) for name in ITEMS)
+ACCEPT = CHOICES.index("接受")
+
+# A 接受請求時給予的物品（依對話次數）
+A_GIFTS = {1: EXAM, 2: NOTICE, 3: BOOK, 5: CASH}
+
+# 可能採用的狀態轉換（rules.py 的轉換表，最後為無法理解的指令），BatchSimulator.outcome 為此列表的編號
+OUTCOMES = TRANSITIONS + [INVALID]
+# 物品欄最多的物品數（記錄取得順序時使用；每次探索最多取得一個物品並消耗體力，加上 A 給予的物品不會超過）
+MAX_ITEMS = 32
+
+@lru_cache(maxsize = None)
+def rule(action: str, note: str, **fields: Any) -> int:
+    """符合行動、說明與其他欄位（如 target、location）的第一個狀態轉換的編號"""
+    for i, transition in enumerate(OUTCOMES):
+        if transition.action == action and transition.note == note and all(getattr(transition, key) == value for key, value in fields.items()):
+            return i
+    raise KeyError(f"rules.py 中沒有符合的狀態轉換：{action} {note} {fields}")
+
+# 狀態矩陣的欄位（與 row() 的順序相同，之後為每種物品的數量）與各欄位的範圍（最小值、最大值），用於編碼
+STATE_FIELDS = {
+    "location": (0, len(LOCATIONS) - 1), "health": (0, 10), "sanity": (0, 5), "remember": (0, 1),
+    "a_sanity": (-1, 3), "a_wait": (0, 1), "a_help": (0, 3), "a_talk": (0, 5), "a_collapsed": (0, 1),
+    "b_sanity": (-1, 3), "b_talk": (0, 5), "b_collapsed": (0, 1),
+    "c_location": (0, len(LOCATIONS) - 1), "c_sanity": (0, 5), "c_other": (0, 3), "c_collapsed": (0, 1), "c_true": (0, 1),
+    "open_classroom": (0, 1), "find_microphone": (0, 1), "num_bread": (0, 3), "ask_c": (0, 1),
+    "game_over": (0, 1), "ending": (0, len(ENDINGS))
+}
+# 物品數量的範圍（鑰匙與遺書可以重複取得，其他物品最多一個）
+ITEM_RANGES = tuple((0, 15) if item in (KEY, WILL) else (0, 1) for item in range(len(ITEMS)))
+RANGES = tuple(STATE_FIELDS.values()) + ITEM_RANGES
+LOWS = np.array([low for low, _ in RANGES], dtype = np.int64)
+RADICES = np.array([high - low + 1 for low, high in RANGES], dtype = np.int64)
+assert np.prod(RADICES.astype(float)) < 2 ** 63, "狀態編碼超過 64 位元"
+PLACES = np.concatenate((np.cumprod(RADICES[:0:-1])[::-1], [1]))   # 每個欄位的位值（最後一欄為個位）
+
+def all_commands() -> List[Dict[str, Any]]:
+    """所有可能的結構化指令"""
+    commands = [{"action": "move", "target": location} for location in LOCATIONS]
+    commands.append({"action": "explore"})
+    commands += [{"action": "talk", "target": npc} for npc in NPCS]
+    commands += [{"action": "use", "object": item} for item in ITEMS]
+    commands += [{"action": "choose", "choice": choice} for choice in CHOICES]
+    return commands
+
+def describe(command: Dict[str, Any]) -> str:
+    """將指令轉換為簡短的文字（如 use:鑰匙）"""
+    values = [str(value) for key, value in command.items() if key != "action"]
+    return ":".join([command["action"]] + values)
+
+def encode(matrix: np.ndarray) -> np.ndarray:
+    """將狀態矩陣的每一列編碼為一個整數（以各欄位的範圍為進位），超出範圍時拋出 ValueError"""
+    columns = np.ascontiguousarray(matrix.T)
+    if len(matrix):
+        invalid = (columns.min(axis = 1) < LOWS) | (columns.max(axis = 1) >= LOWS + RADICES)
+        if invalid.any():
+            column = int(np.flatnonzero(invalid)[0])
+            name = (list(STATE_FIELDS) + list(ITEMS))[column]
+            raise ValueError(f"狀態欄位 {name} 超出編碼範圍 {RANGES[column][0]} ~ {RANGES[column][1]}，請調整 simulator.py 中的範圍")
+    keys = np.full(len(matrix), -int(LOWS @ PLACES), dtype = np.int64)
+    for values, place in zip(columns, PLACES):
+        keys += values * place
+    return keys
+
+def decode(keys: np.ndarray) -> np.ndarray:
+    """由 encode() 的整數還原狀態矩陣"""
+    return (keys // PLACES[:, None] % RADICES[:, None] + LOWS[:, None]).astype(np.int8).T
+
+class BatchSimulator:
+    """以 NumPy 陣列同時模擬多個遊戲"""
+    def __init__(self, size: int, commands: Optional[List[Dict[str, Any]]] = None, ordered: bool = False):
+        self.size = size
+        self.commands = commands or all_commands()
+        self.ordered = ordered  # 是否記錄物品的取得順序（產生列出物品欄的結果文字時需要）
+
+        # 指令編號 -> 行動種類、參數（地點、NPC、物品或選項的編號）
+        self.kinds = np.array([ACTIONS.index(command["action"]) for command in self.commands], dtype = np.int8)
+        self.args = np.array([self._argument(command) for command in self.commands], dtype = np.int8)
+        self.reset()
+
+    @staticmethod
+    def _argument(command: Dict[str, Any]) -> int:
+        """指令的參數編號，無法辨識的參數為 -1"""
+        action = command["action"]
+        table = {"move": LOCATIONS, "talk": NPCS, "use": ITEMS, "choose": CHOICES}.get(action)
+        value = command.get({"move": "target", "talk": "target", "use": "object", "choose": "choice"}.get(action, ""))
+        return table.index(value) if table and value in table else -1
+
+    def reset(self):
+        """將所有遊戲重設為初始狀態（初始值取自 GameState）"""
+        n = self.size
+        initial = GameState()
+
+        def full(value, dtype = np.int16) -> np.ndarray:
+            return np.full(n, value, dtype = dtype)
+
+        # 玩家
+        self.location = full(LOCATIONS.index(initial.player_location), np.int8)
+        self.health = full(initial.player_health)
+        self.sanity = full(initial.player_sanity)
+        self.remember = full(initial.player_remember, bool)
+
+        # NPC A（位置不會改變）
+        self.a_location = LOCATIONS.index(initial.npc_a.location)
+        self.a_sanity = full(initial.npc_a.sanity)
+        self.a_wait = full(initial.npc_a.wait_for_response, bool)
+        self.a_help = full(initial.npc_a.help_count)
+        self.a_talk = full(initial.npc_a.talk_count)
+        self.a_collapsed = full(initial.npc_a.collapsed, bool)
+
+        # NPC B（位置不會改變）
+        self.b_location = LOCATIONS.index(initial.npc_b.location)
+        self.b_sanity = full(initial.npc_b.sanity)
+        self.b_talk = full(initial.npc_b.talk_count)
+        self.b_collapsed = full(initial.npc_b.collapsed, bool)
+
+        # NPC C（使用遺書時會移動到玩家所在地點）
+        self.c_location = full(LOCATIONS.index(initial.npc_c.location), np.int8)
+        self.c_sanity = full(initial.npc_c.sanity)
+        self.c_other = full(initial.npc_c.other_talk_count)
+        self.c_collapsed = full(initial.npc_c.collapsed, bool)
+        self.c_true = full(initial.npc_c.true_color, bool)
+
+        # 物品欄以每種物品的數量保存（鑰匙與遺書可能重複），需要時另外記錄取得的順序
+        self.inventory = np.zeros((n, len(ITEMS)), dtype = np.int16)
+        self.order = self._order() if self.ordered else None
+        self.open_classroom = full(initial.open_classroom, bool)
+        self.find_microphone = full(initial.find_microphone, bool)
+        self.num_bread = full(initial.num_bread)
+        self.ask_c = full(initial.ask_c, bool)
+
+        # 結局：0 代表尚未結束，1 ~ 6 對應 ending_1 ~ ending_6
+        self.game_over = full(initial.game_over, bool)
+        self.ending = full(0, np.int8)
+        self.turns = full(0, np.int32)
+        self.outcome = full(-1, np.int16)  # 上一步採用的狀態轉換（OUTCOMES 的編號，-1 代表沒有執行）
+
+    def _order(self) -> np.ndarray:
+        """依物品數量建立物品欄的順序（物品編號，-1 代表空位；無法得知實際的取得順序，依 ITEMS 的順序排列）"""
+        order = np.full((self.size, MAX_ITEMS), -1, dtype = np.int8)
+        filled = np.zeros(self.size, dtype = np.int64)
+        for item in range(len(ITEMS)):
+            for k in range(int(self.inventory[:, item].max(initial = 0))):
+                rows = np.flatnonzero(self.inventory[:, item] > k)
+                order[rows, filled[rows]] = item
+                filled[rows] += 1
+        return order
+
+    def matrix(self) -> np.ndarray:
+        """所有遊戲的狀態矩陣（每列一個遊戲，欄位依 STATE_FIELDS，之後為每種物品的數量）"""
+        # 以欄為主的順序存放（每個欄位連續），與遊戲的陣列互相轉換時不需要跨步存取
+        matrix = np.empty((len(RANGES), self.size), dtype = np.int8)
+        for column, field in enumerate(STATE_FIELDS):
+            matrix[column] = getattr(self, field)
+        matrix[len(STATE_FIELDS):] = self.inventory.T
+        return matrix.T
+
+    def load(self, matrix: np.ndarray):
+        """由狀態矩陣載入遊戲（遊戲數改為矩陣的列數，A 與 B 的位置不會改變，不需要載入）"""
+        self.size = len(matrix)
+        for column, field in enumerate(STATE_FIELDS):
+            current = getattr(self, field)
+            setattr(self, field, matrix[:, column].astype(current.dtype))
+        self.inventory = matrix[:, len(STATE_FIELDS):].astype(np.int16)
+        self.order = self._order() if self.ordered else None
+        self.turns = np.zeros(self.size, dtype = np.int32)
+        self.outcome = np.full(self.size, -1, dtype = np.int16)
+
+    def step(self, actions: np.ndarray):
+        """對每個遊戲執行一個指令（actions 為指令編號），已結束的遊戲不會改變"""
+        alive = ~self.game_over
+        kind = self.kinds[actions]
+        arg = self.args[actions]
+        self.turns[alive] += 1
+        self.outcome[:] = -1
+
+        self._move(alive & (kind == MOVE), arg)
+        self._explore(alive & (kind == EXPLORE))
+        self._talk(alive & (kind == TALK), arg)
+        self._use(alive & (kind == USE), arg)
+        self._choose(alive & (kind == CHOOSE), arg)
+        self._check(alive)
+
+    def _branch(self, mask: np.ndarray, branches: List[Tuple[int, Any]]) -> List[np.ndarray]:
+        """依序判斷條件（與 rules.py 的順序相同），每個遊戲採用第一個成立的狀態轉換並記錄編號，回傳各轉換的遊戲"""
+        rest = mask.copy()
+        hits = []
+        for outcome, condition in branches:
+            hit = rest & condition
+            # 每一步開始時為 -1，每個遊戲最多採用一個轉換，以加法取代遮罩賦值（隨機遮罩的賦值較慢）
+            self.outcome += hit * np.int16(outcome + 1)
+            rest ^= hit
+            hits.append(hit)
+        return hits
+
+    def _give(self, mask: np.ndarray, item: int):
+        """將物品加入物品欄"""
+        if self.order is not None:
+            rows = np.flatnonzero(mask)
+            self.order[rows, self.inventory[rows].sum(axis = 1)] = item
+        self.inventory[:, item] += mask
+
+    def _take(self, mask: np.ndarray, items: np.ndarray):
+        """從物品欄移除物品（items 為每個遊戲移除的物品編號，與 list.remove() 相同只移除第一個）"""
+        rows = np.flatnonzero(mask)
+        self.inventory[rows, items[rows]] -= 1
+        if self.order is not None and len(rows):
+            order = self.order[rows]
+            position = np.argmax(order == items[rows, None], axis = 1)
+            shifted = np.concatenate((order[:, 1:], np.full((len(rows), 1), -1, dtype = order.dtype)), axis = 1)
+            self.order[rows] = np.where(np.arange(MAX_ITEMS) >= position[:, None], shifted, order)
+
+    def _move(self, mask: np.ndarray, arg: np.ndarray):
+        """移動：地點合法、不是目前的地點且教室已打開"""
+        c_here = arg == self.c_location
+        *_, with_ac, with_a, with_b, with_c, alone = self._branch(mask, [
+            (rule("move", "地點不存在"), arg < 0),
+            (rule("move", "已在該地點"), arg == self.location),
+            (rule("move", "教室上鎖"), ~self.open_classroom),
+            (rule("move", "遇見 A、C"), (arg == self.a_location) & c_here),
+            (rule("move", "遇見 A"), arg == self.a_location),
+            (rule("move", "遇見 B"), arg == self.b_location),
+            (rule("move", "遇見 C"), c_here),
+            (rule("move", "移動"), True),
+        ])
+        moved = with_ac | with_a | with_b | with_c | alone
+        self.location[moved] = arg[moved]
+        self.health[moved] -= 1
+
+    def _explore(self, mask: np.ndarray):
+        """探索：消耗體力，依地點取得物品"""
+        inventory = self.inventory
+        classroom, library, shop = (self.location == CLASSROOM), (self.location == LIBRARY), (self.location == SHOP)
+        key, microphone, _, will, _, bread, _, _ = self._branch(mask, [
+            (rule("explore", "找到鑰匙"), classroom & ~self.open_classroom),
+            (rule("explore", "找到麥克風"), classroom & ~self.find_microphone & (self.a_talk == 4)),
+            (rule("explore", "沒有發現", location = "教室"), classroom),
+            (rule("explore", "找到遺書"), library & (self.sanity == 1) & (inventory[:, A_QUESTION] > 0) & (inventory[:, B_QUESTION] > 0)),
+            (rule("explore", "沒有發現", location = "圖書館"), library),
+            (rule("explore", "找到麵包"), shop & (inventory[:, BREAD] == 0) & (self.num_bread > 0)),
+            (rule("explore", "沒有發現", location = "福利社"), shop),
+            (rule("explore", "沒有發現", location = None), True),
+        ])
+        self.health[mask] -= 1
+        self._give(key, KEY)
+        self.find_microphone[microphone] = True
+        self._give(will, WILL)
+        self.num_bread[bread] -= 1
+        self._give(bread, BREAD)
+
+    def _talk(self, mask: np.ndarray, arg: np.ndarray):
+        """對話：只能與同一地點的 NPC 交談"""
+        a = (arg == NPC_A) & (self.location == self.a_location)
+        b = (arg == NPC_B) & (self.location == self.b_location)
+        c = (arg == NPC_C) & (self.location == self.c_location)
+        listening = a & ~self.a_collapsed & ~self.a_wait
+        hits = self._branch(mask, [
+            (rule("talk", "對象不存在"), arg < 0),
+            (rule("talk", "A 崩潰"), a & self.a_collapsed),
+        ] + [
+            (rule("talk", f"A 的第 {count} 個請求"), listening & (self.a_talk == count - 1)) for count in range(1, 6)
+        ] + [
+            (rule("talk", "A 沒有更多請求"), listening),
+        ] + [
+            (rule("talk", f"與 B 的第 {count} 次談話"), b & (self.b_talk == count - 1)) for count in range(1, 6)
+        ] + [
+            (rule("talk", "B 沒有更多話題"), b),
+            (rule("talk", "與 C 談話"), c),
+            (rule("talk", "對象不在這裡"), True),
+        ])
+        requests, a_talked = hits[2:7], hits[2] | hits[3] | hits[4] | hits[5] | hits[6] | hits[7]
+        b_talks, b_talked = hits[8:13], hits[8] | hits[9] | hits[10] | hits[11] | hits[12] | hits[13]
+
+        # A：提出新的請求並等待回覆（請求用完時只增加對話次數）
+        self.a_talk[a_talked] += 1
+        self.c_other[a_talked] += 1
+        for request in requests:
+            self.a_wait[request] = True
+
+        # B：第二到四次談話降低玩家與 B 的理智，第四次讓 A 崩潰
+        self.b_talk[b_talked] += 1
+        self.c_other[b_talked] += 1
+        hurt = b_talks[1] | b_talks[2] | b_talks[3]
+        self.sanity[hurt] -= 1
+        self.b_sanity[hurt] -= 1
+        self.a_sanity[b_talks[3]] = 0
+
+        # C：重設與他人對話的次數
+        self.c_other[hits[14]] = 0
+
+    def _use(self, mask: np.ndarray, arg: np.ndarray):
+        """使用物品：持有該物品且在正確的地點"""
+        rows = np.arange(self.size)
+        held = arg >= 0
+        held[held] = self.inventory[rows[held], arg[held]] > 0
+        location = self.location
+        at_a, at_c = location == self.a_location, location == self.c_location
+
+        (_, key, bread, exam, notice, book, microphone, cash, coffee,
+         a_dodge, a_stare, b_dodge, b_stare, remember, reveal, _) = self._branch(mask, [
+            (rule("use", "沒有該物品"), ~held),
+            (rule("use", "打開教室"), (arg == KEY) & (location == CLASSROOM)),
+            (rule("use", "恢復體力"), arg == BREAD),
+            (rule("use", "放考卷"), (arg == EXAM) & (location == CLASSROOM)),
+            (rule("use", "宣布公告"), (arg == NOTICE) & (location == CLASSROOM)),
+            (rule("use", "歸還書籍"), (arg == BOOK) & (location == LIBRARY)),
+            (rule("use", "交還麥克風"), (arg == MICROPHONE) & at_a),
+            (rule("use", "買咖啡"), (arg == CASH) & (location == SHOP)),
+            (rule("use", "交給 A 咖啡"), (arg == COFFEE) & at_a),
+            (rule("use", "第一次向 C 提問", target = "A 的疑問"), (arg == A_QUESTION) & at_c & ~self.ask_c),
+            (rule("use", "再次向 C 提問", target = "A 的疑問"), (arg == A_QUESTION) & at_c),
+            (rule("use", "第一次向 C 提問", target = "B 的疑問"), (arg == B_QUESTION) & at_c & ~self.ask_c),
+            (rule("use", "再次向 C 提問", target = "B 的疑問"), (arg == B_QUESTION) & at_c),
+            (rule("use", "想起一切"), (arg == WILL) & (location == CLASSROOM) & (self.sanity == 1)),
+            (rule("use", "C 露出真面目"), arg == WILL),
+            (rule("use", "沒有作用"), True),
+        ])
+
+        # 使用後移除的物品（之後才加入換得的物品，與 rules.py 的順序相同）
+        self._take(key | bread | exam | notice | book | microphone | cash | coffee | a_dodge | b_dodge, arg)
+        self.open_classroom[key] = True
+        self.health[bread] = np.minimum(self.health[bread] + 3, 10)
+        self.sanity[notice] -= 1
+        self._give(microphone, A_QUESTION)
+        self.sanity[microphone] -= 1
+        self._give(cash, COFFEE)
+
+        # 向 C 提出疑問：第一次只會被轉移話題，之後 C 露出真面目
+        self.ask_c[a_dodge | b_dodge] = True
+        self.c_true[a_stare | b_stare] = True
+
+        # 遺書：理智為 1 且在教室時想起一切，否則 C 出現並露出真面目
+        self.remember[remember] = True
+        self.c_true[reveal] = True
+        self.c_location[reveal] = location[reveal]
+
+    def _choose(self, mask: np.ndarray, arg: np.ndarray):
+        """回覆 A 的請求（沒有符合的請求時為無法理解的指令，正常遊玩不會發生）"""
+        accept = arg == ACCEPT
+        hits = self._branch(mask, [
+            (rule("choose", "沒有請求"), ~self.a_wait),
+        ] + [
+            (rule("choose", f"接受第 {count} 個請求"), accept & (self.a_talk == count)) for count in range(1, 6)
+        ] + [
+            (rule("choose", "拒絕請求"), ~accept),
+            (len(OUTCOMES) - 1, True),
+        ])
+        accepted, rejected = hits[1:6], hits[6]
+        for count, hit in enumerate(accepted, 1):
+            self.a_wait[hit] = False
+            self.a_help[hit] += 1
+            if count in A_GIFTS:
+                self._give(hit, A_GIFTS[count])
+        self.a_wait[rejected] = False
+        self.a_sanity[rejected] -= 1
+
+    def _check(self, mask: np.ndarray):
+        """與 GameEngine 的 _check_* 相同（依序檢查，後面的結局會覆蓋前面的結局）"""
+        def end(condition: np.ndarray, ending: int):
+            self.game_over[condition] = True
+            self.ending[condition] = ending
+
+        # 玩家
+        end(mask & self.remember, 1)
+        end(mask & (self.health <= 0), 2)
+        end(mask & (self.sanity <= 0), 3)
+
+        # A
+        self.a_collapsed[mask & (self.a_sanity <= 0)] = True
+        end(mask & ((self.a_talk >= 5) | (self.a_help >= 3)), 4)
+
+        # B
+        self.b_collapsed[mask & (self.b_sanity <= 0)] = True
+        end(mask & (self.b_talk >= 5), 4)
+
+        # C
+        lonely = mask & (self.c_other == 3)
+        self.c_sanity[lonely] -= 1
+        self.c_other[lonely] = 0
+        collapsed = mask & (self.c_sanity <= 0)
+        self.c_collapsed[collapsed] = True
+        end(collapsed, 5)
+        end(mask & self.c_true, 6)
+
+    def row(self, i: int) -> Tuple:
+        """第 i 個遊戲的狀態（與 project() 的格式相同）"""
+        return (
+            LOCATIONS[self.location[i]], int(self.health[i]), int(self.sanity[i]), bool(self.remember[i]),
+            int(self.a_sanity[i]), bool(self.a_wait[i]), int(self.a_help[i]), int(self.a_talk[i]), bool(self.a_collapsed[i]),
+            int(self.b_sanity[i]), int(self.b_talk[i]), bool(self.b_collapsed[i]),
+            LOCATIONS[self.c_location[i]], int(self.c_sanity[i]), int(self.c_other[i]), bool(self.c_collapsed[i]), bool(self.c_true[i]),
+            tuple(int(count) for count in self.inventory[i]),
+            bool(self.open_classroom[i]), bool(self.find_microphone[i]), int(self.num_bread[i]), bool(self.ask_c[i]),
+            bool(self.game_over[i]), ENDINGS[self.ending[i] - 1] if self.ending[i] else None
+        )
+
+    def state(self, i: int) -> GameState:
+        """第 i 個遊戲的狀態轉換為 GameState（未記錄取得順序時，物品欄依 ITEMS 的順序排列）"""
+        (location, health, sanity, remember, a_sanity, a_wait, a_help, a_talk, a_collapsed, b_sanity, b_talk, b_collapsed,
+         c_location, c_sanity, c_other, c_collapsed, c_true, counts, open_classroom, find_microphone, num_bread, ask_c, game_over, ending) = self.row(i)
+        state = GameState()
+        state.player_location, state.player_health, state.player_sanity, state.player_remember = location, health, sanity, remember
+        state.npc_a.sanity, state.npc_a.wait_for_response, state.npc_a.help_count, state.npc_a.talk_count, state.npc_a.collapsed = a_sanity, a_wait, a_help, a_talk, a_collapsed
+        state.npc_b.sanity, state.npc_b.talk_count, state.npc_b.collapsed = b_sanity, b_talk, b_collapsed
+        state.npc_c.location, state.npc_c.sanity, state.npc_c.other_talk_count, state.npc_c.collapsed, state.npc_c.true_color = c_location, c_sanity, c_other, c_collapsed, c_true
+        order = self.order[i] if self.order is not None else self._order()[i]
+        state.inventory = [ITEMS[item] for item in order if item >= 0]
+        state.open_classroom, state.find_microphone, state.num_bread, state.ask_c = open_classroom, find_microphone, num_bread, ask_c
+        state.game_over, state.ending = game_over, ending
+        return state
+
+    def result(self, i: int, before: GameState, command: Dict[str, Any]) -> Tuple[str, bool]:
+        """第 i 個遊戲上一步的結果文字與是否需要 LLM 生成敘事（結果文字在狀態變更前產生，before 為執行前的 state(i)）"""
+        transition = OUTCOMES[self.outcome[i]]
+        result = transition.result
+        if not isinstance(result, str):
+            result = result(before, command.get(ARGUMENT_KEYS.get(command["action"], "")))
+        return result, transition.llm
+
+    def histogram(self) -> Dict[str, int]:
+        """結局分布（None 代表尚未結束）"""
+        counts = np.bincount(self.ending, minlength = len(ENDINGS) + 1)
+        histogram = {ending: int(counts[i + 1]) for i, ending in enumerate(ENDINGS)}
+        histogram["None"] = int(counts[0])
+        return histogram
+
+def project(state: GameState) -> Tuple:
+    """將 GameState 轉換為與 BatchSimulator.row() 相同的格式"""
+    a, b, c = state.npc_a, state.npc_b, state.npc_c
+    return (
+        state.player_location, state.player_health, state.player_sanity, state.player_remember,
+        a.sanity, a.wait_for_response, a.help_count, a.talk_count, a.collapsed,
+        b.sanity, b.talk_count, b.collapsed,
+        c.location, c.sanity, c.other_talk_count, c.collapsed, c.true_color,
+        tuple(state.inventory.count(item) for item in ITEMS),
+        state.open_classroom, state.find_microphone, state.num_bread, state.ask_c,
+        state.game_over, state.ending
+    )
+
+class RandomPolicy:
+    """隨機策略：每一步從所有指令中均勻選擇"""
+    def __init__(self, commands: int, seed: Optional[int] = None):
+        self.commands = commands
+        self.rng = np.random.default_rng(seed)
+
+    def __call__(self, turn: int, size: int) -> np.ndarray:
+        return self.rng.integers(0, self.commands, size = size, dtype = np.int16)
+
+class ScriptedPolicy(RandomPolicy):
+    """腳本策略：依序執行腳本中的指令，以 epsilon 的機率改為隨機指令，腳本結束後隨機選擇"""
+    def __init__(self, commands: List[Dict[str, Any]], script: List[str], epsilon: float = 0.0, seed: Optional[int] = None):
+        super().__init__(len(commands), seed)
+        names = [describe(command) for command in commands]
+        self.script = [names.index(name) for name in script]
+        self.epsilon = epsilon
+
+    def __call__(self, turn: int, size: int) -> np.ndarray:
+        actions = super().__call__(turn, size)
+        if turn < len(self.script):
+            scripted = self.rng.random(size) >= self.epsilon
+            actions[scripted] = self.script[turn]
+        return actions
+
+def simulate(games: int, steps: int, policy = None, seed: Optional[int] = None) -> Dict[str, Any]:
+    """以指定策略模擬，回傳結局分布與吞吐量"""
+    simulator = BatchSimulator(games)
+    policy = policy or RandomPolicy(len(simulator.commands), seed)
+
+    simulated = 0
+    start_time = time.perf_counter()
+    for turn in range(steps):
+        alive = int((~simulator.game_over).sum())
+        if alive == 0:
+            break
+        simulator.step(policy(turn, games))
+        simulated += alive
+    elapsed = time.perf_counter() - start_time
+
+    finished = simulator.game_over
+    return {
+        "games": games,
+        "steps": simulated,
+        "elapsed": elapsed,
+        "steps_per_second": simulated / elapsed if elapsed else 0.0,
+        "mean_turns": float(simulator.turns[finished].mean()) if finished.any() else None,
+        "endings": simulator.histogram()
+    }
+
+def verify(games: int = 1000, steps: int = 80, seed: Optional[int] = 0) -> List[str]:
+    """以相同的隨機指令執行 BatchSimulator 與 GameEngine，逐步比對狀態、結果文字與是否需要 LLM，回傳不一致之處（空列表代表一致）"""
+    simulator = BatchSimulator(games, ordered = True)
+    policy = RandomPolicy(len(simulator.commands), seed)
+    engines = [GameEngine(logger = lambda level, message: None) for _ in range(games)]
+    history: List[List[str]] = [[] for _ in range(games)]
+
+    mismatches = []
+    for turn in range(steps):
+        actions = policy(turn, games)
+        alive = np.flatnonzero(~simulator.game_over)
+        before = {i: simulator.state(i) for i in alive}
+        simulator.step(actions)
+        for i in alive:
+            command = simulator.commands[actions[i]]
+            engine = engines[i]
+            engine.llm_response = True
+            result = engine.execute_action(dict(command))
+            history[i].append(describe(command))
+            expected = (project(engine.state), result, engine.llm_response)
+            actual = (simulator.row(i),) + simulator.result(i, before[i], command)
+            if expected != actual:
+                mismatches.append(f"第 {i} 個遊戲：{' → '.join(history[i])}\nGameEngine：{expected}\n模擬器：{actual}")
+                # 不再比對這個遊戲，避免同一個差異重複回報
+                simulator.game_over[i] = True
+    return mismatches
+
+def main():
+    """主程式"""
+    parser = argparse.ArgumentParser(description = "向量化的蒙地卡羅遊戲模擬")
+    parser.add_argument("--games", type = int, default = 100000, help = "同時模擬的遊戲數")
+    parser.add_argument("--steps", type = int, default = 200, help = "每個遊戲最多的步數")
+    parser.add_argument("--seed", type = int, help = "隨機種子")
+    parser.add_argument("--script", help = "腳本策略的 JSON 檔案（指令列表，如 [\"explore\", \"use:鑰匙\"]）")
+    parser.add_argument("--epsilon", type = float, default = 0.0, help = "腳本策略改為隨機指令的機率")
+    parser.add_argument("--verify", action = "store_true", help = "與 GameEngine 逐步比對規則是否一致（使用 --games、--steps 與 --seed）")
+    args = parser.parse_args()
+
+    if args.verify:
+        mismatches = verify(args.games, args.steps, args.seed)
+        for mismatch in mismatches[:10]:
+            print(mismatch)
+        print(f"不一致：{len(mismatches)}")
+        raise SystemExit(1 if mismatches else 0)
+
+    policy = None
+    if args.script:
+        with open(args.script, "r", encoding = "utf-8") as f:
+            policy = ScriptedPolicy(all_commands(), json.load(f), epsilon = args.epsilon, seed = args.seed)
+    report = simulate(args.games, args.steps, policy = policy, seed = args.seed)
+
+    print(f"遊戲數：{report['games']}，總步數：{report['steps']}，耗時：{report['elapsed']:.2f} 秒，每秒 {report['steps_per_second']:,.0f} 步")
+    if report["mean_turns"] is not None:
+        print(f"平均回合數：{report['mean_turns']:.1f}")
+    for ending, count in report["endings"].items():
+        print(f"{ending}：{count}（{count / report['games']:.2%}）")
+
+if __name__ == "__main__":
+    main()
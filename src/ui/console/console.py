@@ -4,20 +4,32 @@ Console UI 實作：
      2. 設定 API 資訊
      3. 顯示標題、開場、狀態、結尾
      4. 控制遊戲流程
+     5. 逐段顯示串流的故事文本
+     6. 存檔（輸入「save」或「存檔」）與開始時讀取存檔
 """
 
+import os
 import sys
 
 from src.repository.game_assemble import GameAssemble
 from src.ui.console.colors import Color
 
+# 存檔路徑
+SAVE_PATH = "console.sav"
+
 class ConsoleUI:
     """Console 版使用者介面"""
-    def __init__(self):
+    def __init__(self, save_path: str = SAVE_PATH):
         self.game = None
+        self.line_open = False  # 串流文本尚未換行
+        self.save_path = save_path
+        self.loaded = False     # 是否由存檔繼續遊戲
 
     def console_logger(self, level: str, message: str):
         """Console 日誌方法"""
+        if self.line_open:
+            print()
+            self.line_open = False
         if level == "【ENGINE】":
             Color.print_colored(f"{level}　{message}", Color.RED)
         elif level == "【API】":
@@ -26,6 +38,8 @@ class ConsoleUI:
             Color.print_colored(f"{level}　{message}", Color.YELLOW)
         elif level == "【NARRATOR】":
             Color.print_colored(f"{level}　{message}", Color.BLUE)
+        elif level == "【FUSED】":
+            Color.print_colored(f"{level}　{message}", Color.YELLOW + Color.BOLD)
         elif level == "【PROCESS】":
             Color.print_colored(f"{level}　{message}", Color.MAGENTA)
 
@@ -48,7 +62,26 @@ class ConsoleUI:
         # 建立遊戲
         self.game = GameAssemble(api_key = api_key, api_url = api_url, logger = self.console_logger)
         print()
-        input("按 Enter 開始遊戲...")
+        if os.path.exists(self.save_path) and input("發現存檔，是否繼續上次的遊戲？（y / n）：").strip().lower() == "y":
+            self.load_game()
+        else:
+            input("按 Enter 開始遊戲...")
+
+    def save_game(self):
+        """存檔"""
+        with open(self.save_path, "wb") as f:
+            f.write(self.game.save())
+        Color.print_colored(f"已存檔至 {self.save_path}。", Color.CYAN)
+
+    def load_game(self):
+        """讀取存檔"""
+        try:
+            with open(self.save_path, "rb") as f:
+                self.game.load(f.read())
+            self.loaded = True
+            Color.print_colored("已讀取存檔。", Color.CYAN)
+        except (OSError, ValueError) as e:
+            Color.print_colored(f"【CONSOLE】　無法讀取存檔。\n錯誤訊息：{e}", Color.CYAN)
 
     def show_intro(self):
         """顯示開場"""
@@ -60,7 +93,7 @@ class ConsoleUI:
         state = self.game.engine.state.get_state_dict()
         self.show_status(state)
 
-        Color.print_colored("可以輸入文字來進行操作（如：「去圖書館」、「和 A 聊天」、「吃麵包」，輸入「exit」或「結束」則結束遊戲）。", Color.CYAN)
+        Color.print_colored("可以輸入文字來進行操作（如：「去圖書館」、「和 A 聊天」、「吃麵包」，輸入「save」或「存檔」則存檔，輸入「exit」或「結束」則結束遊戲）。", Color.CYAN)
 
     def show_status(self, state: dict):
         """顯示狀態"""
@@ -69,6 +102,15 @@ class ConsoleUI:
 
         Color.print_colored(status_text, Color.YELLOW)
 
+    def print_story(self, chunks):
+        """逐段印出串流的文本"""
+        for chunk in chunks:
+            if chunk:
+                print(f"{Color.WHITE}{chunk}{Color.RESET}", end = "", flush = True)
+                self.line_open = True
+        print()
+        self.line_open = False
+
     def show_ending(self, ending: str):
         ending_text = self.game.get_ending_text(ending)
         print()
@@ -88,10 +130,13 @@ class ConsoleUI:
                 if user_input.lower in ["exit", "quit", "退出", "結束"]:
                     Color.print_colored("\n遊戲結束。", Color.CYAN)
                     break
+                if user_input.lower() in ["save", "存檔"]:
+                    self.save_game()
+                    continue
 
                 print()
-                result = self.game.process_input(user_input)
-                Color.print_colored(result["story"], Color.WHITE)
+                result = self.game.process_input_stream(user_input)
+                self.print_story(result["story"])
                 print()
                 if not result["game_over"]:
                     self.show_status(result["game_state"])
@@ -113,8 +158,14 @@ class ConsoleUI:
         """執行程式"""
         self.show_title()
         self.setup_game()
-        self.show_intro()
-        self.game_loop()
+        try:
+            if self.loaded:
+                self.show_status(self.game.engine.state.get_state_dict())
+            else:
+                self.show_intro()
+            self.game_loop()
+        finally:
+            self.game.close()
 
 def main():
     """主程式"""
@@ -0,0 +1,405 @@
+"""
+伺服器介面（HTTP / WebSocket，只使用標準函式庫）：
+    1. 在同一個程序中進行多場遊戲，所有 LLM 呼叫經過共用且限制同時進行數的 Agent 池
+    2. HTTP JSON API：建立遊戲、送出輸入、復原、查詢狀態、刪除遊戲、統計資訊
+    3. WebSocket：連線後每則文字訊息為一次玩家輸入，回覆該回合的結果（附上輸入；回合進行中送出的輸入由回合排程合併或拒絕）
+    4. 定期將閒置的遊戲移出記憶體
+    5. 啟動時載入存檔（遊戲在使用時才還原），關閉時（Ctrl+C 或 SIGTERM）將所有遊戲寫回存檔
+    6. 將所有遊戲的回合寫入同一個回合日誌（以 python -m src.tools.replay 重播）
+    7. 可指定敘事快取的檔案，啟動時預熱、關閉時寫回
+
+API：
+    POST   /sessions                 建立遊戲，回傳遊戲編號與開場文本
+    GET    /sessions/{id}            遊戲狀態
+    POST   /sessions/{id}/turns      送出玩家輸入（{"input": "去圖書館"}）
+    POST   /sessions/{id}/undo       復原上一回合
+    DELETE /sessions/{id}            刪除遊戲
+    GET    /sessions/{id}/ws         WebSocket
+    GET    /stats                    統計資訊
+    GET    /metrics                  Prometheus 文字格式的統計（啟用 --metrics 或 --trace 時）
+
+執行方式：python -m src.ui.server.server [--host 127.0.0.1] [--port 8765] [--max-concurrency 4] [--save-dir DIR] [--savefile FILE] [--journal FILE] [--narration-cache FILE] [--metrics] [--trace FILE]
+"""
+
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import signal
+from typing import Optional, Dict, Any, List, Tuple, Union
+
+from src.repository.journal import TurnJournal
+from src.repository.llm.batcher import RequestBatcher
+from src.repository.llm.cache import NarrationCache
+from src.repository.llm.narrator import NarratorAgent
+from src.repository.llm.parser import ParserAgent
+from src.repository.llm.pool import AgentPool
+from src.repository.llm.resilience import ResiliencePolicy, CircuitBreaker
+from src.repository.session_manager import SessionManager
+from src.repository.telemetry import TELEMETRY
+
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+MAX_BODY = 64 * 1024    # 請求內容的上限（位元組）
+REASONS = {200: "OK", 201: "Created", 204: "No Content", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large"}
+
+class HttpError(Exception):
+    """回傳錯誤狀態碼的例外"""
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+class GameServer:
+    """多場遊戲共用的 HTTP / WebSocket 伺服器"""
+    def __init__(self, manager: SessionManager, host: str = "127.0.0.1", port: int = 8765, evict_interval: float = 30.0, savefile: Optional[str] = None):
+        self.manager = manager
+        self.host = host
+        self.port = port
+        self.evict_interval = evict_interval    # 檢查閒置遊戲的間隔秒數
+        self.savefile = savefile                # 存檔路徑，None 代表不保存
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._evictor: Optional[asyncio.Task] = None
+
+    async def start(self):
+        """開始接受連線"""
+        if self.savefile is not None and os.path.exists(self.savefile):
+            self.manager.open_savefile(self.savefile)
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._evictor = asyncio.create_task(self.manager.run_evictor(self.evict_interval))
+        self.manager.logger("【SERVER】", f"伺服器啟動：http://{self.host}:{self.port}")
+
+    async def serve_forever(self):
+        """啟動並持續執行伺服器"""
+        await self.start()
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.close()
+
+    async def close(self):
+        """關閉伺服器與共用的連線池"""
+        if self._evictor is not None:
+            self._evictor.cancel()
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        if self.savefile is not None:
+            self.manager.dump(self.savefile)
+        await self.manager.aclose()
+
+    # ─── HTTP ───
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """處理一個連線（支援 keep-alive）"""
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+                method, path, headers, body = request
+                if headers.get("upgrade", "").lower() == "websocket":
+                    await self._websocket(path, headers, reader, writer)
+                    break
+                try:
+                    status, payload = await self._route(method, path, body)
+                except HttpError as e:
+                    status, payload = e.status, {"error": str(e)}
+                keep_alive = headers.get("connection", "").lower() != "close"
+                await self._write_response(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except HttpError as e:
+            await self._write_response(writer, e.status, {"error": str(e)}, False)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _read_request(reader: asyncio.StreamReader) -> Optional[Tuple[str, str, Dict[str, str], bytes]]:
+        """讀取一個 HTTP 請求（連線結束時回傳 None）"""
+        line = await reader.readline()
+        if not line:
+            return None
+        try:
+            method, path, _ = line.decode("latin-1").split(" ", 2)
+        except ValueError:
+            raise HttpError(400, "無法解析請求。")
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        try:
+            length = int(headers.get("content-length", 0) or 0)
+        except ValueError:
+            raise HttpError(400, "無效的 Content-Length。")
+        if length < 0:
+            raise HttpError(400, "無效的 Content-Length。")
+        if length > MAX_BODY:
+            raise HttpError(413, "請求內容過大。")
+        body = await reader.readexactly(length) if length else b""
+        return method.upper(), path.split("?", 1)[0], headers, body
+
+    @staticmethod
+    async def _write_response(writer: asyncio.StreamWriter, status: int, payload: Union[None, str, Dict[str, Any]], keep_alive: bool):
+        """寫入回應（字串為純文字，其他為 JSON）"""
+        if isinstance(payload, str):
+            body, content_type = payload.encode("utf-8"), "text/plain; version=0.0.4; charset=utf-8"
+        else:
+            body, content_type = b"" if payload is None else json.dumps(payload, ensure_ascii = False).encode("utf-8"), "application/json; charset=utf-8"
+        head = [
+            f"HTTP/1.1 {status} {REASONS.get(status, '')}",
+            f"Content-Type: {content_type}",
+            f"Content-Length: {len(body)}",
+            f"Connection: {'keep-alive' if keep_alive else 'close'}"
+        ]
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+        await writer.drain()
+
+    @staticmethod
+    def _parse_json(body: bytes) -> Dict[str, Any]:
+        """解析請求內容"""
+        try:
+            data = json.loads(body or b"{}")
+        except json.JSONDecodeError:
+            raise HttpError(400, "請求內容不是 JSON。")
+        if not isinstance(data, dict):
+            raise HttpError(400, "請求內容必須是 JSON 物件。")
+        return data
+
+    def _session(self, session_id: str):
+        """取得遊戲，不存在時回傳 404"""
+        try:
+            return self.manager.get(session_id)
+        except KeyError:
+            raise HttpError(404, "遊戲不存在。")
+
+    async def _route(self, method: str, path: str, body: bytes) -> Tuple[int, Union[None, str, Dict[str, Any]]]:
+        """依路徑處理請求，回傳狀態碼與回應內容"""
+        parts = [part for part in path.split("/") if part]
+
+        if parts == ["metrics"] and TELEMETRY.enabled:
+            if method != "GET":
+                raise HttpError(405, "不支援的方法。")
+            return 200, TELEMETRY.render_prometheus()
+
+        if parts == ["stats"]:
+            if method != "GET":
+                raise HttpError(405, "不支援的方法。")
+            return 200, self.manager.stats()
+
+        if parts == ["sessions"]:
+            if method != "POST":
+                raise HttpError(405, "不支援的方法。")
+            session = self.manager.create()
+            return 201, {"session_id": session.session_id, "intro": session.game.get_intro_text(), "game_state": session.game.engine.state.get_state_dict()}
+
+        if len(parts) == 2 and parts[0] == "sessions":
+            if method == "GET":
+                return 200, self._status(self._session(parts[1]))
+            if method == "DELETE":
+                if not self.manager.delete(parts[1]):
+                    raise HttpError(404, "遊戲不存在。")
+                return 204, None
+            raise HttpError(405, "不支援的方法。")
+
+        if len(parts) == 3 and parts[0] == "sessions" and parts[2] in ("turns", "undo"):
+            if method != "POST":
+                raise HttpError(405, "不支援的方法。")
+            session = self._session(parts[1])
+            if parts[2] == "undo":
+                success = await self.manager.undo(session.session_id)
+                return 200, dict(self._status(session), success = success)
+            user_input = self._parse_json(body).get("input")
+            if not isinstance(user_input, str) or not user_input.strip():
+                raise HttpError(400, "缺少玩家輸入（input）。")
+            return 200, await self._turn(session.session_id, user_input.strip())
+
+        raise HttpError(404, "路徑不存在。")
+
+    @staticmethod
+    def _status(session) -> Dict[str, Any]:
+        """遊戲狀態"""
+        state = session.game.engine.state
+        return {"session_id": session.session_id, "turns": session.turns, "game_state": state.get_state_dict(), "game_over": state.game_over, "ending": state.ending}
+
+    async def _turn(self, session_id: str, user_input: str) -> Dict[str, Any]:
+        """處理一回合，遊戲結束時附上結局文本"""
+        turn = await self.manager.process(session_id, user_input)
+        if turn["game_over"]:
+            turn["ending_text"] = self.manager.get(session_id).game.get_ending_text(turn["ending"])
+        return turn
+
+    # ─── WebSocket ───
+
+    async def _websocket(self, path: str, headers: Dict[str, str], reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """WebSocket 連線：每則文字訊息為一次玩家輸入，回覆 JSON 格式的回合結果"""
+        parts = [part for part in path.split("/") if part]
+        key = headers.get("sec-websocket-key")
+        if len(parts) != 3 or parts[0] != "sessions" or parts[2] != "ws" or key is None:
+            raise HttpError(400, "無效的 WebSocket 請求。")
+        session = self._session(parts[1])
+
+        accept = base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode("latin-1")).digest()).decode("latin-1")
+        writer.write(("HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                      f"Sec-WebSocket-Accept: {accept}\r\n\r\n").encode("latin-1"))
+        await writer.drain()
+
+        # 每則輸入各自處理，不等待上一回合完成即繼續讀取，讓回合排程合併輸入並取消被放棄的敘事
+        write_lock = asyncio.Lock()
+        tasks = set()
+        try:
+            while True:
+                opcode, payload = await self._read_frame(reader)
+                if opcode == 0x8:
+                    async with write_lock:
+                        await self._write_frame(writer, 0x8, payload[:2])
+                    return
+                if opcode == 0x9:
+                    async with write_lock:
+                        await self._write_frame(writer, 0xA, payload)
+                    continue
+                if opcode != 0x1:
+                    continue
+                # 無法解碼的訊息只回覆錯誤，不中斷連線（避免取消進行中的回合）
+                try:
+                    user_input = payload.decode("utf-8").strip()
+                except UnicodeDecodeError:
+                    error = "訊息不是有效的 UTF-8 文字。"
+                else:
+                    error = None if user_input else "缺少玩家輸入。"
+                if error is not None:
+                    async with write_lock:
+                        await self._write_frame(writer, 0x1, json.dumps({"error": error}, ensure_ascii = False).encode("utf-8"))
+                    continue
+                task = asyncio.create_task(self._websocket_turn(session.session_id, user_input, writer, write_lock))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        finally:
+            # 連線結束時取消尚未完成的回合（等待中的輸入移出排程，進行中的敘事停止呼叫 LLM）
+            for task in tasks:
+                task.cancel()
+
+    async def _websocket_turn(self, session_id: str, user_input: str, writer: asyncio.StreamWriter, write_lock: asyncio.Lock):
+        """處理 WebSocket 的一則輸入並回覆（遊戲在連線期間被刪除時關閉連線）"""
+        try:
+            turn = await self._turn(session_id, user_input)
+        except KeyError:
+            async with write_lock:
+                await self._write_frame(writer, 0x1, json.dumps({"error": "遊戲不存在。"}, ensure_ascii = False).encode("utf-8"))
+                await self._write_frame(writer, 0x8, (1000).to_bytes(2, "big"))
+            return
+        turn["input"] = user_input
+        async with write_lock:
+            await self._write_frame(writer, 0x1, json.dumps(turn, ensure_ascii = False).encode("utf-8"))
+
+    @staticmethod
+    async def _read_frame(reader: asyncio.StreamReader) -> Tuple[int, bytes]:
+        """讀取一則訊息（合併分段的訊息），回傳 opcode 與內容"""
+        opcode = None
+        chunks = []
+        while True:
+            first, second = await reader.readexactly(2)
+            length = second & 0x7F
+            if length == 126:
+                length = int.from_bytes(await reader.readexactly(2), "big")
+            elif length == 127:
+                length = int.from_bytes(await reader.readexactly(8), "big")
+            if length > MAX_BODY:
+                raise ConnectionError("WebSocket 訊息過大。")
+            mask = await reader.readexactly(4) if second & 0x80 else None
+            payload = await reader.readexactly(length)
+            if mask is not None and length:
+                # 以整數一次完成 XOR，避免逐位元組處理
+                repeated = (mask * (length // 4 + 1))[:length]
+                payload = (int.from_bytes(payload, "big") ^ int.from_bytes(repeated, "big")).to_bytes(length, "big")
+
+            frame_opcode = first & 0x0F
+            if frame_opcode >= 0x8:
+                # 控制訊息不會分段，可以夾在分段的訊息之間
+                return frame_opcode, payload
+            if frame_opcode != 0x0:
+                opcode = frame_opcode
+            chunks.append(payload)
+            if first & 0x80:
+                return opcode, b"".join(chunks)
+
+    @staticmethod
+    async def _write_frame(writer: asyncio.StreamWriter, opcode: int, payload: bytes):
+        """寫入一則不分段的訊息（伺服器送出的訊息不加遮罩）"""
+        length = len(payload)
+        if length < 126:
+            header = bytes((0x80 | opcode, length))
+        elif length < 1 << 16:
+            header = bytes((0x80 | opcode, 126)) + length.to_bytes(2, "big")
+        else:
+            header = bytes((0x80 | opcode, 127)) + length.to_bytes(8, "big")
+        writer.write(header + payload)
+        await writer.drain()
+
+def main(argv: Optional[List[str]] = None):
+    """主程式（argv 為 None 時使用命令列參數）"""
+    parser = argparse.ArgumentParser(description = "以伺服器模式執行遊戲")
+    parser.add_argument("--host", default = "127.0.0.1", help = "監聽的位址（預設只接受本機連線）")
+    parser.add_argument("--port", type = int, default = 8765, help = "監聽的連接埠")
+    parser.add_argument("--api-url", help = "API 網址（未指定時由輸入取得）")
+    parser.add_argument("--api-key", help = "API Key（未指定時由輸入取得）")
+    parser.add_argument("--max-concurrency", type = int, default = 4, help = "同時進行的 LLM 呼叫上限")
+    parser.add_argument("--max-per-session", type = int, default = 1, help = "單一遊戲同時進行的 LLM 呼叫上限")
+    parser.add_argument("--batch-window-ms", type = float, default = 5.0, help = "收集 LLM 請求的時間窗（毫秒）")
+    parser.add_argument("--batch-size", type = int, default = 8, help = "每批最多的 LLM 請求數（0 代表不使用批次處理）")
+    parser.add_argument("--parser-deadline", type = float, default = ParserAgent.DEADLINE, help = "Parser 每次呼叫 LLM 的總期限（秒）")
+    parser.add_argument("--narrator-deadline", type = float, default = NarratorAgent.DEADLINE, help = "Narrator 每次呼叫 LLM 的總期限（秒）")
+    parser.add_argument("--max-idle", type = float, default = 600.0, help = "遊戲閒置多少秒後移出記憶體")
+    parser.add_argument("--max-sessions", type = int, help = "記憶體中最多保留的遊戲數")
+    parser.add_argument("--save-dir", help = "閒置遊戲的保存資料夾（未指定時保留在記憶體中）")
+    parser.add_argument("--savefile", help = "存檔路徑，啟動時載入、關閉時寫入所有遊戲")
+    parser.add_argument("--journal", help = "回合日誌（JSONL）的路徑，記錄每回合的輸入、指令與結果")
+    parser.add_argument("--narration-cache", help = "敘事快取（JSON）的路徑，啟動時預熱、關閉時寫回")
+    parser.add_argument("--turn-policy", choices = ["coalesce", "reject"], default = "coalesce", help = "回合進行中送出輸入時的處理方式（coalesce 只保留最新的輸入，reject 直接拒絕）")
+    parser.add_argument("--max-pending", type = int, default = 1, help = "每場遊戲最多等待中的輸入數（coalesce 時）")
+    parser.add_argument("--fused", action = "store_true", help = "啟用融合模式（一次 LLM 呼叫同時解析並生成敘事）")
+    parser.add_argument("--metrics", action = "store_true", help = "啟用統計，並於 /metrics 提供 Prometheus 文字格式")
+    parser.add_argument("--trace", help = "追蹤檔（JSONL）的路徑，指定時同時啟用統計")
+    args = parser.parse_args(argv)
+    if args.metrics or args.trace:
+        TELEMETRY.enable(trace_path = args.trace)
+
+    api_url = args.api_url if args.api_url is not None else input("請輸入 API 網址：").strip()
+    api_key = args.api_key if args.api_key is not None else input("請輸入 API Key：").strip()
+
+    async def run():
+        # SIGTERM 與 Ctrl+C 一樣取消主程式，經由相同的關閉流程寫回存檔（Windows 不支援時略過）
+        try:
+            asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+        except NotImplementedError:
+            pass
+        pool = AgentPool(max_concurrency = args.max_concurrency, max_per_session = args.max_per_session)
+        batcher = RequestBatcher(window_ms = args.batch_window_ms, max_batch = args.batch_size) if args.batch_size > 0 else None
+        breaker = CircuitBreaker()
+        parser_policy = ResiliencePolicy(deadline = args.parser_deadline, breaker = breaker)
+        narrator_policy = ResiliencePolicy(deadline = args.narrator_deadline, breaker = breaker)
+        journal = TurnJournal(args.journal) if args.journal else None
+        manager = SessionManager(api_url, api_key, pool = pool, batcher = batcher, parser_policy = parser_policy, narrator_policy = narrator_policy, directory = args.save_dir, max_idle = args.max_idle, max_sessions = args.max_sessions, fused = args.fused, journal = journal, turn_policy = args.turn_policy, max_pending = args.max_pending, narration_cache = NarrationCache(path = args.narration_cache) if args.narration_cache else None)
+        try:
+            await GameServer(manager, host = args.host, port = args.port, savefile = args.savefile).serve_forever()
+        finally:
+            if journal is not None:
+                journal.close()
+
+    try:
+        asyncio.run(run())
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        pass
+    finally:
+        TELEMETRY.disable()
+
+if __name__ == "__main__":
+    main()
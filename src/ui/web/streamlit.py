@@ -3,12 +3,28 @@ Streamlit UI 實作：
     1. Streamlit 日誌方法，用於確認功能是否正常運行
     2. 設定 Streamlit 頁面框架、樣式、儲存資訊（Session state）
     3. 設定個元件位置與功能（）
+    4. 下載與讀取存檔（遊戲狀態與對話紀錄）
+    5. 對話與側欄的遊戲狀態為獨立的 Fragment，送出行動後只重新執行這兩個 Fragment，不重新執行整個頁面
+    6. 對話只顯示最近的訊息，較早的訊息分頁載入，每回合的耗時不會隨對話紀錄增加
+    7. Agent 與連線池以 st.cache_resource 快取，所有玩家共用，開始新遊戲時不重新建立
+
+Fragment 的執行順序：送出行動時以回呼要求重新執行對話與遊戲狀態，對話先處理回合，遊戲狀態再顯示更新後的結果
+（Fragment 依註冊順序執行，因此 main() 先呼叫 render_main() 再呼叫 render_sidebar()）
 """
 
 import streamlit as st
+import functools
 import os
+from typing import Tuple
 
 from src.repository.game_assemble import GameAssemble
+from src.repository.llm.backends import create_backend
+from src.repository.llm.narrator import NarratorAgent
+from src.repository.llm.parser import ParserAgent
+from src.repository.llm.resilience import ResiliencePolicy, CircuitBreaker
+from src.repository.llm.session import AgentSession
+
+PAGE_SIZE = 20  # 對話一次顯示（載入）的訊息數
 
 # 頁面框架
 st.set_page_config(
@@ -46,107 +62,196 @@ def init_session_state():
     ss.setdefault("game_started", False)
     ss.setdefault("api_url", os.environ.get("API_URL", ""))
     ss.setdefault("api_key", os.environ.get("API_KEY", ""))
+    ss.setdefault("visible", PAGE_SIZE)     # 對話顯示的訊息數
+    ss.setdefault("pending_input", None)    # 已送出、尚未處理的行動
+
+@st.cache_resource(show_spinner = False)
+def shared_agents(api_url: str, api_key: str) -> Tuple[ParserAgent, NarratorAgent]:
+    """所有玩家共用的 Parser 與 Narrator（同一組 API 資訊只建立一次，共用連線池、斷路器與快取）"""
+    session = AgentSession()
+    breaker = CircuitBreaker()
+    backend = create_backend(api_url, api_key)
+    parser = ParserAgent(api_url, api_key, logger = streamlit_logger, session = session, policy = ResiliencePolicy(deadline = ParserAgent.DEADLINE, breaker = breaker), backend = backend)
+    narrator = NarratorAgent(api_url, api_key, logger = streamlit_logger, session = session, policy = ResiliencePolicy(deadline = NarratorAgent.DEADLINE, breaker = breaker), backend = backend)
+    return parser, narrator
+
+def new_game() -> GameAssemble:
+    """建立使用共用 Agent 的遊戲（連線池由快取負責，關閉遊戲時不會關閉）"""
+    parser, narrator = shared_agents(st.session_state.api_url, st.session_state.api_key)
+    return GameAssemble(
+        api_key = st.session_state.api_key,
+        api_url = st.session_state.api_url,
+        logger = streamlit_logger,
+        parser = parser,
+        narrator = narrator,
+    )
 
 def render_sidebar():
     """Sidebar 顯示內容"""
     with st.sidebar:
         st.title("遊 戲 狀 態")
+        render_status()
 
-        if st.session_state.game_started and st.session_state.game:
-            state = st.session_state.game.engine.state.get_state_dict()
-
-            st.markdown(f"【 地 點 】{state["location"]}")
-
-            st.markdown(f"【 體 力 】 {state["health"]} / {state["max_health"]}")
-            st.progress(state["health"] / state["max_health"])
-
-            st.markdown(f"【 理 智 】 {state["sanity"]} / {state["max_sanity"]}")
-            st.progress(state["sanity"] / state["max_sanity"])
-
-            st.markdown("【 物 品 】")
-            if state["inventory"]:
-                for item in state["inventory"]:
-                    st.write("・", item)
-            else:
-                st.caption("無")
+        st.divider()
 
-            st.markdown(f"【 Ａ 的 理 智 】 {state["npc_a_sanity"]} / 3")
-            st.progress(state["npc_a_sanity"] / 3)
+        with st.expander("遊 戲 選 項", expanded = True):
+            st.session_state.api_url = st.text_input("API URL", value = st.session_state.api_url)
+            st.session_state.api_key = st.text_input("API Key", value = st.session_state.api_key, type = "password")
+            st.button("開 始 遊 戲", use_container_width = True, on_click = start_game)
+            st.button("重 置 遊 戲", use_container_width = True, on_click = reset_game)
+
+        with st.expander("存 檔", expanded = False):
+            if st.session_state.game_started and st.session_state.game:
+                # 存檔內容在按下時才產生（回合只重新執行 Fragment，這裡不會更新）
+                data = functools.partial(st.session_state.game.save, st.session_state.messages)
+                st.download_button("下 載 存 檔", data = data, file_name = "game.sav", use_container_width = True, on_click = "ignore")
+            st.file_uploader("讀 取 存 檔", type = ["sav"], key = "upload")
+            st.button("讀 取", use_container_width = True, on_click = load_game)
+
+@st.fragment(key = "status")
+def render_status():
+    """遊戲狀態（獨立於對話更新）"""
+    if st.session_state.game_started and st.session_state.game:
+        state = st.session_state.game.engine.state.get_state_dict()
+
+        st.markdown(f"【 地 點 】{state["location"]}")
+
+        st.markdown(f"【 體 力 】 {state["health"]} / {state["max_health"]}")
+        st.progress(state["health"] / state["max_health"])
+
+        st.markdown(f"【 理 智 】 {state["sanity"]} / {state["max_sanity"]}")
+        st.progress(state["sanity"] / state["max_sanity"])
+
+        st.markdown("【 物 品 】")
+        if state["inventory"]:
+            for item in state["inventory"]:
+                st.write("・", item)
+        else:
+            st.caption("無")
 
-            st.markdown(f"【 Ｂ 的 理 智 】 {state["npc_b_sanity"]} / 3")
-            st.progress(state["npc_b_sanity"] / 3)
+        st.markdown(f"【 Ａ 的 理 智 】 {state["npc_a_sanity"]} / 3")
+        st.progress(state["npc_a_sanity"] / 3)
 
-            st.markdown(f"【 Ｃ 的 理 智 】 {state["npc_c_sanity"]} / 5")
-            st.progress(state["npc_c_sanity"] / 5)
+        st.markdown(f"【 Ｂ 的 理 智 】 {state["npc_b_sanity"]} / 3")
+        st.progress(state["npc_b_sanity"] / 3)
 
-        else:
-            st.caption("尚未開始遊戲")
+        st.markdown(f"【 Ｃ 的 理 智 】 {state["npc_c_sanity"]} / 5")
+        st.progress(state["npc_c_sanity"] / 5)
 
-        st.divider()
+    else:
+        st.caption("尚未開始遊戲")
 
-        with st.expander("遊 戲 選 項", expanded = True):
-            st.session_state.api_url = st.text_input("API URL", value = st.session_state.api_url)
-            st.session_state.api_key = st.text_input("API Key", value = st.session_state.api_key, type = "password")
-            if st.button("開 始 遊 戲", use_container_width = True):
-                start_game()
-            if st.button("重 置 遊 戲", use_container_width = True):
-                reset_game()
+def has_api_key() -> bool:
+    """是否已輸入 API Key（模擬後端 fake:// 不需要）"""
+    if not st.session_state.api_key and not st.session_state.api_url.startswith("fake://"):
+        st.error("請輸入 API Key。")
+        return False
+    return True
 
 def start_game():
-    """選擇「開始遊戲後」的頁面更動"""
-    if not st.session_state.api_key:
-        st.error("請輸入 API Key。")
+    """選擇「開始遊戲」後的頁面更動（按鈕的回呼，執行後頁面只重新執行一次）"""
+    if not has_api_key():
         return
 
-    st.session_state.game = GameAssemble(
-        api_key = st.session_state.api_key,
-        api_url = st.session_state.api_url,
-        logger = streamlit_logger,
-    )
+    close_game()
+    st.session_state.game = new_game()
     st.session_state.game_started = True
     st.session_state.messages.clear()
+    st.session_state.visible = PAGE_SIZE
 
     intro = st.session_state.game.get_intro_text()
     st.session_state.messages.append(("system", (intro + "**可以輸入文字來進行操作（如：「去圖書館」、「和 A 聊天」、「吃麵包」，輸入「exit」或「結束」則結束遊戲）。**").replace("\n", "  \n  \n")))
 
-    st.rerun()
+def load_game():
+    """選擇「讀取」後的頁面更動（直接還原狀態與對話紀錄，不重新執行每一回合）"""
+    uploaded = st.session_state.get("upload")
+    if uploaded is None or not has_api_key():
+        return
+
+    game = new_game()
+    try:
+        record = game.load(uploaded.getvalue())
+    except ValueError as e:
+        game.close()
+        st.error(f"無法讀取存檔。\n錯誤訊息：{e}")
+        return
+    close_game()
+    st.session_state.game = game
+    st.session_state.game_started = True
+    st.session_state.messages = record.messages
+    st.session_state.visible = PAGE_SIZE
+
+def close_game():
+    """關閉舊遊戲（停止推測執行，共用的連線池不會關閉）"""
+    if st.session_state.game is not None:
+        st.session_state.game.close()
+        st.session_state.game = None
 
 def reset_game():
     """選擇「重置遊戲」後的頁面更動"""
+    close_game()
     st.session_state.game_started = False
-    st.session_state.game = None
     st.session_state.messages.clear()
-    st.rerun()
+    st.session_state.visible = PAGE_SIZE
 
-def process_user_input(text: str):
-    """送出行動後的頁面更動"""
-    st.session_state.messages.append(("user", text))
+def submit_input():
+    """送出行動（輸入框的回呼）：記錄行動，只重新執行對話與遊戲狀態"""
+    text = st.session_state.get("chat_input")
+    if text and st.session_state.game_started:
+        st.session_state.pending_input = text.replace("\n", "  \n  \n")
+    st.rerun(["chat", "status"])
+
+def show_earlier():
+    """載入較早的一頁訊息"""
+    st.session_state.visible += PAGE_SIZE
 
+def process_user_input(text: str):
+    """處理送出的行動（使用者的訊息已顯示），逐段顯示故事文本"""
     with st.spinner("處理中⋯⋯"):
-        result = st.session_state.game.process_input(text)
+        result = st.session_state.game.process_input_stream(text)
 
-    st.session_state.messages.append(("system", result["story"] if result["story"] else ""))
+    # 逐段顯示故事文本，完成後再存入對話紀錄
+    with st.chat_message("system"):
+        story = st.write_stream(result["story"])
+    st.session_state.messages.append(("system", story if isinstance(story, str) else "".join(map(str, story))))
 
     if result["game_over"]:
         ending = st.session_state.game.get_ending_text(result["ending"])
         st.session_state.messages.append(
             ("ending", f"{ending['title']}\n\n{ending['description']}")
         )
-    st.rerun()
+        # 遊戲結束時才重新執行整個頁面（移除輸入框）
+        st.rerun()
+
+@st.fragment(key = "chat")
+def render_chat():
+    """對話（只顯示最近的訊息，送出行動時只重新執行這個 Fragment）"""
+    ss = st.session_state
+    text, ss.pending_input = ss.pending_input, None
+    if text is not None:
+        ss.messages.append(("user", text))
+
+    # 較早的訊息不顯示，避免每回合重新顯示整個對話紀錄
+    messages = ss.messages
+    start = max(0, len(messages) - ss.visible)
+    if start:
+        st.button(f"顯示較早的訊息（還有 {start} 則）", on_click = show_earlier)
+    for role, content in messages[start:]:
+        with st.chat_message(role):
+            st.markdown(content)
+
+    if text is not None:
+        process_user_input(text)
 
 def render_main():
     """Chatbox 顯示內容"""
     st.title("文字冒險遊戲 Interactive Fiction")
     st.caption("計算理論　期末報告")
 
-    for role, content in st.session_state.messages:
-        with st.chat_message(role):
-            st.markdown(content)
+    render_chat()
 
     if st.session_state.game_started and not st.session_state.game.engine.state.game_over:
-        user_input = st.chat_input("輸入你的行動⋯⋯")
-        if user_input:
-            process_user_input(user_input.replace("\n", "  \n  \n"))
+        st.chat_input("輸入你的行動⋯⋯", key = "chat_input", on_submit = submit_input)
 
 def streamlit_logger(level: str, message: str):
     """日誌方法"""
@@ -154,8 +259,9 @@ def streamlit_logger(level: str, message: str):
 
 def main():
     init_session_state()
-    render_sidebar()
+    # 對話先於遊戲狀態註冊，送出行動時先處理回合再更新遊戲狀態
     render_main()
+    render_sidebar()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,35 @@
+"""
+BatchSimulator 與 GameEngine 的一致性測試：
+    1. 以多組隨機種子執行 verify()，逐步比對狀態、結果文字與是否需要 LLM
+    2. 確認 verify() 能發現結果文字與是否需要 LLM 的差異
+
+執行方式：python -m pytest tests
+"""
+
+import pytest
+
+from src.tools import simulator
+from src.tools.simulator import BatchSimulator, OUTCOMES, rule, verify
+
+@pytest.mark.parametrize("seed", [0, 1, 2, 3, 4])
+def test_matches_engine(seed):
+    """隨機遊玩時，每一步的狀態、結果文字與是否需要 LLM 都與 GameEngine 相同"""
+    assert verify(games = 300, steps = 80, seed = seed) == []
+
+def test_detects_llm_flag(monkeypatch):
+    """是否需要 LLM 不同時回報不一致"""
+    index = rule("explore", "找到鑰匙")
+    outcomes = list(OUTCOMES)
+    outcomes[index] = outcomes[index]._replace(llm = False)
+    monkeypatch.setattr(simulator, "OUTCOMES", outcomes)
+    assert verify(games = 50, steps = 5, seed = 0)
+
+def test_detects_result_text(monkeypatch):
+    """結果文字不同時回報不一致（未記錄物品的取得順序時，列出物品欄的文字會不同）"""
+    class Unordered(BatchSimulator):
+        def __init__(self, size, commands = None, ordered = False):
+            super().__init__(size, commands, ordered = False)
+
+    monkeypatch.setattr(simulator, "BatchSimulator", Unordered)
+    mismatches = verify(games = 500, steps = 60, seed = 3)
+    assert any("你可以使用的物品有" in mismatch for mismatch in mismatches)